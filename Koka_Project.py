@@ -3,14 +3,37 @@ import sys
 import os
 import math
 import random
+import time
+import argparse
+import csv
+import io
+import json
+import struct
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from itertools import repeat
 from typing import Set, List, Tuple
 
+import numpy as np
+
+# コマンドラインで渡された相対パスは起動したときのカレントディレクトリから解決する
+ORIGINAL_CWD = os.getcwd()
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
 # 画面設定
 SCREEN_WIDTH = 600
 SCREEN_HEIGHT = 800
-FPS = 60
+FPS = 60  # 描画のフレームレート
+SIM_TICK_RATE = 60  # ゲーム内時間の1秒あたりの tick 数 (固定刻み)
+MAX_CATCH_UP_STEPS = 5  # 描画が遅れたとき、1描画フレームで進める tick 数の上限
+SCREEN_RECT = pg.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+
+# 敵弾の管理方式 ("array": NumPy 配列でまとめて処理 / "sprite": 1弾 = 1 Sprite の従来方式)
+BULLET_ENGINE = "array"
+
+# 当たり判定用グリッドの1マスの大きさ (px)
+GRID_CELL_SIZE = 50
 
 # 色の定義
 BLACK = (0, 0, 0)
@@ -20,6 +43,612 @@ GREEN = (0, 255, 0)
 BLUE = (0, 0, 255)
 YELLOW = (255, 255, 0)
 
+# 細レーザーの回転キャッシュ設定
+LASER_ROTATION_BUCKETS = 360  # 角度の量子化数 (360 なら 1度刻み、720 なら 0.5度刻み)
+LASER_ROTATION_CACHE_SIZE = 360  # キャッシュに保持する回転済み画像の最大数
+
+# 文字描画キャッシュに保持する Surface の最大数
+TEXT_CACHE_SIZE = 256
+
+# 弾幕パターンの定義ファイル (PatternLibrary が読み込む)
+PATTERN_FILE = "data/patterns.json"
+
+# ボスの HP (難易度別)。BOSS_HP は STAGE1〜3 のスキルごと、EX_BOSS_HP は EX ステージ全体
+BOSS_HP = {
+    "EASY": [50, 75, 100],
+    "NORMAL": [100, 150, 200],
+    "HARD": [200, 300, 400],
+}
+EX_BOSS_HP = {"EASY": 500, "NORMAL": 1000, "HARD": 1500}
+
+# 弾のオブジェクトプールが種類ごとに保持する使用済み弾の最大数
+BULLET_POOL_CAPACITY = 1024
+
+# ダーティ矩形描画 (--dirty-rects で有効)
+DIRTY_RECT_RENDERING = False
+DIRTY_FULL_REDRAW_RATIO = 0.4  # 変化した面積が画面のこの割合を超えたら全体を描き直して flip する
+DIRTY_MAX_RECTS = 400  # 矩形がこれより多いときも全体を描き直す
+
+# フレームプロファイラ (F3 で表示切替、F4 で CSV に保存)
+PROFILER_TOGGLE_KEY = pg.K_F3
+PROFILER_DUMP_KEY = pg.K_F4
+PROFILER_HISTORY_SECONDS = 10  # CSV に保存する直近の秒数
+PROFILER_OUTPUT_DIR = "profiles"
+
+# セーブステート (プレイ中に F5 で保存、F9 で最後に保存した場面からやり直す)
+SNAPSHOT_SAVE_KEY = pg.K_F5
+SNAPSHOT_LOAD_KEY = pg.K_F9
+SNAPSHOT_OUTPUT_DIR = "snapshots"  # F5 で保存した場面をファイルにも書き出す (benchmark.py --snapshot で使える)
+
+# ステージごとの背景画像と BGM ("EX" は EXステージ)
+STAGE_BACKGROUNDS = {
+    "NORMAL": "data/HAIKEI1.png",
+    "EASY": "data/HAIKEI2.jpg",
+    "HARD": "data/HAIKEI3.jpg",
+    "EX": "data/HAIKEI4.jpg",
+}
+STAGE_BGM = {
+    "NORMAL": "data/BGM1.mp3",
+    "HARD": "data/BGM2.mp3",
+    "EASY": "data/BGM3.mp3",
+    "EX": "data/BGM4.mp3",
+}
+ASSET_LOADER_WORKERS = 2  # 背景画像・BGM を先読みするワーカースレッド数
+
+# 効果音 (名前: (ファイル, 音量, 予約する mixer チャンネル数))
+SOUND_EFFECTS = {
+    "hit": ("data/se_hit.wav", 1.0, 1),
+    "graze": ("data/se_graze.wav", 1.0, 2),
+    "bomb": ("data/8bit_read2.mp3", 0.5, 1),  # 音量が大きくなりがちなので下げる
+    "powerup": ("data/8bit_read2.mp3", 1.0, 1),
+}
+SOUND_MERGE_MS = 60  # 同じ効果音をこの時間 (ミリ秒) 以内に続けて鳴らしたときは1回にまとめる
+AUDIO_BUFFER_SIZE = 256  # mixer のバッファ (サンプル数)。小さいほど鳴るまでの遅延が短い (--audio-buffer で変更)
+
+# 負荷に応じて描画と弾数を段階的に簡略化する LoadGovernor (--no-governor で無効)
+LOAD_GOVERNOR = True
+GOVERNOR_WINDOW_FRAMES = 30  # この数のフレームの平均フレーム時間で判定する
+GOVERNOR_HIGH_RATIO = 0.9  # 平均フレーム時間が予算 (1000 / FPS ms) のこの割合を超えたら1段階簡略化する
+GOVERNOR_LOW_RATIO = 0.5  # この割合を下回ったら1段階戻す
+GOVERNOR_BULLET_PRESSURE = 1500  # 敵弾がこれより多いときも負荷が高いとみなす
+GOVERNOR_BULLET_CAP = 1200  # 最終段階での敵弾 (移動する弾) の上限。敵弾がこれより少ないときだけ段階を戻す
+
+# 回避ボット (DodgeInput。ヘッドレス実行・balance.py・--autoplay で使う)
+DODGE_LOOKAHEAD_FRAMES = 12  # 何フレーム先まで弾と自機の位置を予測するか
+DODGE_SAFE_DISTANCE = 24  # 自機の当たり判定と弾の間にこれだけの隙間があれば危険度 0 とみなす
+DODGE_HIT_MARGIN = 2  # 位置の切り捨てなどの誤差を見込んで、この距離まで近づいたら被弾とみなす
+DODGE_HOME = (SCREEN_WIDTH // 2, SCREEN_HEIGHT - 150)  # 危険がないときに戻る位置
+DODGE_BOMB_FRAMES = 3  # どう動いてもこのフレーム数以内に被弾するときはボムを使う
+
+
+class AssetCache:
+    """
+    画像アセットのキャッシュ (プロセス全体で共有)
+    (パス, サイズ, 透明度) をキーにして、読み込みとスケールは1度だけ行い
+    同じ Surface を全インスタンスに渡す。画像がない場合は色付き Surface を代わりに保持する。
+    """
+    def __init__(self):
+        self._images: dict[tuple, pg.Surface] = {}
+        self._cheap: dict[pg.Surface, pg.Surface] = {}  # cheap() で作った簡易版の画像
+        self.hits = 0
+        self.misses = 0
+
+    def image(self, path: str, size: tuple[int, int], fallback_size: tuple[int, int],
+              fallback_color: tuple[int, int, int], alpha: int | None = None) -> pg.Surface:
+        """
+        スケール済みの画像を返す (2回目以降はキャッシュから)
+        返した Surface は共有されるので、呼び出し側で書き換えないこと
+        """
+        key = (path, size, alpha)
+        surface = self._images.get(key)
+        if surface is not None:
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        try:
+            surface = pg.image.load(path)
+            surface = surface.convert_alpha()
+            surface = pg.transform.scale(surface, size)
+        except (pg.error, FileNotFoundError):
+            surface = pg.Surface(fallback_size)
+            surface.fill(fallback_color)
+        if alpha is not None:
+            surface.set_alpha(alpha)
+        self._images[key] = surface
+        return surface
+
+    def cheap(self, surface: pg.Surface) -> pg.Surface:
+        """
+        surface を α 合成なしで描ける簡易版にして返す (負荷が高いときの弾用)
+        黒の上に合成し、黒を colorkey にして RLE で描くので、縁の半透明の部分は黒っぽくなる
+        """
+        cheap = self._cheap.get(surface)
+        if cheap is None:
+            cheap = pg.Surface(surface.get_size())
+            cheap.blit(surface, (0, 0))
+            cheap = cheap.convert()
+            cheap.set_colorkey(BLACK, pg.RLEACCEL)
+            self._cheap[surface] = cheap
+        return cheap
+
+    def stats(self) -> dict[str, int]:
+        """ ヒット数・ミス数・登録数を返す """
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._images)}
+
+    def clear(self):
+        self._images.clear()
+        self._cheap.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# 全クラスで共有するアセットキャッシュ
+ASSETS = AssetCache()
+
+
+class AssetLoader:
+    """
+    背景画像・BGM の先読み
+    画像のデコードとスケール、BGM ファイルの読み込みをワーカースレッドで行い、
+    画面の形式に合わせる convert() だけを使うときにメインスレッドで行う (display に触るため)。
+    難易度選択画面やリザルト画面の間に読み込んでおけば、画面の切り替えは読み込み済みの Surface を使うだけになる。
+    """
+    def __init__(self, workers: int = ASSET_LOADER_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="asset-loader")
+        self._futures: dict[tuple, Future] = {}
+        self._images: dict[tuple, pg.Surface | None] = {}
+
+    @staticmethod
+    def _decode(path: str, size: tuple[int, int]) -> pg.Surface:
+        """ ワーカースレッドで画像を読み込んでスケールする (convert はしない) """
+        return pg.transform.scale(pg.image.load(path), size)
+
+    @staticmethod
+    def _read(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    def request_image(self, path: str, size: tuple[int, int] = (SCREEN_WIDTH, SCREEN_HEIGHT)):
+        """ 画像の読み込みを予約する (すでに予約済みなら何もしない) """
+        key = ("image", path, size)
+        if key not in self._futures:
+            self._futures[key] = self._executor.submit(self._decode, path, size)
+
+    def request_file(self, path: str):
+        """ ファイル (BGM) の読み込みを予約する """
+        key = ("file", path)
+        if key not in self._futures:
+            self._futures[key] = self._executor.submit(self._read, path)
+
+    def image(self, path: str, size: tuple[int, int] = (SCREEN_WIDTH, SCREEN_HEIGHT)) -> pg.Surface | None:
+        """
+        読み込んだ画像を返す (読み込みが終わっていなければ待つ)
+        読み込めなかった場合は None を返す (呼び出し側は黒い背景を使う)
+        """
+        key = ("image", path, size)
+        if key in self._images:
+            return self._images[key]
+        self.request_image(path, size)
+        try:
+            surface = self._futures[key].result().convert()
+        except (pg.error, OSError) as e:
+            print(f"背景画像の読み込みに失敗しました: {e}")
+            surface = None
+        self._images[key] = surface
+        return surface
+
+    def file(self, path: str) -> bytes:
+        """ 読み込んだファイルの中身を返す (読み込めなかった場合は OSError) """
+        self.request_file(path)
+        return self._futures[("file", path)].result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def play_bgm(loader: AssetLoader, path: str):
+    """ 先読みした BGM を無限ループで再生する (ファイルがなければ OSError、mixer が使えなければ pg.error) """
+    data = loader.file(path)
+    pg.mixer.music.load(io.BytesIO(data), os.path.splitext(path)[1].lstrip("."))
+    pg.mixer.music.play(loops=-1)
+
+
+class AudioManager:
+    """
+    効果音の管理
+    SOUND_EFFECTS の効果音を起動時に1度だけ読み込み (同じファイルは1つの Sound を共有)、
+    種類ごとに予約した mixer チャンネルを順番に使って鳴らす。
+    同じ効果音を SOUND_MERGE_MS 以内に続けて鳴らしたときは1回にまとめるので、GRAZE が続いても音が重ならない。
+    mixer が使えない環境や、ファイルがない効果音は鳴らさないだけでエラーにはしない。
+    """
+    def __init__(self, effects: dict[str, tuple[str, float, int]] = SOUND_EFFECTS,
+                 merge_ms: int = SOUND_MERGE_MS):
+        self.merge_ms = merge_ms
+        self._sounds: dict[str, pg.mixer.Sound] = {}
+        self._volumes: dict[str, float] = {}
+        self._channels: dict[str, list[pg.mixer.Channel]] = {}
+        self._next_channel: dict[str, int] = {}
+        self._last_play: dict[str, int] = {}
+        self.plays = 0  # 実際に鳴らした回数
+        self.merged = 0  # まとめたため鳴らさなかった回数
+        if not pg.mixer.get_init():
+            return
+
+        loaded: dict[str, pg.mixer.Sound | None] = {}
+        reserved = 0
+        for name, (path, volume, channels) in effects.items():
+            if path not in loaded:
+                try:
+                    loaded[path] = pg.mixer.Sound(path)
+                except (pg.error, FileNotFoundError):
+                    print(f"Warning: 効果音ファイルが見つかりません: {path}")
+                    loaded[path] = None
+            if loaded[path] is None:
+                continue
+            self._sounds[name] = loaded[path]
+            self._volumes[name] = volume
+            self._channels[name] = [pg.mixer.Channel(reserved + i) for i in range(channels)]
+            self._next_channel[name] = 0
+            reserved += channels
+
+        # 先頭の reserved 個のチャンネルを効果音専用にする (Sound.play() の自動割り当てには使われない)
+        if pg.mixer.get_num_channels() < reserved:
+            pg.mixer.set_num_channels(reserved)
+        pg.mixer.set_reserved(reserved)
+
+    def play(self, name: str):
+        """ 効果音を鳴らす (読み込めなかった効果音と、直前に鳴らしたばかりの効果音は鳴らさない) """
+        sound = self._sounds.get(name)
+        if sound is None:
+            return
+        now = pg.time.get_ticks()
+        last = self._last_play.get(name)
+        if last is not None and now - last < self.merge_ms:
+            self.merged += 1
+            return
+        self._last_play[name] = now
+
+        # 予約したチャンネルを順番に使う (全部鳴っていれば一番前に鳴らしたものを止めて使う)
+        channels = self._channels[name]
+        index = self._next_channel[name]
+        self._next_channel[name] = (index + 1) % len(channels)
+        channel = channels[index]
+        channel.play(sound)
+        channel.set_volume(self._volumes[name])
+        self.plays += 1
+
+    def stats(self) -> dict[str, int]:
+        return {"sounds": len(self._sounds), "plays": self.plays, "merged": self.merged}
+
+
+class TextRenderer:
+    """
+    文字描画レイヤー
+    フォントをサイズごとに1つだけ持ち、描画済みの文字 Surface を (文字列, サイズ, 色) をキーに
+    LRU で使い回す。スコアや時間などの数値は、事前に描画した数字のアトラスを並べて描く。
+    """
+    DIGITS = "0123456789.-"
+
+    def __init__(self, max_entries: int = TEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._fonts: dict[int, pg.font.Font] = {}
+        self._surfaces: OrderedDict[tuple, pg.Surface] = OrderedDict()
+        self._digit_atlases: dict[tuple, dict[str, pg.Surface]] = {}
+
+    def font(self, size: int) -> pg.font.Font:
+        """ 指定サイズのフォントを返す (初回のみ生成) """
+        font = self._fonts.get(size)
+        if font is None:
+            font = pg.font.Font(None, size)
+            self._fonts[size] = font
+        return font
+
+    def render(self, text: str, size: int, color: tuple[int, int, int]) -> pg.Surface:
+        """ 文字列を描画した Surface を返す (キャッシュ済みならそれを返す) """
+        key = (text, size, color)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            return surface
+        surface = self.font(size).render(text, True, color)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.max_entries:
+            self._surfaces.popitem(last=False)  # 最も古いものを捨てる
+        return surface
+
+    def _digit_atlas(self, size: int, color: tuple[int, int, int]) -> dict[str, pg.Surface]:
+        """ 数字1文字ずつの Surface の表 """
+        key = (size, color)
+        atlas = self._digit_atlases.get(key)
+        if atlas is None:
+            font = self.font(size)
+            atlas = {char: font.render(char, True, color) for char in self.DIGITS}
+            self._digit_atlases[key] = atlas
+        return atlas
+
+    def number_width(self, label: str, number: str, size: int, color: tuple[int, int, int]) -> int:
+        """ draw_number で描いたときの幅 """
+        atlas = self._digit_atlas(size, color)
+        width = self.render(label, size, color).get_width()
+        for char in number:
+            width += atlas[char].get_width()
+        return width
+
+    def draw_number(self, screen: pg.Surface, label: str, number: str, size: int,
+                    color: tuple[int, int, int], pos: tuple[int, int]) -> int:
+        """
+        "Score: " などのラベルに続けて数値を描画する
+        数値は数字アトラスを並べるだけなので、値が変わっても文字描画は発生しない
+        描画した幅を返す
+        """
+        atlas = self._digit_atlas(size, color)
+        x, y = pos
+        label_surface = self.render(label, size, color)
+        screen.blit(label_surface, (x, y))
+        x += label_surface.get_width()
+        for char in number:
+            digit = atlas[char]
+            screen.blit(digit, (x, y))
+            x += digit.get_width()
+        return x - pos[0]
+
+
+# 全画面で共有する文字描画レイヤー (フォントは初回使用時に生成)
+TEXT = TextRenderer()
+
+
+def blit_batch(screen: pg.Surface, sequence, want_rects: bool = False) -> list[pg.Rect]:
+    """
+    (Surface, 位置) の並び (zip などのイテレータでよい) を1回の呼び出しでまとめて描画する
+    want_rects=True なら描画した範囲のリストを返す。不要なら fblits (pygame-ce のみ) があればそれを使う
+    """
+    if want_rects:
+        return screen.blits(sequence)
+    if hasattr(screen, "fblits"):
+        screen.fblits(sequence)
+    else:
+        screen.blits(sequence, doreturn=False)
+    return []
+
+
+def blit_sprites(screen: pg.Surface, sprites, want_rects: bool = False) -> list[pg.Rect]:
+    """ Sprite (または Group) をまとめて描画する。位置は各 Sprite の rect """
+    return blit_batch(screen, ((sprite.image, sprite.rect) for sprite in sprites), want_rects)
+
+
+class SpritePool:
+    """
+    弾 Sprite のオブジェクトプール
+    使い終わった弾を種類 (クラス) ごとに保持し、次に同じ種類の弾を作るときに reset() で初期化して使い回す。
+    reset() を持たないクラス (置きレーザーなど) は保持しない。
+    """
+    def __init__(self, capacity: int = BULLET_POOL_CAPACITY, capacities: dict[type, int] | None = None):
+        self.capacity = capacity  # 種類ごとの既定の上限
+        self.capacities: dict[type, int] = dict(capacities or {})  # 種類ごとの上限 (指定があれば優先)
+        self._free: dict[type, list[pg.sprite.Sprite]] = {}
+        self.hits = 0  # プールから再利用した数
+        self.allocations = 0  # プールが空で新しく作った数
+        self.discarded = 0  # 上限を超えたため保持しなかった数
+
+    def set_capacity(self, sprite_type: type, capacity: int):
+        """ 種類ごとの上限を変更する (超えた分はすぐに捨てる) """
+        self.capacities[sprite_type] = capacity
+        free = self._free.get(sprite_type)
+        if free is not None and len(free) > capacity:
+            self.discarded += len(free) - capacity
+            del free[capacity:]
+
+    def acquire(self, sprite_type: type, *args) -> pg.sprite.Sprite:
+        """ sprite_type(*args) と同じ状態の弾を返す (保持していればそれを使い回す) """
+        free = self._free.get(sprite_type)
+        if free:
+            self.hits += 1
+            sprite = free.pop()
+            sprite.reset(*args)
+            return sprite
+        self.allocations += 1
+        return sprite_type(*args)
+
+    def release(self, sprite: pg.sprite.Sprite):
+        """ グループから外れた弾を受け取る """
+        sprite_type = type(sprite)
+        if not hasattr(sprite_type, "reset"):
+            return
+        free = self._free.setdefault(sprite_type, [])
+        if len(free) < self.capacities.get(sprite_type, self.capacity):
+            free.append(sprite)
+        else:
+            self.discarded += 1
+
+    def prefill(self, sprite_type: type, count: int, *args):
+        """ 起動時などに count 個まで作っておく (プレイ中の生成を減らす) """
+        free = self._free.setdefault(sprite_type, [])
+        while len(free) < min(count, self.capacities.get(sprite_type, self.capacity)):
+            free.append(sprite_type(*args))
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "allocations": self.allocations, "discarded": self.discarded,
+                "free": sum(len(free) for free in self._free.values())}
+
+
+class PooledGroup(pg.sprite.Group):
+    """
+    外れた Sprite を SpritePool に返す Group
+    kill()・remove()・empty()・spritecollide(dokill=True) のどれで外れても返却される
+    (プールする弾は他のグループに入れないこと)
+    """
+    def __init__(self, pool: SpritePool, *sprites):
+        self.pool = pool
+        super().__init__(*sprites)
+
+    def remove_internal(self, sprite: pg.sprite.Sprite):
+        super().remove_internal(sprite)
+        self.pool.release(sprite)
+
+
+# 自機弾・敵弾で共有する弾のプール
+BULLET_POOL = SpritePool()
+
+
+def segment_rect_distance_sq(x0: float, y0: float, dx: float, dy: float, rect: pg.Rect) -> float:
+    """
+    線分 (x0, y0) → (x0 + dx, y0 + dy) と矩形 rect の最短距離の2乗
+    交わっていなければ最短距離は「線分の端点と矩形」か「矩形の角と線分」のどれかになる
+    """
+    left, top, right, bottom = rect.left, rect.top, rect.right, rect.bottom
+
+    # 線分が矩形を横切っているなら 0 (スラブ法: x, y それぞれで矩形の中にいる t の範囲が重なるか)
+    t_enter, t_exit = 0.0, 1.0
+    for start, delta, low, high in ((x0, dx, left, right), (y0, dy, top, bottom)):
+        if delta == 0:
+            if start < low or start > high:
+                t_enter, t_exit = 1.0, 0.0
+                break
+        else:
+            t_low = (low - start) / delta
+            t_high = (high - start) / delta
+            if t_low > t_high:
+                t_low, t_high = t_high, t_low
+            t_enter = max(t_enter, t_low)
+            t_exit = min(t_exit, t_high)
+    if t_enter <= t_exit:
+        return 0.0
+
+    # 線分の端点と矩形
+    best = math.inf
+    for px, py in ((x0, y0), (x0 + dx, y0 + dy)):
+        ex = max(left - px, px - right, 0.0)
+        ey = max(top - py, py - bottom, 0.0)
+        best = min(best, ex * ex + ey * ey)
+
+    # 矩形の角と線分
+    length_sq = dx * dx + dy * dy
+    for qx, qy in ((left, top), (right, top), (left, bottom), (right, bottom)):
+        t = min(max(((qx - x0) * dx + (qy - y0) * dy) / length_sq, 0.0), 1.0) if length_sq else 0.0
+        ex = x0 + t * dx - qx
+        ey = y0 + t * dy - qy
+        best = min(best, ex * ex + ey * ey)
+    return best
+
+
+class RotationCache:
+    """
+    回転済み画像のキャッシュ (LRU)
+    角度を buckets 段階に量子化し、回転済み Surface を使い回す。
+    保持数が max_size を超えたら、最も長く使われていない角度から捨てる。
+    当たり判定用に、元画像を「長辺方向の線分 + 短辺の半分の半径」のカプセルとみなした形も
+    全段階分まとめて計算しておく (hits_rect)。
+    """
+    def __init__(self, base_image: pg.Surface, buckets: int = LASER_ROTATION_BUCKETS,
+                 max_size: int = LASER_ROTATION_CACHE_SIZE):
+        self.base_image = base_image
+        self.buckets = buckets
+        self.max_size = max_size
+        self.step = 360 / buckets  # 1段階あたりの角度
+        self._entries: OrderedDict[int, pg.Surface] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        # カプセルの形 (段階ごとの、中心から線分の端までのベクトルと半径)
+        width, height = base_image.get_size()
+        half_length = (width - height) / 2
+        self.half_vectors = [(math.cos(math.radians(index * self.step)) * half_length,
+                              math.sin(math.radians(index * self.step)) * half_length)
+                             for index in range(buckets)]
+        self.half_vector_array = np.array(self.half_vectors)  # 弾の配列とまとめて計算するとき用
+        self.radius_sq = (height / 2) ** 2
+
+    def bucket(self, angle: float) -> int:
+        """ 角度 (度) を量子化したインデックスを返す """
+        return round((angle % 360) / self.step) % self.buckets
+
+    def get(self, angle: float) -> pg.Surface:
+        """
+        angle (度, 時計回り) に回転した画像を返す
+        """
+        index = self.bucket(angle)
+        image = self._entries.get(index)
+        if image is not None:
+            self.hits += 1
+            self._entries.move_to_end(index)
+            return image
+
+        self.misses += 1
+        image = pg.transform.rotate(self.base_image, -index * self.step)
+        self._entries[index] = image
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)  # 最も古いものを捨てる
+        return image
+
+    def hits_rect(self, x: float, y: float, index: int, rect: pg.Rect) -> bool:
+        """
+        中心 (x, y)、回転段階 index のカプセルが rect と重なっているか
+        (外接矩形で当たった候補だけに使うので、1本ずつ判定する)
+        """
+        half_x, half_y = self.half_vectors[index]
+        return segment_rect_distance_sq(x - half_x, y - half_y, 2 * half_x, 2 * half_y, rect) < self.radius_sq
+
+    def preload(self, start: int = 0, stop: int | None = None):
+        """ 起動時にまとめて回転画像を作っておく (max_size まで。start〜stop だけ作ることもできる) """
+        limit = min(self.buckets, self.max_size)
+        for index in range(start, limit if stop is None else min(stop, limit)):
+            self.get(index * self.step)
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+class SimClock:
+    """
+    固定刻みのシミュレーション時計
+    射撃間隔・復活時間・クリアタイム・アイテム生成などのゲーム内の時間は全てこの時計の tick で進める
+    (1 tick = 1/tick_rate 秒)。描画フレームとは切り離されているので、処理落ちしてもゲームの進み方は
+    変わらず、ヘッドレス実行では実時間より速く進めることもできる。
+    """
+    def __init__(self, tick_rate: int = SIM_TICK_RATE, max_catch_up_steps: int = MAX_CATCH_UP_STEPS):
+        self.tick_rate = tick_rate
+        self.tick_seconds = 1.0 / tick_rate
+        self.max_catch_up_steps = max_catch_up_steps
+        self.ticks = 0  # これまでに進んだ tick 数
+        self.dropped_steps = 0  # 追いつけずに捨てた tick 数
+        self._accumulator = 0.0
+        self._last_real_time: float | None = None
+
+    def advance(self):
+        """ 1 tick 進める (GameSession.step から呼ばれる) """
+        self.ticks += 1
+
+    def now_ms(self) -> float:
+        """ ゲーム内の現在時刻 (ms) """
+        return self.ticks * 1000.0 / self.tick_rate
+
+    def steps_due(self) -> int:
+        """
+        前回呼ばれてからの実時間に対して、今の描画フレームで進めるべき tick 数を返す
+        描画が遅れたフレームでは複数 tick 進めて追いつく (最大 max_catch_up_steps)
+        """
+        now = time.perf_counter()
+        if self._last_real_time is None:
+            self._last_real_time = now
+            return 1
+        self._accumulator += now - self._last_real_time
+        self._last_real_time = now
+        steps = int(self._accumulator / self.tick_seconds)
+        if steps > self.max_catch_up_steps:
+            # 追いつけない分は捨てる (その間だけゲームがゆっくり進む)
+            self.dropped_steps += steps - self.max_catch_up_steps
+            steps = self.max_catch_up_steps
+            self._accumulator = 0.0
+        else:
+            self._accumulator -= steps * self.tick_seconds
+        return steps
+
+    def resync(self):
+        """ 実時間の基準をリセットする (メニュー画面などから戻ったときに、止まっていた分を追いかけないように) """
+        self._last_real_time = None
+        self._accumulator = 0.0
+
 
 class PowerItem(pg.sprite.Sprite):
     """
@@ -29,18 +658,8 @@ class PowerItem(pg.sprite.Sprite):
         super().__init__()
         self.speed = 3
         
-        # アイテム画像
-        try:
-            self.image = pg.image.load("data/PW_Item.png").convert_alpha()
-            self.image = pg.transform.scale(self.image, (75, 75))
-        except pg.error:
-            self.image = pg.Surface((10, 10))
-            self.image.fill((0, 255, 255))
-                
-        font = pg.font.Font(None, 28)
-        text_surf = font.render(" ", True, WHITE)
-        text_rect = text_surf.get_rect(center=(15, 15))
-        self.image.blit(text_surf, text_rect)
+        # アイテム画像 (キャッシュ共有)
+        self.image = ASSETS.image("data/PW_Item.png", (75, 75), (10, 10), (0, 255, 255))
         
         self.rect = self.image.get_rect(center=pos)
         
@@ -61,79 +680,124 @@ class PowerItem(pg.sprite.Sprite):
             self.kill()
 
 
-class PlayerBullet(pg.sprite.Sprite):
+class PlayerBulletStore:
     """
-    自機の弾 (ホーミング)
+    自機の弾 (ホーミング) のストア
+    1弾 = (x, y, vx, vy, damage) のタプルのリストで持ち、全弾の旋回・移動・画面外判定・ボスとの当たり判定を
+    update() の1回のループでまとめて行う。ボスの状態はフレームごとに1回だけ調べる。
+    旋回は角度に変換せず、目標へのベクトルと速度の内積・外積で判定し、回転行列で回す。
+    (自機弾は同時に十数発しかないので、NumPy の配列にすると呼び出しのオーバーヘッドの方が大きい)
     """
-    def __init__(self, pos: tuple[int, int], target: pg.sprite.Sprite,damage: int = 1):
-        super().__init__()
-        try:
-            self.image = pg.image.load("data/bullet_player.png").convert_alpha()
-            self.image = pg.transform.scale(self.image, (12, 12))
-        except pg.error:
-            self.image = pg.Surface((10, 10))
-            self.image.fill((0, 255, 255))
-        
-        self.rect = self.image.get_rect(center=pos)
-        self.target = target
-        self.speed = 8
-        self.turn_speed = 3  # ホーミングの追尾性能 (角度)
-        self.damage = damage
+    IMAGE_PATH = "data/bullet_player.png"
+    IMAGE_SIZE = (12, 12)
+    FALLBACK_SIZE = (10, 10)
+    FALLBACK_COLOR = (0, 255, 255)
+    SPEED = 8
+    TURN_SPEED = 3  # ホーミングの追尾性能 (1フレームに曲がれる角度)
 
-        # 初期ベクトル (とりあえず上)
-        self.dx = 0
-        self.dy = -self.speed
+    # 1フレームで曲がれる角度の cos / sin (毎フレーム三角関数を呼ばないよう先に求めておく)
+    TURN_COS = math.cos(math.radians(TURN_SPEED))
+    TURN_SIN = math.sin(math.radians(TURN_SPEED))
 
-    def update(self):
-        # # ターゲット参照は安全に（target が None や属性を持たない場合を考慮）
-        # if getattr(self.target, "is_active", False) or getattr(self.target, "is_ex_stage", False):
-        # ターゲット参照は安全に（target が None や属性を持たない場合を考慮）
-        if getattr(self.target, "is_active", False) or getattr(self.target, "is_ex_stage", False): # 重複削除
-            # ターゲットへの角度
-            target_dx = self.target.rect.centerx - self.rect.centerx
-            target_dy = self.target.rect.centery - self.rect.centery
-            target_angle = math.degrees(math.atan2(target_dy, target_dx))
-            
-            # 現在の角度
-            current_angle = math.degrees(math.atan2(self.dy, self.dx))
+    def __init__(self):
+        self.bullets: list[tuple[float, float, float, float, int]] = []
+        self._image: pg.Surface | None = None
 
-            # 角度の差
-            delta_angle = (target_angle - current_angle + 540) % 360 - 180  # (-180～180の範囲に)
+    def __len__(self) -> int:
+        return len(self.bullets)
 
-            # 旋回
-            if delta_angle > self.turn_speed:
-                current_angle += self.turn_speed
-            elif delta_angle < -self.turn_speed:
-                current_angle -= self.turn_speed
-            else:
-                current_angle = target_angle
-            
-            # ベクトル更新
-            rad = math.radians(current_angle)
-            self.dx = math.cos(rad) * self.speed
-            self.dy = math.sin(rad) * self.speed
+    @property
+    def image(self) -> pg.Surface:
+        if self._image is None:
+            # 画像の読み込みに display が必要なので初回に取り出しておく
+            self._image = ASSETS.image(self.IMAGE_PATH, self.IMAGE_SIZE, self.FALLBACK_SIZE, self.FALLBACK_COLOR)
+        return self._image
 
-        self.rect.x += self.dx
-        self.rect.y += self.dy
+    def emit(self, pos: tuple[int, int], damage: int = 1):
+        """ 弾を1発追加する (初期ベクトルは真上) """
+        self.bullets.append((pos[0], pos[1], 0.0, -self.SPEED, damage))
 
-        # 画面外に出たら消去
-        if not (0 < self.rect.centerx < SCREEN_WIDTH and 0 < self.rect.centery < SCREEN_HEIGHT):
-            self.kill()
+    def empty(self):
+        """ 全弾を消去する """
+        self.bullets = []
+
+    def update(self, target: "Boss") -> tuple[int, int]:
+        """
+        全弾を旋回・移動し、画面外に出た弾とボスに当たった弾を消去する
+        戻り値: (ボスに当たった弾の数, その合計ダメージ)
+        """
+        if not self.bullets:
+            return 0, 0
+        # ホーミングするか・当たり判定をするかはフレームごとに1回だけ決める
+        homing = target.is_active or target.is_ex_stage
+        check_hit = target.is_active
+        target_x, target_y = target.rect.center
+        # 弾の中心がボスの rect を弾の半分の大きさだけ広げた範囲にあればヒット (Rect.colliderect と同じ判定)
+        half_w, half_h = self.image.get_width() / 2, self.image.get_height() / 2
+        rect = target.rect
+        left, right = rect.left - half_w, rect.right + half_w
+        top, bottom = rect.top - half_h, rect.bottom + half_h
+        speed = self.SPEED
+        snap_dot = speed * self.TURN_COS
+        cos, sin = self.TURN_COS, self.TURN_SIN
+
+        survivors = []
+        hit_count = damage = 0
+        for x, y, vx, vy, bullet_damage in self.bullets:
+            if homing:
+                to_x = target_x - x
+                to_y = target_y - y
+                distance = math.sqrt(to_x * to_x + to_y * to_y)
+                # 速度と目標方向の内積・外積 (どちらも |v| * |t| 倍された cos / sin)
+                dot = vx * to_x + vy * to_y
+                cross = vx * to_y - vy * to_x
+                if dot > distance * snap_dot:
+                    # 目標との角度が TURN_SPEED 以内ならそのまま目標を向く
+                    scale = speed / distance
+                    vx, vy = to_x * scale, to_y * scale
+                elif cross > 0:
+                    vx, vy = vx * cos - vy * sin, vx * sin + vy * cos
+                else:
+                    # 真後ろのときもこちら (従来どおり角度が減る向き)
+                    vx, vy = vx * cos + vy * sin, vy * cos - vx * sin
+            x += vx
+            y += vy
+            # 画面外に出たら消去
+            if not (0 < x < SCREEN_WIDTH and 0 < y < SCREEN_HEIGHT):
+                continue
+            if check_hit and left < x < right and top < y < bottom:
+                hit_count += 1
+                damage += bullet_damage
+                continue
+            survivors.append((x, y, vx, vy, bullet_damage))
+        self.bullets = survivors
+        return hit_count, damage
+
+    def draw(self, screen: pg.Surface, want_rects: bool = False) -> list[pg.Rect]:
+        """ 全弾をまとめて描画する (want_rects=True なら描画した範囲のリストを返す) """
+        image = self.image
+        half_w, half_h = image.get_width() / 2, image.get_height() / 2
+        return blit_batch(screen, ((image, (x - half_w, y - half_h)) for x, y, _, _, _ in self.bullets), want_rects)
 
 
 class EnemyBullet(pg.sprite.Sprite):
     """
     敵の弾 (小弾)
+    サブクラスは IMAGE_* のクラス属性を差し替えるだけで画像を変更できる
     """
+    IMAGE_PATH = "data/bullet_enemy_small.png"
+    IMAGE_SIZE = (10, 10)
+    FALLBACK_SIZE = (8, 8)
+    FALLBACK_COLOR = (255, 100, 100)
+    RADIUS = 5  # 当たり判定の円の半径 (丸い弾なので画像の半分)
+
     def __init__(self, pos: tuple[int, int], angle: float, speed: float):
         super().__init__()
-        try:
-            self.image = pg.image.load("data/bullet_enemy_small.png").convert_alpha()
-            self.image = pg.transform.scale(self.image, (10, 10))
-        except pg.error:
-            self.image = pg.Surface((8, 8))
-            self.image.fill((255, 100, 100))
-        
+        self.image = ASSETS.image(self.IMAGE_PATH, self.IMAGE_SIZE, self.FALLBACK_SIZE, self.FALLBACK_COLOR)
+        self.reset(pos, angle, speed)
+
+    def reset(self, pos: tuple[int, int], angle: float, speed: float):
+        """ 発射時の状態にする (SpritePool から再利用するときにも呼ばれる) """
         self.rect = self.image.get_rect(center=pos)
         
         rad = math.radians(angle)
@@ -147,39 +811,56 @@ class EnemyBullet(pg.sprite.Sprite):
         self.rect.y += self.dy
         # (画面外判定はmain関数側で行う)
 
+    def collides(self, rect: pg.Rect) -> bool:
+        """ rect (自機の hitbox / grazebox) と当たっているか (半径 RADIUS の円と矩形で判定) """
+        x, y = self.rect.center
+        ex = max(rect.left - x, x - rect.right, 0)
+        ey = max(rect.top - y, y - rect.bottom, 0)
+        return ex * ex + ey * ey < self.RADIUS * self.RADIUS
+
 
 class EnemyLargeBullet(EnemyBullet):
     """
     敵の弾 (大弾)
     """
-    def __init__(self, pos: tuple[int, int], angle: float, speed: float):
-        super().__init__(pos, angle, speed)
-        try:
-            self.image = pg.image.load("data/bullet_enemy_large.png").convert_alpha()
-            self.image = pg.transform.scale(self.image, (25, 25))
-        except pg.error:
-            self.image = pg.Surface((20, 20))
-            self.image.fill((255, 50, 50))
-        self.rect = self.image.get_rect(center=pos)
+    IMAGE_PATH = "data/bullet_enemy_large.png"
+    IMAGE_SIZE = (25, 25)
+    FALLBACK_SIZE = (20, 20)
+    FALLBACK_COLOR = (255, 50, 50)
+    RADIUS = 12.5
 
 
 class EnemyLaser(EnemyBullet):
     """
     敵の弾 (細レーザー)
+    回転済み画像は全インスタンスで共有する RotationCache から取り出す
     """
-    def __init__(self, pos: tuple[int, int], angle: float, speed: float):
-        super().__init__(pos, angle, speed)
-        try:
-            self.original_image = pg.image.load("data/laser.png").convert_alpha()
-            self.original_image = pg.transform.scale(self.original_image, (100, 5))  # 細長い画像
-        except pg.error:
-            self.original_image = pg.Surface((100, 5))
-            self.original_image.fill((255, 200, 0))
-        
-        # 角度に合わせて画像を回転
-        self.image = pg.transform.rotate(self.original_image, -angle)
+    rotations: RotationCache | None = None
+
+    def reset(self, pos: tuple[int, int], angle: float, speed: float):
+        super().reset(pos, angle, speed)
+        # 角度に合わせて回転済みの画像を取り出す
+        rotations = self.get_rotations()
+        self.image = rotations.get(angle)
         self.rect = self.image.get_rect(center=pos)
-        # 細レーザーは当たり判定が大きくなりがちなので、rectを少し小さくする
+        self.rot_index = rotations.bucket(angle)  # 当たり判定のカプセルの向き
+
+    def collides(self, rect: pg.Rect) -> bool:
+        """
+        斜めのレーザーは rect (外接矩形) だと当たり判定が大きすぎるので、
+        外接矩形で当たったものだけ回転に合わせたカプセルで判定し直す
+        """
+        if not rect.colliderect(self.rect):
+            return False
+        return self.get_rotations().hits_rect(self.rect.centerx, self.rect.centery, self.rot_index, rect)
+
+    @classmethod
+    def get_rotations(cls) -> RotationCache:
+        """ 回転キャッシュを返す (初回に作成。画像の読み込みに display が必要なため遅延生成) """
+        if cls.rotations is None:
+            original_image = ASSETS.image("data/laser.png", (100, 5), (100, 5), (255, 200, 0))  # 細長い画像
+            cls.rotations = RotationCache(original_image)
+        return cls.rotations
 
 
 class EnemyDelayedLaser(pg.sprite.Sprite):
@@ -196,28 +877,19 @@ class EnemyDelayedLaser(pg.sprite.Sprite):
         
         self.state = "warning"  # 'warning' -> 'active' -> 'finished'
         
-        try:
-            self.warn_image = pg.image.load("data/laser_warning.png").convert_alpha()
-            self.warn_image = pg.transform.scale(self.warn_image, (30, 300))
-        except pg.error:
-            self.warn_image = pg.Surface((30, 300))
-            self.warn_image.fill((100, 100, 0))
-        
-        # 警告画像を半透明にする
-        self.warn_image.set_alpha(100) 
-
-        try:
-            self.active_image = pg.image.load("data/laser.png").convert_alpha()
-            self.active_image = pg.transform.scale(self.active_image, (30, 300))
-        except pg.error:
-            self.active_image = pg.Surface((30, 300))
-            self.active_image.fill((255, 255, 0))
+        # 警告画像は半透明 (alpha=100) の状態でキャッシュする
+        self.warn_image = ASSETS.image("data/laser_warning.png", (30, 300), (30, 300), (100, 100, 0), alpha=100)
+        self.active_image = ASSETS.image("data/laser.png", (30, 300), (30, 300), (255, 255, 0))
 
         self.image = self.warn_image
         self.rect = self.image.get_rect(center=self.pos)
         
         self.grazed = False  # GRAZE判定用フラグ
 
+    def collides(self, rect: pg.Rect) -> bool:
+        """ rect (自機の hitbox / grazebox) と当たっているか (縦長の矩形なので外接矩形で正確) """
+        return rect.colliderect(self.rect)
+
     def update(self):
         self.timer += 1
         
@@ -242,10 +914,13 @@ class BombArea:
     """
     ボム効果エリア（敵弾消滅範囲）
     """
+    # 描画用の円とフレームごとの alpha 値の表 ((半径, 持続フレーム数) ごとに1度だけ作る)
+    _overlay_cache: dict[tuple[int, int], tuple[pg.Surface, list[int]]] = {}
+
     def __init__(self, center_pos: tuple[int, int]):
         # 設定値
         self.radius = 300 
-        self.duration_frames = 2 * FPS  # 2秒 * FPS (60) = 120フレーム
+        self.duration_frames = 2 * SIM_TICK_RATE  # 2秒 * SIM_TICK_RATE (60) = 120フレーム
         
         # 実行時変数
         self.center = center_pos
@@ -262,81 +937,623 @@ class BombArea:
             if self.timer >= self.duration_frames:
                 self.is_active = False
 
-    def check_collision_and_kill(self, enemy_bullets: pg.sprite.Group) -> int:
+    def check_collision_and_kill(self, enemy_bullets: "EnemyBulletStore") -> int:
         """
         敵弾との衝突判定を行い、範囲内の敵弾を消滅させる。
         消滅させた弾の数を返す。
         """
         if not self.is_active:
             return 0
-            
-        bullets_killed_count = 0
-        
-        # 敵弾リストを逆順にイテレートし、killしても安全にする
-        for bullet in list(enemy_bullets):
-            # 弾とボムエリアの中心間の距離を計算
-            dist = math.hypot(bullet.rect.centerx - self.center[0], bullet.rect.centery - self.center[1])
-            
-            # 距離が半径より小さければ衝突
-            if dist < self.radius:
-                bullet.kill()
-                bullets_killed_count += 1
-                
-        return bullets_killed_count
+        # 距離が半径より小さい弾をストア側でまとめて消去する
+        return enemy_bullets.kill_in_circle(self.center, self.radius)
 
-    def draw(self, screen: pg.Surface):
+    @classmethod
+    def get_overlay(cls, radius: int, duration_frames: int) -> tuple[pg.Surface, list[int]]:
+        """
+        描画用の円 Surface と、タイマー値ごとの alpha 値の表を返す
+        円は colorkey で周囲を抜いた Surface を1枚だけ作り、描画時に set_alpha で透明度を変える
+        (alpha 値ごとに 600x600 の Surface を持つと 100MB を超えるため)
+        """
+        key = (radius, duration_frames)
+        overlay = cls._overlay_cache.get(key)
+        if overlay is None:
+            surface = pg.Surface((radius * 2, radius * 2))
+            surface.fill(BLACK)
+            surface.set_colorkey(BLACK)  # 円の外側は透明
+            color = (255, 165, 0) # オレンジ
+            pg.draw.circle(surface, color, (radius, radius), radius, 0)
+
+            # 警告的な薄いオレンジ色 (alpha 150)。最初と最後の30Fで点滅を表現
+            alpha_table = []
+            for timer in range(duration_frames + 1):
+                alpha = 150
+                if timer < 30 or duration_frames - timer < 30:
+                    # abs(math.sin(timer * 0.5)) で0から1を周期的に変動
+                    alpha = 150 + int(100 * abs(math.sin(timer * 0.5)))
+                alpha_table.append(min(255, alpha))
+
+            overlay = (surface, alpha_table)
+            cls._overlay_cache[key] = overlay
+        return overlay
+
+    def draw(self, screen: pg.Surface, simple: bool = False) -> pg.Rect | None:
         """
         ボムエリアの円を描画する (可視化用)
+        simple=True なら半透明の円の代わりに輪郭だけ描く (負荷が高いとき)
+        描画した範囲を返す
         """
+        if self.is_active and simple:
+            return pg.draw.circle(screen, (255, 165, 0), self.center, self.radius, 3)
         if self.is_active:
-            # 警告的な薄いオレンジ色で円を描画
-            alpha = 150
-            # 最初と最後の30Fで点滅を表現
-            if self.timer < 30 or self.duration_frames - self.timer < 30: 
-                # abs(math.sin(self.timer * 0.5)) で0から1を周期的に変動
-                alpha = 150 + int(100 * abs(math.sin(self.timer * 0.5)))
-                
-            s = pg.Surface((self.radius * 2, self.radius * 2), pg.SRCALPHA)
-            s.fill((0, 0, 0, 0)) # 透明なサーフェス
-            
-            color = (255, 165, 0) # オレンジ
-            # 半透明の円を描画 (色 + alpha値)
-            pg.draw.circle(s, color + (min(255, alpha),), (self.radius, self.radius), self.radius, 0)
-            
+            surface, alpha_table = self.get_overlay(self.radius, self.duration_frames)
+            surface.set_alpha(alpha_table[self.timer])
             # 画面に描画
-            screen.blit(s, (self.center[0] - self.radius, self.center[1] - self.radius))
+            return screen.blit(surface, (self.center[0] - self.radius, self.center[1] - self.radius))
+        return None
 
 
 class EnemyHugeBullet(EnemyBullet):
     """
     敵の弾 (特大弾) - EX専用
     """
-    def __init__(self, pos: tuple[int, int], angle: float, speed: float):
-        # 注意: EnemyBullet.__init__ で image を読み替えられるので、ここでは自前で上書きする
-        super().__init__(pos, angle, speed)
-        try:
-            self.image = pg.image.load("data/bullet_enemy_huge.png").convert_alpha()
-            self.image = pg.transform.scale(self.image, (40, 40))
-        except (pg.error, FileNotFoundError):
-            # 大きくて目立つダミー Surface
-            self.image = pg.Surface((35, 35))
-            self.image.fill((100, 0, 255))
-        self.rect = self.image.get_rect(center=pos)
-        # dx/dy は親クラスで設定済み
+    IMAGE_PATH = "data/bullet_enemy_huge.png"
+    IMAGE_SIZE = (40, 40)
+    FALLBACK_SIZE = (35, 35)  # 大きくて目立つダミー Surface
+    FALLBACK_COLOR = (100, 0, 255)
+    RADIUS = 20
+
+
+class UniformGrid:
+    """
+    一様グリッド (当たり判定のブロードフェーズ)
+    画面を cell_size 四方のマスに分け、各マスに重なっている物体を登録する。
+    問い合わせでは rect が重なるマスの物体だけを返すので、
+    判定のコストは全体の弾数ではなく、その周辺の弾の密度で決まる。
+    """
+    def __init__(self, cell_size: int = GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cols = SCREEN_WIDTH // cell_size + 1
+        self.rows = SCREEN_HEIGHT // cell_size + 1
+        self.cells: dict[int, list] = {}
+
+    def _cell_range(self, rect: pg.Rect) -> tuple[int, int, int, int]:
+        """ rect が重なるマスの範囲 (画面内に制限) """
+        size = self.cell_size
+        left = min(max(rect.left // size, 0), self.cols - 1)
+        right = min(max((rect.right - 1) // size, 0), self.cols - 1)
+        top = min(max(rect.top // size, 0), self.rows - 1)
+        bottom = min(max((rect.bottom - 1) // size, 0), self.rows - 1)
+        return left, right, top, bottom
+
+    def clear(self):
+        self.cells.clear()
+
+    def insert(self, item, rect: pg.Rect):
+        """ rect が重なる全てのマスに item を登録する """
+        left, right, top, bottom = self._cell_range(rect)
+        cells = self.cells
+        for row in range(top, bottom + 1):
+            base = row * self.cols
+            for col in range(left, right + 1):
+                cells.setdefault(base + col, []).append(item)
+
+    def query(self, rect: pg.Rect) -> set:
+        """ rect が重なるマスに登録された物体を返す (重複なし、候補なので厳密な判定は呼び出し側で行う) """
+        left, right, top, bottom = self._cell_range(rect)
+        cells = self.cells
+        found = set()
+        for row in range(top, bottom + 1):
+            base = row * self.cols
+            for col in range(left, right + 1):
+                items = cells.get(base + col)
+                if items:
+                    found.update(items)
+        return found
+
+
+class SpriteBulletStore:
+    """
+    敵弾ストア (Sprite 版)
+    1弾 = 1 Sprite として pg.sprite.Group で管理する従来方式。
+    main と EX_STAGE はストアのメソッドだけを呼ぶので、ArrayBulletStore と差し替えられる。
+    当たり判定用の UniformGrid は update() の中で毎フレーム作り直す。
+    """
+    def __init__(self, pool: SpritePool | None = None):
+        self.pool = pool if pool is not None else BULLET_POOL
+        self.group = PooledGroup(self.pool)  # 消えた弾はプールに戻る
+        self.grid = UniformGrid()
+
+    def __len__(self) -> int:
+        return len(self.group)
+
+    def emit(self, bullet_type: type, pos: tuple[int, int], angle: float, speed: float):
+        """ 移動する敵弾 (EnemyBullet とそのサブクラス) を発射する """
+        self.group.add(self.pool.acquire(bullet_type, pos, angle, speed))
+
+    def add(self, *sprites: pg.sprite.Sprite):
+        """ 置きレーザーなど、Sprite のまま扱う弾を追加する """
+        self.group.add(*sprites)
+
+    def update(self) -> int:
+        """
+        全弾を移動し、画面外に出た弾を消去する
+        避けきった (画面外に出た) 弾の数を返す
+        """
+        avoided_count = 0
+        grid = self.grid
+        grid.clear()
+        for bullet in list(self.group):  # list() でコピーを作成してイテレート
+            bullet.update()
+            if not SCREEN_RECT.colliderect(bullet.rect):
+                bullet.kill()
+                avoided_count += 1
+            elif not (isinstance(bullet, EnemyDelayedLaser) and bullet.state != "active"):
+                # 置きレーザーが 'warning' 状態ならグリッドに登録しない (判定しない)
+                grid.insert(bullet, bullet.rect)
+        return avoided_count
+
+    def collide_player(self, player: "Player") -> tuple[int, bool]:
+        """
+        自機との GRAZE / 被弾判定
+        戻り値: (新たに GRAZE した弾の数, 被弾したかどうか)
+        """
+        graze_count = 0
+        is_hit = False
+        hitbox = player.hitbox
+        grazebox = player.grazebox
+        # grazebox と hitbox の周辺のマスにいる弾だけを調べる
+        for bullet in self.grid.query(grazebox.union(hitbox)):
+            if not bullet.alive():
+                continue  # update() の後に消去された弾
+            # 被弾判定 (hitbox)
+            if bullet.collides(hitbox):
+                is_hit = True
+            # GRAZE (かすり) 判定 (hitbox とは当たっていない弾のみ)
+            elif not bullet.grazed and bullet.collides(grazebox):
+                graze_count += 1
+                bullet.grazed = True
+        return graze_count, is_hit
+
+    def kill_in_circle(self, center: tuple[int, int], radius: float) -> int:
+        """ 円の内側にある弾を消去し、消去した数を返す """
+        center_x, center_y = center
+        radius_sq = radius * radius
+        # 平方根を取らずに2乗距離で比較し、該当する弾をまとめて取り除く
+        doomed = [bullet for bullet in self.group
+                  if (bullet.rect.centerx - center_x) ** 2 + (bullet.rect.centery - center_y) ** 2 < radius_sq]
+        if doomed:
+            self.group.remove(*doomed)
+        return len(doomed)
+
+    def empty(self):
+        """ 全弾を消去する """
+        self.group.empty()
+        self.grid.clear()
+
+    def enforce_cap(self, cap: int) -> int:
+        """
+        移動する敵弾が cap 個を超えていたら、超えた分を古い弾から消去する (負荷が高いときの上限)
+        画面の外へ向かっている (画面の中心から離れる向きに進む) 弾を優先して消し、消した数を返す
+        """
+        # Group は追加した順に並んでいるので、先頭ほど古い (置きレーザーは対象外)
+        movers = [bullet for bullet in self.group if isinstance(bullet, EnemyBullet)]
+        excess = len(movers) - cap
+        if excess <= 0:
+            return 0
+        center_x, center_y = SCREEN_RECT.center
+        outward = [bullet for bullet in movers
+                   if (bullet.rect.centerx - center_x) * bullet.dx + (bullet.rect.centery - center_y) * bullet.dy > 0]
+        doomed = outward[:excess]
+        if len(doomed) < excess:
+            outward_set = set(outward)
+            doomed += [bullet for bullet in movers if bullet not in outward_set][:excess - len(doomed)]
+        self.group.remove(*doomed)
+        return excess
+
+    def motion_arrays(self) -> tuple[np.ndarray, ...]:
+        """
+        移動する敵弾の中心・速度・当たり判定の半径・カプセルの中心から端までのベクトル (丸い弾は 0) を
+        配列で返す (回避ボット用)
+        """
+        rows = []
+        for bullet in self.group:
+            if isinstance(bullet, EnemyLaser):
+                rotations = bullet.get_rotations()
+                half_x, half_y = rotations.half_vectors[bullet.rot_index]
+                radius = math.sqrt(rotations.radius_sq)
+            elif isinstance(bullet, EnemyBullet):
+                half_x = half_y = 0.0
+                radius = bullet.RADIUS
+            else:
+                continue
+            rows.append((bullet.rect.centerx, bullet.rect.centery, bullet.dx, bullet.dy, radius, half_x, half_y))
+        if not rows:
+            return tuple(np.zeros(0) for _ in range(7))
+        return tuple(np.array(rows, dtype=float).T)
+
+    def delayed_lasers(self) -> list[EnemyDelayedLaser]:
+        """ 置きレーザー (警告中を含む) のリスト """
+        return [bullet for bullet in self.group if isinstance(bullet, EnemyDelayedLaser)]
+
+    def snapshot_arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        セーブステート用に、移動する弾 (SNAPSHOT_BULLET_DTYPE) と置きレーザー (SNAPSHOT_LASER_DTYPE) を配列にする
+        弾の種類の番号は ArrayBulletStore.KINDS と共通なので、どちらの方式にも読み込める
+        """
+        movers = [bullet for bullet in self.group if isinstance(bullet, EnemyBullet)]
+        bullets = np.zeros(len(movers), dtype=SNAPSHOT_BULLET_DTYPE)
+        if movers:
+            bullets["kind"] = [ArrayBulletStore.KINDS.index(type(bullet)) for bullet in movers]
+            bullets["grazed"] = [bullet.grazed for bullet in movers]
+            bullets["rot"] = [getattr(bullet, "rot_index", 0) for bullet in movers]
+            bullets["x"] = [bullet.rect.centerx for bullet in movers]
+            bullets["y"] = [bullet.rect.centery for bullet in movers]
+            bullets["vx"] = [bullet.dx for bullet in movers]
+            bullets["vy"] = [bullet.dy for bullet in movers]
+        lasers = self.delayed_lasers()
+        laser_array = np.array([(laser.pos[0], laser.pos[1], laser.delay, laser.duration, laser.timer,
+                                 laser.state == "active", laser.grazed) for laser in lasers],
+                               dtype=SNAPSHOT_LASER_DTYPE)
+        return bullets, laser_array
+
+    def restore_arrays(self, bullets: np.ndarray, lasers: np.ndarray):
+        """ snapshot_arrays の配列から弾を作り直す (今ある弾は全て消す) """
+        self.empty()
+        kinds = ArrayBulletStore.KINDS
+        for kind, grazed, rot, x, y, vx, vy in bullets.tolist():
+            bullet_type = kinds[kind]
+            # 細レーザーは回転インデックスの角度で画像を選び、速度は保存した値をそのまま使う
+            angle = rot * EnemyLaser.get_rotations().step if bullet_type is EnemyLaser else 0.0
+            bullet = self.pool.acquire(bullet_type, (round(x), round(y)), angle, 0.0)
+            bullet.dx, bullet.dy, bullet.grazed = vx, vy, grazed
+            self.group.add(bullet)
+        for x, y, delay, duration, timer, active, grazed in lasers.tolist():
+            laser = EnemyDelayedLaser((x, y), delay, duration)
+            laser.timer, laser.grazed = timer, grazed
+            if active:
+                laser.state = "active"
+                laser.image = laser.active_image
+                laser.rect = laser.image.get_rect(center=laser.pos)
+            self.group.add(laser)
+
+    def draw(self, screen: pg.Surface, want_rects: bool = False, cheap: bool = False) -> list[pg.Rect]:
+        """
+        全弾をまとめて描画する (want_rects=True なら描画した範囲のリストを返す)
+        cheap=True なら移動する弾を α 合成なしの簡易版の画像で描く
+        """
+        if cheap:
+            return blit_batch(screen, ((ASSETS.cheap(sprite.image) if isinstance(sprite, EnemyBullet) else sprite.image,
+                                        sprite.rect) for sprite in self.group), want_rects)
+        return blit_sprites(screen, self.group, want_rects)
+
+
+class ArrayBulletStore:
+    """
+    敵弾ストア (NumPy 配列版)
+    移動する敵弾 (小弾・大弾・細レーザー・特大弾) の位置・速度・種類・GRAZE済み・生存フラグを
+    連続した配列で持ち、移動・画面外判定・詰め直しを数回の配列演算で行う。
+    位置は float で持つので rect.x += dx による小数点以下の切り捨ても起こらない。
+    置きレーザーは移動しないため、従来どおり内部の SpriteBulletStore で管理する。
+    """
+    KINDS = (EnemyBullet, EnemyLargeBullet, EnemyLaser, EnemyHugeBullet)
+    LASER_KIND = 2
+
+    def __init__(self, capacity: int = 256):
+        self.count = 0  # 配列の先頭 count 個が生きている弾
+        self._allocate(capacity)
+        self.sprites = SpriteBulletStore()  # 置きレーザー用
+        self._kind_images: list[pg.Surface] | None = None
+
+    def _allocate(self, capacity: int):
+        self.capacity = capacity
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.hw = np.zeros(capacity)  # 当たり判定の半幅
+        self.hh = np.zeros(capacity)  # 当たり判定の半高
+        self.radius = np.zeros(capacity)  # 当たり判定の円の半径 (細レーザーは外接円)
+        self.kind = np.zeros(capacity, dtype=np.int8)
+        self.rot = np.zeros(capacity, dtype=np.int16)  # 細レーザーの回転インデックス
+        self.grazed = np.zeros(capacity, dtype=bool)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+    def _grow(self):
+        """ 容量を2倍に広げる """
+        n = self.count
+        old = (self.x, self.y, self.vx, self.vy, self.hw, self.hh, self.radius, self.kind, self.rot,
+               self.grazed, self.alive)
+        self._allocate(self.capacity * 2)
+        new = (self.x, self.y, self.vx, self.vy, self.hw, self.hh, self.radius, self.kind, self.rot,
+               self.grazed, self.alive)
+        for src, dst in zip(old, new):
+            dst[:n] = src[:n]
+
+    def __len__(self) -> int:
+        return self.count + len(self.sprites)
+
+    def emit(self, bullet_type: type, pos: tuple[int, int], angle: float, speed: float):
+        """ 移動する敵弾を配列に追加する (Sprite は生成しない) """
+        if self.count == self.capacity:
+            self._grow()
+        i = self.count
+        rad = math.radians(angle)
+        self.x[i] = pos[0]
+        self.y[i] = pos[1]
+        self.vx[i] = math.cos(rad) * speed
+        self.vy[i] = math.sin(rad) * speed
+        kind = self.KINDS.index(bullet_type)
+        if kind == self.LASER_KIND:
+            rotations = EnemyLaser.get_rotations()
+            self.rot[i] = rotations.bucket(angle)
+            image = rotations.get(angle)
+        else:
+            self.rot[i] = 0  # 丸弾は回転しない (前の弾の値を残さない)
+            image = self._image(kind, 0)
+        width, height = image.get_size()
+        self.hw[i] = width / 2
+        self.hh[i] = height / 2
+        # 細レーザーは外接円で候補を絞り、カプセルで判定し直す
+        self.radius[i] = math.hypot(width, height) / 2 if kind == self.LASER_KIND else bullet_type.RADIUS
+        self.kind[i] = kind
+        self.grazed[i] = False
+        self.alive[i] = True
+        self.count += 1
+
+    def add(self, *sprites: pg.sprite.Sprite):
+        """ 置きレーザーなど、Sprite のまま扱う弾を追加する """
+        self.sprites.add(*sprites)
+
+    def _image(self, kind: int, rot: int) -> pg.Surface:
+        """ 種類 (と回転インデックス) に対応する画像を返す """
+        if kind == self.LASER_KIND:
+            rotations = EnemyLaser.get_rotations()
+            return rotations.get(rot * rotations.step)
+        if self._kind_images is None:
+            # 画像の読み込みに display が必要なので初回に取り出しておく
+            self._kind_images = [ASSETS.image(t.IMAGE_PATH, t.IMAGE_SIZE, t.FALLBACK_SIZE, t.FALLBACK_COLOR)
+                                 for t in self.KINDS]
+        return self._kind_images[kind]
+
+    def _overlap(self, rect: pg.Rect) -> np.ndarray:
+        """ rect と重なっている弾のマスク (Rect.colliderect と同じ判定) """
+        n = self.count
+        x, y, hw, hh = self.x[:n], self.y[:n], self.hw[:n], self.hh[:n]
+        return ((x - hw < rect.right) & (x + hw > rect.left) &
+                (y - hh < rect.bottom) & (y + hh > rect.top))
+
+    def _compact(self):
+        """ 死んだ弾を取り除き、生きている弾を配列の先頭に詰め直す """
+        n = self.count
+        keep = self.alive[:n]
+        m = int(np.count_nonzero(keep))
+        if m == n:
+            return
+        for arr in (self.x, self.y, self.vx, self.vy, self.hw, self.hh, self.radius, self.kind, self.rot,
+                    self.grazed, self.alive):
+            arr[:m] = arr[:n][keep]
+        self.count = m
+
+    def update(self) -> int:
+        """
+        全弾をまとめて移動し、画面外に出た弾を消去する
+        避けきった (画面外に出た) 弾の数を返す
+        """
+        avoided_count = self.sprites.update()
+        n = self.count
+        if n:
+            self.x[:n] += self.vx[:n]
+            self.y[:n] += self.vy[:n]
+            on_screen = self._overlap(SCREEN_RECT)
+            avoided_count += n - int(np.count_nonzero(on_screen))
+            self.alive[:n] = on_screen
+            self._compact()
+        return avoided_count
+
+    def collide_player(self, player: "Player") -> tuple[int, bool]:
+        """
+        自機との GRAZE / 被弾判定
+        戻り値: (新たに GRAZE した弾の数, 被弾したかどうか)
+        """
+        graze_count, hit = self.sprites.collide_player(player)
+        if self.count:
+            hit_index, graze_index = self._collide_indices(player.hitbox, player.grazebox)
+            new_graze = graze_index[~self.grazed[graze_index]]
+            self.grazed[new_graze] = True
+            graze_count += len(new_graze)
+            hit = hit or len(hit_index) > 0
+        return graze_count, hit
+
+    @staticmethod
+    def _rect_distance_sq(x: np.ndarray, y: np.ndarray, rect: pg.Rect) -> np.ndarray:
+        """ 各点 (x, y) から矩形 rect までの距離の2乗 (内側なら 0) """
+        ex = np.maximum(np.maximum(rect.left - x, x - rect.right), 0.0)
+        ey = np.maximum(np.maximum(rect.top - y, y - rect.bottom), 0.0)
+        return ex * ex + ey * ey
+
+    def _collide_indices(self, hitbox: pg.Rect, grazebox: pg.Rect) -> tuple[np.ndarray, np.ndarray]:
+        """
+        hitbox / grazebox と当たっている弾のインデックスをまとめて求める
+        戻り値: (hitbox に当たった弾, grazebox に当たったが hitbox には当たっていない弾)
+        丸い弾は円と矩形で判定し、細レーザーは外接円で当たった候補だけカプセルで判定し直す
+        """
+        n = self.count
+        x, y, radius = self.x[:n], self.y[:n], self.radius[:n]
+        # hitbox と grazebox を両方含む矩形で、近くにいる弾だけに絞る
+        near = np.flatnonzero(self._rect_distance_sq(x, y, hitbox.union(grazebox)) < radius * radius)
+        if not len(near):
+            return near, near
+        x, y = x[near], y[near]
+        radius_sq = radius[near] ** 2
+        in_hitbox = self._rect_distance_sq(x, y, hitbox) < radius_sq
+        in_grazebox = self._rect_distance_sq(x, y, grazebox) < radius_sq
+
+        lasers = np.flatnonzero(self.kind[near] == self.LASER_KIND)
+        if len(lasers):
+            rotations = EnemyLaser.get_rotations()
+            for j, lx, ly, rot in zip(lasers.tolist(), x[lasers].tolist(), y[lasers].tolist(),
+                                      self.rot[near[lasers]].tolist()):
+                in_hitbox[j] = rotations.hits_rect(lx, ly, rot, hitbox)
+                in_grazebox[j] = rotations.hits_rect(lx, ly, rot, grazebox)
+        return near[in_hitbox], near[in_grazebox & ~in_hitbox]
+
+    def kill_in_circle(self, center: tuple[int, int], radius: float) -> int:
+        """ 円の内側にある弾を消去し、消去した数を返す """
+        killed_count = self.sprites.kill_in_circle(center, radius)
+        n = self.count
+        if n:
+            # 全弾の中心との2乗距離を一度に求め、円の内側の弾をまとめて消す
+            dx = self.x[:n] - center[0]
+            dy = self.y[:n] - center[1]
+            inside = dx * dx + dy * dy < radius * radius
+            killed_count += int(np.count_nonzero(inside))
+            self.alive[:n] &= ~inside
+            self._compact()
+        return killed_count
+
+    def empty(self):
+        """ 全弾を消去する """
+        self.count = 0
+        self.sprites.empty()
+
+    def enforce_cap(self, cap: int) -> int:
+        """
+        移動する敵弾が cap 個を超えていたら、超えた分を古い弾から消去する (負荷が高いときの上限)
+        画面の外へ向かっている (画面の中心から離れる向きに進む) 弾を優先して消し、消した数を返す
+        """
+        n = self.count
+        excess = n - cap
+        if excess <= 0:
+            return 0
+        center_x, center_y = SCREEN_RECT.center
+        outward = (self.x[:n] - center_x) * self.vx[:n] + (self.y[:n] - center_y) * self.vy[:n] > 0
+        # 配列は発射した順に並んでいる (詰め直しても順番は変わらない) ので、先頭ほど古い
+        doomed = np.flatnonzero(outward)[:excess]
+        if len(doomed) < excess:
+            doomed = np.concatenate((doomed, np.flatnonzero(~outward)[:excess - len(doomed)]))
+        self.alive[doomed] = False
+        self._compact()
+        return excess
+
+    def motion_arrays(self) -> tuple[np.ndarray, ...]:
+        """
+        移動する敵弾の中心・速度・当たり判定の半径・カプセルの中心から端までのベクトル (丸い弾は 0) を
+        配列で返す (回避ボット用)
+        """
+        n = self.count
+        radius = self.radius[:n].copy()
+        half = np.zeros((n, 2))
+        lasers = np.flatnonzero(self.kind[:n] == self.LASER_KIND)
+        if len(lasers):
+            rotations = EnemyLaser.get_rotations()
+            half[lasers] = rotations.half_vector_array[self.rot[lasers]]
+            radius[lasers] = math.sqrt(rotations.radius_sq)  # 外接円ではなくカプセルの太さ
+        return self.x[:n], self.y[:n], self.vx[:n], self.vy[:n], radius, half[:, 0], half[:, 1]
+
+    def delayed_lasers(self) -> list[EnemyDelayedLaser]:
+        """ 置きレーザー (警告中を含む) のリスト """
+        return self.sprites.delayed_lasers()
+
+    def snapshot_arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """ セーブステート用に、移動する弾と置きレーザーを配列にする (SpriteBulletStore と同じ形式) """
+        n = self.count
+        bullets = np.zeros(n, dtype=SNAPSHOT_BULLET_DTYPE)
+        bullets["kind"] = self.kind[:n]
+        bullets["grazed"] = self.grazed[:n]
+        bullets["rot"] = self.rot[:n]
+        bullets["x"] = self.x[:n]
+        bullets["y"] = self.y[:n]
+        bullets["vx"] = self.vx[:n]
+        bullets["vy"] = self.vy[:n]
+        return bullets, self.sprites.snapshot_arrays()[1]
+
+    def restore_arrays(self, bullets: np.ndarray, lasers: np.ndarray):
+        """ snapshot_arrays の配列を読み込む (今ある弾は全て消す) """
+        self.empty()
+        n = len(bullets)
+        while self.capacity < n:
+            self._grow()
+        kind = bullets["kind"]
+        rot = bullets["rot"]
+        self.kind[:n] = kind
+        self.rot[:n] = rot
+        self.grazed[:n] = bullets["grazed"]
+        self.x[:n] = bullets["x"]
+        self.y[:n] = bullets["y"]
+        self.vx[:n] = bullets["vx"]
+        self.vy[:n] = bullets["vy"]
+        self.alive[:n] = True
+        # 当たり判定の大きさは画像から求め直す (画像の種類ごと、細レーザーは回転インデックスごとに1回)
+        for k in np.unique(kind).tolist():
+            index = np.flatnonzero(kind == k)
+            if k == self.LASER_KIND:
+                for r in np.unique(rot[index]).tolist():
+                    laser_index = index[rot[index] == r]
+                    width, height = self._image(k, r).get_size()
+                    self.hw[laser_index] = width / 2
+                    self.hh[laser_index] = height / 2
+                    self.radius[laser_index] = math.hypot(width, height) / 2
+            else:
+                width, height = self._image(k, 0).get_size()
+                self.hw[index] = width / 2
+                self.hh[index] = height / 2
+                self.radius[index] = self.KINDS[k].RADIUS
+        self.count = n
+        self.sprites.restore_arrays(bullets[:0], lasers)
+
+    def draw(self, screen: pg.Surface, want_rects: bool = False, cheap: bool = False) -> list[pg.Rect]:
+        """
+        全弾を種類ごとにまとめて描画する (小弾 → 大弾 → 細レーザー → 特大弾 → 置きレーザーの順に重なる)
+        同じ画像の弾は repeat した画像と座標を zip して blits に渡すので、弾ごとのタプルのリストは作らない
+        want_rects=True なら描画した範囲のリストを返す
+        cheap=True なら移動する弾を α 合成なしの簡易版の画像で描く
+        """
+        n = self.count
+        rects = []
+        if n:
+            kinds = self.kind[:n]
+            lefts = self.x[:n] - self.hw[:n]
+            tops = self.y[:n] - self.hh[:n]
+            for kind in range(len(self.KINDS)):
+                index = np.flatnonzero(kinds == kind)
+                if not len(index):
+                    continue
+                # NumPy の要素を1つずつ読むと遅いので、まとめて list に変換する
+                positions = zip(lefts[index].tolist(), tops[index].tolist())
+                if kind == self.LASER_KIND:
+                    images = [self._image(kind, rot) for rot in self.rot[index].tolist()]
+                    if cheap:
+                        images = [ASSETS.cheap(image) for image in images]
+                    rects += blit_batch(screen, zip(images, positions), want_rects)
+                else:
+                    image = self._image(kind, 0)
+                    if cheap:
+                        image = ASSETS.cheap(image)
+                    rects += blit_batch(screen, zip(repeat(image), positions), want_rects)
+        rects += self.sprites.draw(screen, want_rects)
+        return rects
+
+
+# 敵弾ストアの型 (どちらも同じメソッドを持つ)
+EnemyBulletStore = SpriteBulletStore | ArrayBulletStore
+
+
+def create_enemy_bullet_store() -> EnemyBulletStore:
+    """ BULLET_ENGINE の設定に応じて敵弾ストアを作る """
+    if BULLET_ENGINE == "array":
+        return ArrayBulletStore()
+    return SpriteBulletStore()
 
 
 class Player(pg.sprite.Sprite):
     """
     自機クラス
     """
-    def __init__(self, difficulty: str): # 難易度を受け取る
+    def __init__(self, difficulty: str, clock: SimClock | None = None): # 難易度とゲーム内時計を受け取る
         super().__init__()
-        try:
-            self.image = pg.image.load("data/player.png").convert_alpha()
-            self.image = pg.transform.scale(self.image, (50, 50))  # サイズ調整
-        except pg.error:
-            self.image = pg.Surface((30, 40))
-            self.image.fill((0, 128, 255))
+        self.clock = clock if clock is not None else SimClock()
+        # 点滅で set_alpha を書き換えるので、共有 Surface のコピーを持つ
+        self.image = ASSETS.image("data/player.png", (50, 50), (30, 40), (0, 128, 255)).copy()  # サイズ調整
         
         self.rect = self.image.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 50))
         
@@ -357,8 +1574,8 @@ class Player(pg.sprite.Sprite):
         else: # NORMAL (デフォルト)
             self.lives = 10
 
-        self.shoot_delay = 100  # ホーミング弾の発射間隔 (ms)
-        self.last_shot = pg.time.get_ticks()
+        self.shoot_delay = 100  # ホーミング弾の発射間隔 (ゲーム内時間の ms)
+        self.last_shot = self.clock.now_ms()
 
         # 復活関連  
         self.is_respawning = False
@@ -374,14 +1591,14 @@ class Player(pg.sprite.Sprite):
         self.items_per_level = 5
         self.is_powered_up = False
 
-    def update(self, keys: pg.key.ScancodeWrapper, bullets_group: pg.sprite.Group, target_boss: pg.sprite.Sprite):
+    def update(self, keys: pg.key.ScancodeWrapper, bullets: PlayerBulletStore):
         """
         プレイヤーの更新
         """
         
         if self.is_respawning:
             # 復活待機中 (10秒タイマー)
-            now = pg.time.get_ticks()
+            now = self.clock.now_ms()
             if now - self.respawn_timer > self.respawn_duration:
                 self.respawn()
             
@@ -418,17 +1635,17 @@ class Player(pg.sprite.Sprite):
         self.grazebox.center = self.rect.center
 
         # 射撃 (ホーミング)
-        self.shoot(bullets_group, target_boss)
+        self.shoot(bullets)
 
-    def shoot(self, bullets_group: pg.sprite.Group, target_boss: pg.sprite.Sprite):
+    def shoot(self, bullets: PlayerBulletStore):
         """
         ホーミング弾を発射する
         """
-        now = pg.time.get_ticks()
+        now = self.clock.now_ms()
         if now - self.last_shot > self.shoot_delay:
             self.last_shot = now
             damage = self.power_level + 1
-            bullets_group.add(PlayerBullet(self.rect.center, target_boss, damage))
+            bullets.emit(self.rect.center, damage)
 
     def hit(self):
         """
@@ -437,7 +1654,7 @@ class Player(pg.sprite.Sprite):
         if not self.is_respawning:
             self.lives -= 1
             self.is_respawning = True
-            self.respawn_timer = pg.time.get_ticks()
+            self.respawn_timer = self.clock.now_ms()
             
     def respawn(self):
         """
@@ -462,48 +1679,168 @@ class Player(pg.sprite.Sprite):
             self.item_count = 0
 
 
+class Emitter:
+    """
+    弾幕パターンの発射口1つ分 (PATTERN_FILE の emitters の1要素を難易度で解決したもの)
+    """
+    BULLETS = {"small": EnemyBullet, "large": EnemyLargeBullet, "laser": EnemyLaser, "huge": EnemyHugeBullet}
+    TYPES = ("ring", "aimed", "delayed_laser")
+
+    def __init__(self, spec: dict, difficulty: str):
+        values = dict(spec)
+        values.update(spec.get("difficulty", {}).get(difficulty, {}))
+        self.type = values["type"]
+        if self.type not in self.TYPES:
+            raise ValueError(f"未知の emitter type: {self.type}")
+        self.period = int(values["period"])
+        if self.period <= 0:
+            raise ValueError(f"period は1以上にしてください: {self.period}")
+        self.offset = int(values.get("offset", 0))
+        self.jitter = float(values.get("jitter", 0))
+        self.speed = float(values.get("speed", 0))
+
+        if self.type == "delayed_laser":
+            self.count = int(values.get("count", 1))
+            self.delay = int(values["delay"])
+            self.duration = int(values["duration"])
+            self.area = tuple(int(v) for v in values["area"])
+            return
+
+        bullet = values["bullet"]
+        if bullet not in self.BULLETS:
+            raise ValueError(f"未知の bullet: {bullet}")
+        self.bullet_type = self.BULLETS[bullet]
+        if self.type == "ring":
+            density = int(values["density"])
+            self.spin = float(values.get("spin", 0))
+            self.base_angles = [(360 / density) * i for i in range(density)]  # 等間隔の角度は事前に計算
+        else:  # aimed
+            count = int(values.get("count", 1))
+            spread = float(values.get("spread", 0))
+            self.base_angles = [(i - (count - 1) / 2) * spread for i in range(count)]  # 狙い方向からのずれ
+
+    def fire(self, boss: "Boss", bullets_group: "EnemyBulletStore", player_pos: tuple[int, int]):
+        """ 1回分の弾を発射する """
+        rng = boss.rng
+        jitter = self.jitter
+        if self.type == "delayed_laser":
+            x_min, y_min, x_max, y_max = self.area
+            for _ in range(self.count):
+                x = rng.randint(x_min, x_max)
+                y = rng.randint(y_min, y_max)
+                bullets_group.add(EnemyDelayedLaser((x, y), delay=self.delay, duration=self.duration))
+            return
+
+        center = boss.rect.center
+        if self.type == "ring":
+            direction = boss.pattern_timer * self.spin
+        else:
+            direction = math.degrees(math.atan2(player_pos[1] - center[1], player_pos[0] - center[0]))
+        for base_angle in self.base_angles:
+            angle = base_angle + direction
+            if jitter:
+                angle += rng.uniform(-jitter, jitter)
+            bullets_group.emit(self.bullet_type, center, angle, self.speed)
+
+
+class PatternSchedule:
+    """
+    コンパイル済みの弾幕パターン (スキル1回分)
+    発射口ごとに次に撃つフレームを持ち、どれも撃たないフレームは整数の比較1回で終わる
+    """
+    def __init__(self, emitters: list[Emitter]):
+        self.emitters = emitters
+        # 次に発射するフレーム (Boss.pattern_timer は 1 から始まる)
+        self.next_frames = [emitter.period + emitter.offset for emitter in emitters]
+        self.next_frame = min(self.next_frames, default=math.inf)
+
+    def update(self, boss: "Boss", bullets_group: "EnemyBulletStore", player_pos: tuple[int, int]):
+        frame = boss.pattern_timer
+        if frame < self.next_frame:
+            return
+        # ファイルに書いた順に発射する (乱数を使う順番を固定するため)
+        next_frames = self.next_frames
+        for i, emitter in enumerate(self.emitters):
+            if next_frames[i] <= frame:
+                emitter.fire(boss, bullets_group, player_pos)
+                next_frames[i] += emitter.period
+        self.next_frame = min(next_frames)
+
+
+class PatternLibrary:
+    """
+    PATTERN_FILE から弾幕パターンを読み込み、難易度ごとに PatternSchedule を作る
+    ファイルは初回に読み、解決済みの発射口は (パターン名, 難易度) ごとに使い回す
+    """
+    def __init__(self, path: str = PATTERN_FILE):
+        self.path = path
+        self._specs: dict[str, dict] | None = None
+        self._compiled: dict[tuple[str, str], list[Emitter]] = {}
+
+    def specs(self) -> dict[str, dict]:
+        if self._specs is None:
+            with open(self.path, encoding="utf-8") as f:
+                self._specs = {name: spec for name, spec in json.load(f).items() if not name.startswith("_")}
+        return self._specs
+
+    def names(self) -> list[str]:
+        return list(self.specs())
+
+    def compile(self, name: str, difficulty: str) -> PatternSchedule:
+        """ パターン name を difficulty の値で解決し、新しい PatternSchedule を返す """
+        key = (name, difficulty)
+        emitters = self._compiled.get(key)
+        if emitters is None:
+            specs = self.specs()
+            if name not in specs:
+                raise KeyError(f"{self.path} に弾幕パターン {name} がありません")
+            emitters = [Emitter(spec, difficulty) for spec in specs[name]["emitters"]]
+            self._compiled[key] = emitters
+        return PatternSchedule(emitters)
+
+    def reload(self):
+        """ ファイルを読み直す (次にスキルを開始したときから反映) """
+        self._specs = None
+        self._compiled.clear()
+
+
+# 全ボスで共有する弾幕パターン
+PATTERNS = PatternLibrary()
+
+
 class Boss(pg.sprite.Sprite):
     """
     ボスクラス - EXステージ対応を追加
     """
-    def __init__(self, difficulty: str):  # 難易度を受け取る
+    # スキル (名前, 弾幕パターン名)。HP は難易度ごとに BOSS_HP / EX_BOSS_HP から決める
+    # 弾幕パターンの中身は PATTERN_FILE に書き、スキル開始時に PatternSchedule にコンパイルする
+    SKILLS = (("STAGE1", "skill_pattern_1"), ("STAGE2", "skill_pattern_2"), ("STAGE3", "skill_pattern_3"))
+    EX_SKILLS = (("EX STAGE", "ex_pattern_final"),)
+
+    def __init__(self, difficulty: str, clock: SimClock | None = None,
+                 rng: random.Random | None = None):  # 難易度・ゲーム内時計・乱数を受け取る
         super().__init__()
-        try:
-            self.image = pg.image.load("data/boss.png").convert_alpha()
-            self.image = pg.transform.scale(self.image, (150, 150))
-        except pg.error:
-            self.image = pg.Surface((100, 100))
-            self.image.fill((255, 0, 128))
+        self.clock = clock if clock is not None else SimClock()
+        self.rng = rng if rng is not None else random.Random()  # 移動先や弾幕のばらつきに使う乱数
+        self.image = ASSETS.image("data/boss.png", (150, 150), (100, 100), (255, 0, 128))
             
         self.rect = self.image.get_rect(center=(SCREEN_WIDTH // 2, 200))
         self.difficulty = difficulty
 
-        # 難易度に応じてHPを設定
-        if difficulty == "EASY":
-            hp_list = [50, 75, 100]
-        elif difficulty == "HARD":
-            hp_list = [200, 300, 400]
-        else:  # NORMAL (デフォルト)
-            hp_list = [100, 150, 200]
-
-        # スキル情報 (名前, HP, 弾幕パターンメソッド)
-        self.skill = [
-            ("STAGE1", hp_list[0], self.skill_pattern_1),
-            ("STAGE2", hp_list[1], self.skill_pattern_2),
-            ("STAGE3", hp_list[2], self.skill_pattern_3),
-        ]
+        # 難易度に応じてHPを設定 (不明な難易度は NORMAL 扱い)
+        hp_list = BOSS_HP.get(difficulty, BOSS_HP["NORMAL"])
+
+        # スキル情報 (名前, HP, 弾幕パターン名)
+        self.skill = [(name, hp, pattern) for (name, pattern), hp in zip(self.SKILLS, hp_list)]
         
-        # EX用スキル（後で start_ex_stage で設定する）
-        self.ex_skill = [
-            # name, hp, pattern placeholder (hpは合計で設定する)
-            ("EX STAGE", 0, self.ex_pattern_final),
-        ]
+        # EX用スキル（後で start_ex_stage で設定する。hpは合計で設定する）
+        self.ex_skill = [(name, 0, pattern) for name, pattern in self.EX_SKILLS]
 
         self.is_ex_stage = False  # EX判定フラグ
         
         self.current_skill_index = -1
         self.hp = 0
-        self.skill_start_time = 0  # スキル開始時間 (ms)
+        self.skill_start_time = 0  # スキル開始時間 (ゲーム内時間の ms)
         self.clear_times = []  # クリアタイム (秒) のリスト
         self.is_active = False
         self.pattern_timer = 0
@@ -525,10 +1862,10 @@ class Boss(pg.sprite.Sprite):
         current_skill_list = self.skill 
         
         if self.current_skill_index < len(current_skill_list):
-            name, max_hp, pattern_func = current_skill_list[self.current_skill_index]
+            name, max_hp, pattern_name = current_skill_list[self.current_skill_index]
             self.hp = max_hp
-            self.skill_start_time = pg.time.get_ticks() # 開始時間を記録
-            self.current_pattern = pattern_func
+            self.skill_start_time = self.clock.now_ms() # 開始時間を記録
+            self.current_pattern = PATTERNS.compile(pattern_name, self.difficulty)
             self.is_active = True
             self.pattern_timer = 0  # パターンタイマーリセット
         else:
@@ -538,7 +1875,7 @@ class Boss(pg.sprite.Sprite):
             if not self.is_ex_stage:
                 self.kill()
 
-    def update(self, bullets_group: pg.sprite.Group, player_pos: tuple[int, int]):
+    def update(self, bullets_group: "EnemyBulletStore", player_pos: tuple[int, int]):
         if not self.is_active:
             return
 
@@ -548,8 +1885,8 @@ class Boss(pg.sprite.Sprite):
         self.move_timer += 1
         if self.move_timer > 90:
             self.move_timer = 0
-            target_x = random.randint(100, SCREEN_WIDTH - 100)
-            target_y = random.randint(100, 250)
+            target_x = self.rng.randint(100, SCREEN_WIDTH - 100)
+            target_y = self.rng.randint(100, 250)
             self.move_target_pos = (target_x, target_y)
 
         # ターゲットに向かって移動
@@ -561,9 +1898,15 @@ class Boss(pg.sprite.Sprite):
             self.rect.centerx += round((dx / dist) * self.move_speed) # roundで整数化
             self.rect.centery += round((dy / dist) * self.move_speed) # roundで整数化
 
-        # スキル実行（現在のパターン関数を呼ぶ）
-        # pattern 関数のシグネチャは (bullets_group, player_pos)
-        self.current_pattern(bullets_group, player_pos) # 重複削除
+        # スキル実行（発射するフレームだけ弾を撃つ）
+        self.current_pattern.update(self, bullets_group, player_pos)
+
+    def start_skill(self, index: int):
+        """
+        指定したスキル (0始まり) から開始する (ヘッドレス実行用)
+        """
+        self.current_skill_index = index - 1
+        self.next_skill()
 
     def check_skill_transition(self) -> bool:
         """
@@ -574,7 +1917,7 @@ class Boss(pg.sprite.Sprite):
 
         if self.hp <= 0:
             # クリアタイムを記録
-            elapsed_time_ms = pg.time.get_ticks() - self.skill_start_time
+            elapsed_time_ms = self.clock.now_ms() - self.skill_start_time
             self.clear_times.append(elapsed_time_ms / 1000.0)  # 秒に変換してリストに追加
 
             self.next_skill()
@@ -601,179 +1944,19 @@ class Boss(pg.sprite.Sprite):
     def get_current_elapsed_time(self) -> float:
         """ 経過時間を返す """
         if self.is_active:
-            return (pg.time.get_ticks() - self.skill_start_time) / 1000.0
+            return (self.clock.now_ms() - self.skill_start_time) / 1000.0
         return 0.0
 
-    def skill_pattern_1(self, bullets_group: pg.sprite.Group, player_pos: tuple[int, int]):
-        """
-        ステージ1: 小弾 (小弾と大弾の全方位弾)
-        """
-        # 難易度別設定
-        if self.difficulty == "EASY":
-            large_bullet_freq = 80
-            large_bullet_density = 6
-            small_bullet_freq = 20
-        elif self.difficulty == "HARD":
-            large_bullet_freq = 40
-            large_bullet_density = 10
-            small_bullet_freq = 8
-        else: # NORMAL
-            large_bullet_freq = 60
-            large_bullet_density = 8
-            small_bullet_freq = 12
-
-        # 大弾
-        if self.pattern_timer % large_bullet_freq == 0:
-            for i in range(large_bullet_density):
-                angle = (360 / large_bullet_density) * i + (self.pattern_timer / 10) + random.uniform(-10, 10)
-                speed = 2
-                bullets_group.add(EnemyLargeBullet(self.rect.center, angle, speed))
-        
-        # 小弾 (自機狙い)
-        if self.pattern_timer % small_bullet_freq == 0:
-            spread = 10
-            angle_to_player = math.degrees(math.atan2(player_pos[1] - self.rect.centery, 
-                                                     player_pos[0] - self.rect.centerx))
-            for i in range(-1, 2):
-                angle = angle_to_player + (i * spread) + random.uniform(-5, 5)
-                speed = 4
-                bullets_group.add(EnemyBullet(self.rect.center, angle, speed))
-
-    def skill_pattern_2(self, bullets_group: pg.sprite.Group, player_pos: tuple[int, int]):
-        """
-        ステージ2: レーザー (細レーザーと置きレーザー)
-        """
-        # 難易度別設定
-        if self.difficulty == "EASY":
-            delayed_laser_freq = 120
-            delayed_laser_count = 1
-            laser_freq = 30
-        elif self.difficulty == "HARD":
-            delayed_laser_freq = 60
-            delayed_laser_count = 3
-            laser_freq = 12
-        else: # NORMAL
-            delayed_laser_freq = 90
-            delayed_laser_count = 2
-            laser_freq = 18
-
-        # 置きレーザー
-        if self.pattern_timer % delayed_laser_freq == 0:
-            for _ in range(delayed_laser_count):
-                x = random.randint(50, SCREEN_WIDTH - 50)
-                y = random.randint(SCREEN_HEIGHT // 2, SCREEN_HEIGHT - 50)
-                bullets_group.add(EnemyDelayedLaser((x, y), delay=30, duration=60))
-
-        # 細レーザー (自機狙い)
-        if self.pattern_timer % laser_freq == 0:
-            angle_to_player = math.degrees(math.atan2(player_pos[1] - self.rect.centery, 
-                                                     player_pos[0] - self.rect.centerx))
-            bullets_group.add(EnemyLaser(self.rect.center, angle_to_player + random.uniform(-15, 15), 8))
-
-    def skill_pattern_3(self, bullets_group: pg.sprite.Group, player_pos: tuple[int, int]):
-        """
-        ステージ3: 複合弾幕 (全種類使用)
-        """
-        # 難易度別設定 (Normal基準)
-        if self.difficulty == "EASY":
-            p1_freq = 100
-            p1_density = 5
-            p2_freq = 40
-            p3_freq = 70
-        elif self.difficulty == "HARD":
-            p1_freq = 50
-            p1_density = 8
-            p2_freq = 15
-            p3_freq = 35
-        else: # NORMAL
-            p1_freq = 70
-            p1_density = 6
-            p2_freq = 25
-            p3_freq = 50
-
-        # 全方位弾
-        if self.pattern_timer % p1_freq == 0:
-            for i in range(p1_density):
-                angle = (360 / p1_density) * i - (self.pattern_timer / 20) + random.uniform(-5, 5)
-                bullets_group.add(EnemyLargeBullet(self.rect.center, angle, 2))
-        
-        # 自機狙い
-        if self.pattern_timer % p2_freq == 0:
-            angle_to_player = math.degrees(math.atan2(player_pos[1] - self.rect.centery, player_pos[0] - self.rect.centerx))
-            bullets_group.add(EnemyBullet(self.rect.center, angle_to_player + random.uniform(-10, 10), 4))
-            
-        # 置きレーザー
-        if self.pattern_timer % p3_freq == 0:
-            x = random.randint(50, SCREEN_WIDTH - 50)
-            y = random.randint(SCREEN_HEIGHT // 2, SCREEN_HEIGHT - 50)
-            bullets_group.add(EnemyDelayedLaser((x, y), delay=30, duration=30))
-
-
-    def ex_pattern_final(self, bullets_group: pg.sprite.Group, player_pos: tuple[int, int]):
-        """
-        EXステージ最終パターン:
-        - 既存の全パターンを高頻度で組み合わせる
-        - さらに特大弾 (EnemyHugeBullet) を追加で発射する
-        """
-        # 全方位（強化）
-        if self.pattern_timer % 40 == 0:
-            density = 10
-            for i in range(density):
-                angle = (360 / density) * i + (self.pattern_timer / 5) + random.uniform(-8, 8)
-                speed = 3
-                bullets_group.add(EnemyLargeBullet(self.rect.center, angle, speed))
-
-        # 自機狙い小弾（強化）
-        if self.pattern_timer % 8 == 0:
-            spread = 15
-            angle_to_player = math.degrees(math.atan2(player_pos[1] - self.rect.centery,
-                                                     player_pos[0] - self.rect.centerx))
-            for i in range(-1, 2):
-                angle = angle_to_player + (i * spread) + random.uniform(-6, 6)
-                speed = 5
-                bullets_group.add(EnemyBullet(self.rect.center, angle, speed))
-
-        # 細レーザー（高頻度）
-        if self.pattern_timer % 15 == 0:
-            angle_to_player = math.degrees(math.atan2(player_pos[1] - self.rect.centery,
-                                                     player_pos[0] - self.rect.centerx))
-            bullets_group.add(EnemyLaser(self.rect.center, angle_to_player + random.uniform(-10, 10), 9))
-
-        # 置きレーザー（短めの遅延・頻度高め）
-        if self.pattern_timer % 30 == 0:
-            x = random.randint(50, SCREEN_WIDTH - 50)
-            y = random.randint(SCREEN_HEIGHT // 3, SCREEN_HEIGHT - 50)
-            bullets_group.add(EnemyDelayedLaser((x, y), delay=20, duration=40))
-
-        # 特大弾（円形に展開するもの）
-        if self.pattern_timer % 150 == 0:
-            count = 4
-            for i in range(count):
-                angle = (360 / count) * i + self.pattern_timer
-                speed = 1.5
-                bullets_group.add(EnemyHugeBullet(self.rect.center, angle, speed))
-
-        # 特大弾（自機狙いでゆっくり発射）
-        if self.pattern_timer % 90 == 0:
-            angle_to_player = math.degrees(math.atan2(player_pos[1] - self.rect.centery,
-                                                     player_pos[0] - self.rect.centerx))
-            bullets_group.add(EnemyHugeBullet(self.rect.center, angle_to_player + random.uniform(-5, 5), 2.5))
-
     def start_ex_stage(self):
         """ EXステージを開始するための設定を行う """
         self.is_ex_stage = True
         self.current_skill_index = -1 # ex_skillリストのインデックス
         
         # EX用HP設定 (難易度別)
-        if self.difficulty == "EASY":
-            ex_hp = 500
-        elif self.difficulty == "HARD":
-            ex_hp = 1500
-        else: # NORMAL
-            ex_hp = 1000
-            
+        ex_hp = EX_BOSS_HP.get(self.difficulty, EX_BOSS_HP["NORMAL"])
+
         # スキルリストをEX用に差し替え
-        # (self.ex_skill[0][0] は "EX STAGE", [0][2] は ex_pattern_final メソッド)
+        # (self.ex_skill[0][0] は "EX STAGE", [0][2] は "ex_pattern_final")
         self.ex_skill[0] = (self.ex_skill[0][0], ex_hp, self.ex_skill[0][2])
         self.skill = self.ex_skill 
         
@@ -788,10 +1971,6 @@ class LevelChange:
     def __init__(self):
         self.levels = ["EASY", "NORMAL", "HARD"]
         self.selected_index = 1  # 初期選択は NORMAL
-        
-        self.font_large = pg.font.Font(None, 60)
-        self.font_medium = pg.font.Font(None, 45)
-        self.font_small = pg.font.Font(None, 30)
     
     def handle_event(self, event: pg.event.Event, current_game_state: str):
         """
@@ -827,7 +2006,7 @@ class LevelChange:
         """
         screen.fill(BLACK)
 
-        title = self.font_large.render("Select Difficulty", True, WHITE)
+        title = TEXT.render("Select Difficulty", 60, WHITE)
         screen.blit(title, (SCREEN_WIDTH // 2 - title.get_width() // 2, 150))
 
         y_offset = 300
@@ -837,63 +2016,95 @@ class LevelChange:
             else:
                 color = WHITE
             
-            text = self.font_medium.render(level, True, color)
+            text = TEXT.render(level, 45, color)
             screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, y_offset))
             y_offset += 60
         
         y_offset += 100
-        start_text = self.font_small.render("Press SPACE or ENTER to Start", True, WHITE)
+        start_text = TEXT.render("Press SPACE or ENTER to Start", 30, WHITE)
         screen.blit(start_text, (SCREEN_WIDTH // 2 - start_text.get_width() // 2, y_offset))
 
         pg.display.flip()
 
 
-def draw_ui(screen: pg.Surface, score: int, lives: int, boss: Boss, bomb: int): # bomb を BombArea から int に修正
+def draw_ui(screen: pg.Surface, score: int, lives: int, boss: Boss, bomb: int) -> list[pg.Rect]: # bomb を BombArea から int に修正
     """
     UI（スコア、残機、ボスHP、ボム数など）を描画する
+    描画した範囲のリストを返す
     """
-    font = pg.font.Font(None, 36)
-    
+    text_height = TEXT.font(36).get_height()
+    dirty = []
+
     # スコア
-    score_text = font.render(f"Score: {score}", True, WHITE)
-    screen.blit(score_text, (10, 10))
+    width = TEXT.draw_number(screen, "Score: ", str(score), 36, WHITE, (10, 10))
+    dirty.append(pg.Rect(10, 10, width, text_height))
 
     # 残機
-    lives_text = font.render(f"Lives: {lives}", True, WHITE)
-    screen.blit(lives_text, (10, 40))
+    width = TEXT.draw_number(screen, "Lives: ", str(lives), 36, WHITE, (10, 40))
+    dirty.append(pg.Rect(10, 40, width, text_height))
     
     # ボム数
-    bomb_text = font.render(f"Bomb: {bomb}", True, (255, 165, 0))
-    screen.blit(bomb_text, (120, 40)) 
+    width = TEXT.draw_number(screen, "Bomb: ", str(bomb), 36, (255, 165, 0), (120, 40))
+    dirty.append(pg.Rect(120, 40, width, text_height))
 
     # ボスHP
     if boss and getattr(boss, "is_active", False): # bossがNoneでないことも確認
         skill_name = boss.get_current_skill_name()
-        skill_text = font.render(skill_name, True, WHITE)
-        screen.blit(skill_text, (SCREEN_WIDTH // 2 - skill_text.get_width() // 2, 10))
+        skill_text = TEXT.render(skill_name, 36, WHITE)
+        dirty.append(screen.blit(skill_text, (SCREEN_WIDTH // 2 - skill_text.get_width() // 2, 10)))
 
         # HPバー（EX中は色を変える）
         max_hp = boss.get_current_skill_max_hp()
         hp_ratio = boss.hp / max_hp if max_hp > 0 else 0
         hp_bar_width = max(0, (SCREEN_WIDTH - 40) * hp_ratio)
-        pg.draw.rect(screen, (100, 100, 100), (20,  70, SCREEN_WIDTH - 40, 20))
+        dirty.append(pg.draw.rect(screen, (100, 100, 100), (20,  70, SCREEN_WIDTH - 40, 20)))
         hp_color = (255, 0, 255) if getattr(boss, "is_ex_stage", False) else (255, 0, 0)
         pg.draw.rect(screen, hp_color, (20, 70, hp_bar_width, 20))
 
         # 経過時間
         elapsed_time = boss.get_current_elapsed_time()
-        time_text = font.render(f"Time: {elapsed_time:.2f}", True, WHITE)  # 小数点以下2桁
-        screen.blit(time_text, (SCREEN_WIDTH - time_text.get_width() - 10, 10))
+        time_str = f"{elapsed_time:.2f}"  # 小数点以下2桁
+        time_width = TEXT.number_width("Time: ", time_str, 36, WHITE)
+        TEXT.draw_number(screen, "Time: ", time_str, 36, WHITE, (SCREEN_WIDTH - time_width - 10, 10))
+        dirty.append(pg.Rect(SCREEN_WIDTH - time_width - 10, 10, time_width, text_height))
+    return dirty
+
+
+def draw_loading(screen: pg.Surface, done: int, total: int):
+    """ 起動時の読み込み画面描画 (進捗バー) """
+    screen.fill(BLACK)
+    text = TEXT.render("Loading...", 50, WHITE)
+    screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, SCREEN_HEIGHT // 2 - 60))
+    bar = pg.Rect(0, 0, SCREEN_WIDTH - 200, 20)
+    bar.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+    pg.draw.rect(screen, WHITE, bar, 2)
+    if total:
+        filled = bar.inflate(-6, -6)
+        filled.width = filled.width * done // total
+        pg.draw.rect(screen, WHITE, filled)
+    pg.display.flip()
+
+
+def run_loading_screen(screen: pg.Surface, steps: list) -> bool:
+    """
+    起動時の読み込み (steps の関数) を1つずつ実行しながら読み込み画面を表示する
+    途中でウィンドウが閉じられたら False を返す
+    """
+    for done, step in enumerate(steps):
+        if any(event.type == pg.QUIT for event in pg.event.get()):
+            return False
+        draw_loading(screen, done, len(steps))
+        step()
+    draw_loading(screen, len(steps), len(steps))
+    return True
 
 
 def draw_game_over(screen: pg.Surface):
     """ ゲームオーバー画面描画 """
     screen.fill(BLACK)
-    font = pg.font.Font(None, 74)
-    text = font.render("GAME OVER", True, WHITE)
+    text = TEXT.render("GAME OVER", 74, WHITE)
     screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, SCREEN_HEIGHT // 2 - 50))
-    font = pg.font.Font(None, 40)
-    text = font.render("Press SPACE to Exit", True, WHITE)
+    text = TEXT.render("Press SPACE to Exit", 40, WHITE)
     screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, SCREEN_HEIGHT // 2 + 20))
     pg.display.flip()
 
@@ -901,10 +2112,8 @@ def draw_game_over(screen: pg.Surface):
 def draw_results(screen: pg.Surface, times: list[float]):
     """ リザルト画面描画（ここで CTRL 押下で EX へ行ける） """
     screen.fill(BLACK)
-    font_large = pg.font.Font(None, 74)
-    font_medium = pg.font.Font(None, 40)
     
-    title = font_large.render("Clear!", True, (255, 255, 0))
+    title = TEXT.render("Clear!", 74, (255, 255, 0))
     screen.blit(title, (SCREEN_WIDTH // 2 - title.get_width() // 2, 80))
 
     total_time = 0.0
@@ -912,7 +2121,7 @@ def draw_results(screen: pg.Surface, times: list[float]):
     
     if times: # タイムが記録されている場合のみ表示
         for i, time in enumerate(times):
-            text = font_medium.render(f"Skill {i+1}: {time:.2f} sec", True, WHITE)
+            text = TEXT.render(f"Skill {i+1}: {time:.2f} sec", 40, WHITE)
             screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, y_offset))
             y_offset += 40
             total_time += time
@@ -921,12 +2130,12 @@ def draw_results(screen: pg.Surface, times: list[float]):
         pg.draw.line(screen, WHITE, (100, y_offset), (SCREEN_WIDTH - 100, y_offset), 2)
         y_offset += 20
 
-        total_text = font_medium.render(f"Total: {total_time:.2f} sec", True, WHITE)
+        total_text = TEXT.render(f"Total: {total_time:.2f} sec", 40, WHITE)
         screen.blit(total_text, (SCREEN_WIDTH // 2 - total_text.get_width() // 2, y_offset))
 
     y_offset += 100
     # ここで CTRL キーを押すと EX ステージへ遷移します
-    continue_text = font_medium.render("Press SPACE to Exit / CTRL for EX Stage", True, WHITE)
+    continue_text = TEXT.render("Press SPACE to Exit / CTRL for EX Stage", 40, WHITE)
     # continue_text = ... # 重複削除
     screen.blit(continue_text, (SCREEN_WIDTH // 2 - continue_text.get_width() // 2, y_offset))
     
@@ -938,10 +2147,8 @@ def draw_ex_transition(screen: pg.Surface, title: str, color: tuple[int, int, in
     画像を使いたい場合は下記のコメント箇所に画像を配置してください。
     """
     screen.fill(BLACK)
-    font_large = pg.font.Font(None, 74)
-    font_medium = pg.font.Font(None, 40)
     
-    title_text = font_large.render(title, True, color)
+    title_text = TEXT.render(title, 74, color)
     screen.blit(title_text, (SCREEN_WIDTH // 2 - title_text.get_width() // 2, SCREEN_HEIGHT // 2 - 50))
 
     msg = ""
@@ -954,49 +2161,827 @@ def draw_ex_transition(screen: pg.Surface, title: str, color: tuple[int, int, in
     else:
         msg = "..."
 
-    msg_text = font_medium.render(msg, True, WHITE)
+    msg_text = TEXT.render(msg, 40, WHITE)
     screen.blit(msg_text, (SCREEN_WIDTH // 2 - msg_text.get_width() // 2, SCREEN_HEIGHT // 2 + 30))
 
 
 def draw_ex_results(screen: pg.Surface, time: float):
     """ EXステージのクリアタイムを表示するリザルト """
     screen.fill(BLACK)
-    font_large = pg.font.Font(None, 74)
-    font_medium = pg.font.Font(None, 40)
     
-    title = font_large.render("EX STAGE COMPLETE", True, (0, 255, 255)) 
+    title = TEXT.render("EX STAGE COMPLETE", 74, (0, 255, 255)) 
     screen.blit(title, (SCREEN_WIDTH // 2 - title.get_width() // 2, 80))
 
     y_offset = 200
     
     # クリアタイムの表示
-    text = font_medium.render(f"EX Time: {time:.2f} sec", True, (255, 255, 0))
+    text = TEXT.render(f"EX Time: {time:.2f} sec", 40, (255, 255, 0))
     screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, y_offset))
     
     y_offset += 100
-    continue_text = font_medium.render("Press SPACE to Exit", True, WHITE)
+    continue_text = TEXT.render("Press SPACE to Exit", 40, WHITE)
     screen.blit(continue_text, (SCREEN_WIDTH // 2 - continue_text.get_width() // 2, y_offset))
 
 
+class PhaseTimer:
+    """
+    1フレーム内の処理 (フェーズ) ごとの所要時間を計測する
+    GameSession.timer に設定したときだけ使われる (未設定なら計測コストはほぼゼロ)
+    """
+    def __init__(self, max_frames: int | None = None):
+        self.frame: dict[str, float] = {}  # 現在のフレームの計測値 (秒)
+        self.history: deque[dict[str, float]] = deque(maxlen=max_frames)  # 過去のフレームの計測値
+        self._last = 0.0
+
+    def begin(self):
+        """ フレームの計測を開始する """
+        self.frame = {}
+        self._last = time.perf_counter()
+
+    def resume(self):
+        """ 現在のフレームの計測値を残したまま計測を再開する (1描画フレームで複数回 step する場合) """
+        self._last = time.perf_counter()
+
+    def mark(self, phase: str):
+        """ 直前の begin / mark からの経過時間を phase に加算する """
+        now = time.perf_counter()
+        self.frame[phase] = self.frame.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def end_frame(self) -> dict[str, float]:
+        """ フレームの計測を終えて履歴に追加する """
+        frame = self.frame
+        self.history.append(frame)
+        self.frame = {}
+        return frame
+
+
+# セーブステート (GameSession.snapshot / restore) の形式
+# ヘッダ (SNAPSHOT_HEADER) の後に、ボスのスキルごとの最大HP・クリアタイム・弾幕パターンの次の発射フレーム・
+# 乱数の状態・自機弾・敵弾・置きレーザー・アイテムの配列を、この順に tobytes() でそのまま並べる
+SNAPSHOT_MAGIC = b"KPSS"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FIELDS = (
+    ("magic", "4s"), ("version", "B"), ("difficulty", "B"), ("flags", "H"),
+    ("seed", "Q"), ("ticks", "Q"), ("frame_count", "I"), ("score", "q"), ("bombs", "i"),
+    ("hit_total", "I"), ("graze_total", "I"), ("bombs_used", "I"), ("pending_input_bits", "B"),
+    ("last_item_spawn", "d"), ("item_spawn_interval", "d"),
+    ("player_x", "i"), ("player_y", "i"), ("lives", "i"), ("last_shot", "d"), ("respawn_timer", "d"),
+    ("blink_timer", "i"), ("power_level", "i"), ("item_count", "i"),
+    ("boss_x", "i"), ("boss_y", "i"), ("skill_index", "i"), ("boss_hp", "i"), ("skill_start_time", "d"),
+    ("pattern_timer", "i"), ("move_timer", "i"), ("target_x", "i"), ("target_y", "i"),
+    ("bomb_x", "i"), ("bomb_y", "i"), ("bomb_timer", "i"), ("gauss_next", "d"),
+    ("skill_count", "B"), ("clear_count", "H"), ("emitter_count", "H"), ("player_bullet_count", "I"),
+    ("enemy_bullet_count", "I"), ("laser_count", "I"), ("power_item_count", "I"),
+)
+SNAPSHOT_HEADER = struct.Struct("<" + "".join(fmt for _, fmt in SNAPSHOT_FIELDS))
+# ヘッダの flags のビット (この順に 1, 2, 4, ...)
+SNAPSHOT_FLAGS = ("is_ex_stage", "invincible", "boss_alive", "boss_active", "respawning", "visible",
+                  "powered_up", "bomb")
+SNAPSHOT_BULLET_DTYPE = np.dtype([("kind", "i1"), ("grazed", "?"), ("rot", "<i2"),
+                                  ("x", "<f8"), ("y", "<f8"), ("vx", "<f8"), ("vy", "<f8")])
+SNAPSHOT_LASER_DTYPE = np.dtype([("x", "<i4"), ("y", "<i4"), ("delay", "<i4"), ("duration", "<i4"),
+                                 ("timer", "<i4"), ("active", "?"), ("grazed", "?")])
+SNAPSHOT_ITEM_DTYPE = np.dtype([("x", "<i4"), ("y", "<i4"), ("move_timer", "<i4"), ("start_x", "<f8")])
+SNAPSHOT_PLAYER_BULLET_DTYPE = np.dtype("<f8")  # (x, y, vx, vy, damage) の5列
+SNAPSHOT_RNG_WORDS = 625  # random.Random の内部状態 (624 語 + 位置)
+
+
+class GameSession:
+    """
+    ボス戦1回分のゲーム状態 (自機・ボス・弾・アイテム・スコア・ボム) と1フレーム分の更新処理
+    main の通常ステージ、EX_STAGE、ヘッドレス実行で共有する
+    """
+    def __init__(self, difficulty: str, audio: AudioManager | None = None, seed: int | None = None):
+        self.difficulty = difficulty
+
+        # ゲーム内時計 (全てのタイマーはこの時計で進む)
+        self.clock = SimClock()
+
+        # セッション専用の乱数 (同じシードと入力なら同じ展開になる)
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.rng = random.Random(self.seed)
+
+        # インスタンスを生成 (難易度・ゲーム内時計・乱数を渡す)
+        self.player = Player(difficulty, self.clock)
+        self.boss = Boss(difficulty, self.clock, self.rng)
+        self.all_sprites = pg.sprite.Group(self.player, self.boss) # PlayerとBossもGroupに追加
+        self.player_bullets = PlayerBulletStore()
+        self.enemy_bullets = create_enemy_bullet_store()
+        self.items = pg.sprite.Group()
+
+        # 効果音 (None なら鳴らさない。ヘッドレス実行・ベンチマーク用)
+        self.audio = audio
+
+        self.is_ex_stage = False  # EXステージ中はスコアや一部のルールが変わる
+        self.invincible = False  # True なら被弾を判定だけして無視する (ベンチマーク用)
+        self.score = 0
+
+        # ボム関連の変数
+        self.bombs = 3 # 残りボム数
+        self.bomb_active_area: BombArea | None = None # 現在アクティブなボムエリア
+
+        # アイテム生成タイマー
+        self.item_spawn_interval = 5000  # 5秒 (ゲーム内時間)
+        self.last_item_spawn = self.clock.now_ms()
+
+        # 処理ごとの時間計測 (PhaseTimer を設定したときのみ)
+        self.timer: PhaseTimer | None = None
+
+        # 負荷に応じた簡略化 (LoadGovernor を設定したときのみ)
+        self.governor: LoadGovernor | None = None
+
+        # 集計用 (ヘッドレス実行の統計などで使う)
+        self.frame_count = 0
+        self.graze_total = 0
+        self.hit_total = 0
+        self.bombs_used = 0
+
+        # 入力の記録 (InputRecorder を設定したときのみ)
+        self.recorder: InputRecorder | None = None
+        self.pending_input_bits = 0  # 次の step で記録する押下イベント・EX突入
+
+    def start_ex_stage(self):
+        """
+        EXステージ用に状態を切り替える (EX_STAGE の突入演出が終わったら呼ばれる)
+        """
+        self.is_ex_stage = True
+        self.pending_input_bits |= START_EX_BIT
+        self.all_sprites.add(self.player, self.boss) # プレイヤーとボスを再追加
+        self.player.respawn() # プレイヤーを中央に配置
+        self.player.lives = 3 # EXステージは残機3で固定
+        self.score = 0 # スコアリセット
+
+        # ボスをEXモードに設定
+        self.boss.start_ex_stage()
+
+        # 既存の弾とアイテムをクリア
+        self.player_bullets.empty()
+        self.enemy_bullets.empty()
+        self.items.empty()
+
+    def snapshot(self) -> bytes:
+        """
+        ゲームの状態 (自機・ボス・全ての弾・アイテム・ボム・スコア・乱数・ゲーム内時計) を
+        セーブステートのバイト列にする。弾は配列のままコピーするので、数千発あっても数ms で終わる
+        (効果音・計測・入力の記録・LoadGovernor の状態は含まない)
+        """
+        player, boss = self.player, self.boss
+        bomb = self.bomb_active_area
+        rng_version, rng_words, gauss_next = self.rng.getstate()
+        pattern_frames = boss.current_pattern.next_frames if boss.is_active else []
+        bullets, lasers = self.enemy_bullets.snapshot_arrays()
+        items = list(self.items)
+        flags = {
+            "is_ex_stage": self.is_ex_stage, "invincible": self.invincible,
+            "boss_alive": boss.alive(), "boss_active": boss.is_active,
+            "respawning": player.is_respawning, "visible": player.is_visible,
+            "powered_up": player.is_powered_up, "bomb": bomb is not None,
+        }
+        header = {
+            "magic": SNAPSHOT_MAGIC, "version": SNAPSHOT_VERSION,
+            "difficulty": REPLAY_DIFFICULTIES.index(self.difficulty),
+            "flags": sum(1 << bit for bit, name in enumerate(SNAPSHOT_FLAGS) if flags[name]),
+            "seed": self.seed, "ticks": self.clock.ticks, "frame_count": self.frame_count,
+            "score": self.score, "bombs": self.bombs, "hit_total": self.hit_total,
+            "graze_total": self.graze_total, "bombs_used": self.bombs_used,
+            "pending_input_bits": self.pending_input_bits,
+            "last_item_spawn": self.last_item_spawn, "item_spawn_interval": self.item_spawn_interval,
+            "player_x": player.rect.x, "player_y": player.rect.y, "lives": player.lives,
+            "last_shot": player.last_shot, "respawn_timer": player.respawn_timer,
+            "blink_timer": player.blink_timer, "power_level": player.power_level, "item_count": player.item_count,
+            "boss_x": boss.rect.centerx, "boss_y": boss.rect.centery, "skill_index": boss.current_skill_index,
+            "boss_hp": boss.hp, "skill_start_time": boss.skill_start_time, "pattern_timer": boss.pattern_timer,
+            "move_timer": boss.move_timer, "target_x": boss.move_target_pos[0], "target_y": boss.move_target_pos[1],
+            "bomb_x": bomb.center[0] if bomb else 0, "bomb_y": bomb.center[1] if bomb else 0,
+            "bomb_timer": bomb.timer if bomb else 0,
+            "gauss_next": math.nan if gauss_next is None else gauss_next,
+            "skill_count": len(boss.skill), "clear_count": len(boss.clear_times),
+            "emitter_count": len(pattern_frames), "player_bullet_count": len(self.player_bullets),
+            "enemy_bullet_count": len(bullets), "laser_count": len(lasers), "power_item_count": len(items),
+        }
+        sections = (
+            np.array([hp for _, hp, _ in boss.skill], dtype="<i4"),
+            np.array(boss.clear_times, dtype="<f8"),
+            np.array(pattern_frames, dtype="<i8"),
+            np.array(rng_words, dtype="<u4"),
+            np.array(self.player_bullets.bullets, dtype=SNAPSHOT_PLAYER_BULLET_DTYPE),
+            bullets,
+            lasers,
+            np.array([(item.rect.x, item.rect.y, item.move_timer, item.start_x) for item in items],
+                     dtype=SNAPSHOT_ITEM_DTYPE),
+        )
+        return b"".join([SNAPSHOT_HEADER.pack(*(header[name] for name, _ in SNAPSHOT_FIELDS))] +
+                        [section.tobytes() for section in sections])
+
+    def restore(self, data: bytes):
+        """
+        snapshot() のバイト列からゲームの状態を戻す (画像は読み込み済みのものを使い回す)
+        難易度とシードもセーブステートの値になる。呼び出し側は必要なら clock.resync() する
+        """
+        header = self.read_snapshot_header(data)
+        flags = {name: bool(header["flags"] >> bit & 1) for bit, name in enumerate(SNAPSHOT_FLAGS)}
+
+        # 配列はヘッダの個数の順に読み出す
+        offset = SNAPSHOT_HEADER.size
+        sections = []
+        for dtype, count in (("<i4", header["skill_count"]), ("<f8", header["clear_count"]),
+                             ("<i8", header["emitter_count"]), ("<u4", SNAPSHOT_RNG_WORDS),
+                             (SNAPSHOT_PLAYER_BULLET_DTYPE, header["player_bullet_count"] * 5),
+                             (SNAPSHOT_BULLET_DTYPE, header["enemy_bullet_count"]),
+                             (SNAPSHOT_LASER_DTYPE, header["laser_count"]),
+                             (SNAPSHOT_ITEM_DTYPE, header["power_item_count"])):
+            dtype = np.dtype(dtype)
+            if offset + dtype.itemsize * count > len(data):
+                raise ValueError("セーブステートが途中で切れています")
+            sections.append(np.frombuffer(data, dtype, count, offset))
+            offset += dtype.itemsize * count
+        skill_hp, clear_times, pattern_frames, rng_words, player_bullets, bullets, lasers, items = sections
+
+        difficulty = REPLAY_DIFFICULTIES[header["difficulty"]]
+        self.difficulty = difficulty
+        self.seed = header["seed"]
+        gauss_next = header["gauss_next"]
+        self.rng.setstate((self.rng.getstate()[0], tuple(rng_words.tolist()),
+                           None if math.isnan(gauss_next) else gauss_next))
+        self.clock.ticks = header["ticks"]
+        self.is_ex_stage = flags["is_ex_stage"]
+        self.invincible = flags["invincible"]
+        self.score = header["score"]
+        self.bombs = header["bombs"]
+        self.last_item_spawn = header["last_item_spawn"]
+        self.item_spawn_interval = header["item_spawn_interval"]
+        self.frame_count = header["frame_count"]
+        self.graze_total = header["graze_total"]
+        self.hit_total = header["hit_total"]
+        self.bombs_used = header["bombs_used"]
+        self.pending_input_bits = header["pending_input_bits"]
+
+        player = self.player
+        player.rect.topleft = (header["player_x"], header["player_y"])
+        player.hitbox.center = player.rect.center
+        player.grazebox.center = player.rect.center
+        player.lives = header["lives"]
+        player.last_shot = header["last_shot"]
+        player.is_respawning = flags["respawning"]
+        player.respawn_timer = header["respawn_timer"]
+        player.blink_timer = header["blink_timer"]
+        player.is_visible = flags["visible"]
+        player.image.set_alpha(255 if player.is_visible else 0)
+        player.power_level = header["power_level"]
+        player.item_count = header["item_count"]
+        player.is_powered_up = flags["powered_up"]
+
+        boss = self.boss
+        boss.difficulty = difficulty
+        boss.is_ex_stage = self.is_ex_stage
+        skills = Boss.EX_SKILLS if self.is_ex_stage else Boss.SKILLS
+        boss.skill = [(name, hp, pattern) for (name, pattern), hp in zip(skills, skill_hp.tolist())]
+        if self.is_ex_stage:
+            boss.ex_skill = boss.skill
+        boss.current_skill_index = header["skill_index"]
+        boss.hp = header["boss_hp"]
+        boss.skill_start_time = header["skill_start_time"]
+        boss.clear_times = clear_times.tolist()
+        boss.is_active = flags["boss_active"]
+        boss.pattern_timer = header["pattern_timer"]
+        boss.move_timer = header["move_timer"]
+        boss.move_target_pos = (header["target_x"], header["target_y"])
+        boss.rect.center = (header["boss_x"], header["boss_y"])
+        if boss.is_active:
+            pattern = PATTERNS.compile(boss.skill[boss.current_skill_index][2], difficulty)
+            if len(pattern.next_frames) != len(pattern_frames):
+                raise ValueError("セーブステートと弾幕パターンの発射口の数が違います")
+            pattern.next_frames = pattern_frames.tolist()
+            pattern.next_frame = min(pattern.next_frames, default=math.inf)
+            boss.current_pattern = pattern
+        if flags["boss_alive"]:
+            self.all_sprites.add(boss)
+        else:
+            boss.kill()
+
+        self.player_bullets.bullets = [(x, y, vx, vy, int(damage))
+                                       for x, y, vx, vy, damage in player_bullets.reshape(-1, 5).tolist()]
+        self.enemy_bullets.restore_arrays(bullets, lasers)
+        self.items.empty()
+        for x, y, move_timer, start_x in items.tolist():
+            item = PowerItem((0, 0))
+            item.rect.topleft = (x, y)
+            item.move_timer = move_timer
+            item.start_x = start_x
+            self.items.add(item)
+        self.bomb_active_area = None
+        if flags["bomb"]:
+            self.bomb_active_area = BombArea((header["bomb_x"], header["bomb_y"]))
+            self.bomb_active_area.timer = header["bomb_timer"]
+
+    @staticmethod
+    def read_snapshot_header(data: bytes) -> dict:
+        """ セーブステートのヘッダを {項目名: 値} にする """
+        if len(data) < SNAPSHOT_HEADER.size:
+            raise ValueError("セーブステートではありません")
+        header = dict(zip((name for name, _ in SNAPSHOT_FIELDS), SNAPSHOT_HEADER.unpack_from(data)))
+        if header["magic"] != SNAPSHOT_MAGIC or header["version"] != SNAPSHOT_VERSION:
+            raise ValueError("セーブステートではありません (または非対応のバージョン)")
+        return header
+
+    @classmethod
+    def from_snapshot(cls, data: bytes, audio: AudioManager | None = None) -> "GameSession":
+        """ セーブステートから新しい GameSession を作る (ベンチマークを決まった場面から始めるときなど) """
+        header = cls.read_snapshot_header(data)
+        session = cls(REPLAY_DIFFICULTIES[header["difficulty"]], audio, header["seed"])
+        session.restore(data)
+        return session
+
+    def handle_key(self, key: int):
+        """
+        プレイ中のキー入力 (SPACE で復活、TAB でボム)
+        """
+        if key in (pg.K_SPACE, pg.K_TAB):
+            self.pending_input_bits |= KEY_BITS[key]
+
+        # プレイヤー復活処理
+        if key == pg.K_SPACE and self.player.is_respawning:
+            self.player.respawn()
+
+        # Tabキーでボム使用
+        elif key == pg.K_TAB:
+            self.use_bomb()
+
+    def use_bomb(self):
+        """
+        ボムが残っていて、かつ、現在アクティブなボムがない時のみ発動
+        """
+        if self.bombs > 0 and self.bomb_active_area is None:
+            self.bombs -= 1
+            self.bombs_used += 1
+            self.bomb_active_area = BombArea(self.player.rect.center)
+            self.play_sound("bomb")
+
+    def play_sound(self, name: str):
+        """ 効果音を鳴らす (AudioManager がないときは何もしない) """
+        if self.audio is not None:
+            self.audio.play(name)
+
+    def step(self, keys) -> str:
+        """
+        1フレーム分ゲームを進める
+        戻り値: "playing" (継続) / "game_over" (残機0で被弾) / "cleared" (ボス撃破)
+        """
+        player = self.player
+        boss = self.boss
+        status = "playing"
+        self.frame_count += 1
+        self.clock.advance()
+        if self.recorder is not None:
+            self.recorder.record(encode_input(keys) | self.pending_input_bits)
+        self.pending_input_bits = 0
+        timer = self.timer
+        if timer:
+            timer.resume()
+
+        # アイテム生成 (通常ステージのみ)
+        if not self.is_ex_stage:
+            now = self.clock.now_ms()
+            if now - self.last_item_spawn > self.item_spawn_interval:
+                self.last_item_spawn = now
+                # 画面上部のランダムな位置に生成
+                spawn_x = self.rng.randint(50, SCREEN_WIDTH - 50)
+                spawn_y = -20
+                self.items.add(PowerItem((spawn_x, spawn_y)))
+
+        # 更新処理
+        # player.update / boss.update は引数が特殊なので個別に呼ぶ
+        player.update(keys, self.player_bullets)
+        if timer:
+            timer.mark("player")
+        if boss.is_active:
+            boss.update(self.enemy_bullets, player.rect.center)
+        if timer:
+            timer.mark("emit")
+        # 自機弾の移動・画面外判定・ボスとの当たり判定をまとめて行う
+        hit_count, damage = self.player_bullets.update(boss)
+        if hit_count:
+            if self.is_ex_stage:
+                damage = hit_count # パワーアップ未対応（元コード通り）
+            boss.hit(damage)
+            # 1ダメージにつきスコア1UP
+            self.score += damage
+        if timer:
+            timer.mark("player_bullets")
+
+        if not self.is_ex_stage:
+            self.items.update()
+
+            # アイテム取得判定
+            collected_items = pg.sprite.spritecollide(player, self.items, True)
+            if collected_items:
+                for item in collected_items:
+                    player.add_power_item()
+                self.play_sound("powerup")
+            if timer:
+                timer.mark("items")
+
+        # ボムの更新と敵弾消去
+        if self.bomb_active_area is not None:
+            self.bomb_active_area.update(player.rect.center)
+            # 範囲内の弾を消去し、スコア加算
+            killed_bullets = self.bomb_active_area.check_collision_and_kill(self.enemy_bullets)
+            self.score += killed_bullets * 1 # ボムで消した弾は1点
+
+            if not self.bomb_active_area.is_active:
+                self.bomb_active_area = None # ボム終了
+            if timer:
+                timer.mark("bomb")
+
+        # 敵弾の更新 (画面外に出た弾を消去し、スコア加算)
+        # 弾を1つ避けきったらスコア1UP (EXはスコア高め)
+        avoided_count = self.enemy_bullets.update()
+        self.score += avoided_count * (10 if self.is_ex_stage else 1)
+        # 負荷が高いときは敵弾の数に上限をかける (LoadGovernor の最終段階)
+        if self.governor is not None and self.governor.bullet_cap is not None:
+            self.enemy_bullets.enforce_cap(self.governor.bullet_cap)
+        if timer:
+            timer.mark("enemy_bullets")
+
+        # 当たり判定 (自機弾 vs ボスは自機弾の更新でまとめて行う)
+
+        # 敵弾 vs 自機 (被弾 & GRAZE)
+        if not player.is_respawning:
+
+            # GRAZE (かすり) 判定 (grazebox との衝突) と 被弾判定 (hitbox)
+            graze_count, is_hit = self.enemy_bullets.collide_player(player)
+            self.graze_total += graze_count
+            self.score += graze_count * (50 if self.is_ex_stage else 20) # GRAZEスコア20 (EXは50)
+            if graze_count and self.is_ex_stage:
+                # GRAZE の効果音は EX ステージのみ
+                # 同じフレームに何発 GRAZE しても効果音は1回 (続けて鳴らした分も AudioManager がまとめる)
+                self.play_sound("graze")
+
+            if is_hit and not self.invincible:
+                self.play_sound("hit")
+
+                player.hit() # 残機を減らし、無敵状態へ
+                self.hit_total += 1
+
+                # 画面上の敵弾を全消去
+                self.enemy_bullets.empty()
+                if self.is_ex_stage:
+                    self.bomb_active_area = None # 被弾時にボム消去
+
+                if player.lives <= 0:
+                    status = "game_over"
+
+        # ステージ移行判定
+        if boss.check_skill_transition():
+            # 移行時に弾幕を消去
+            self.enemy_bullets.empty()
+
+            # ステージ移行時にボムエリアを強制終了
+            self.bomb_active_area = None
+
+            if not boss.is_active:
+                status = "cleared"  # ボス撃破
+
+        if timer:
+            timer.mark("collision")
+        return status
+
+    def draw(self, screen: pg.Surface, background_image: pg.Surface | None, clear: bool = True) -> list[pg.Rect]:
+        """
+        プレイ画面を描画する (flip は呼び出し側で行う)
+        clear=False なら背景を描かない (DirtyRectRenderer が前フレームの部分だけ消す)
+        描画した範囲のリストを返す
+        """
+        if self.governor is not None:
+            background_image = self.governor.background(background_image)  # 負荷が高いときは黒で塗る
+        if clear:
+            if background_image:
+                screen.blit(background_image, (0, 0)) # 背景画像を描画
+            else:
+                screen.fill(BLACK) # 背景画像がなければ黒で塗りつぶす
+
+        # 描画した範囲は DirtyRectRenderer を使うとき (clear=False) だけ集める
+        want_rects = not clear
+
+        # Player, Boss を all_sprites に入れた場合の描画 (点滅中の自機は描画しない)
+        player = self.player
+        dirty = blit_sprites(screen, (sprite for sprite in self.all_sprites
+                                      if sprite is not player or player.is_visible), want_rects)
+
+        # 負荷が高いときは LoadGovernor の段階に応じて弾とボムエリアを簡略化して描く
+        governor = self.governor
+        dirty += self.player_bullets.draw(screen, want_rects)
+        dirty += self.enemy_bullets.draw(screen, want_rects, governor is not None and governor.cheap_bullets)
+        dirty += blit_sprites(screen, self.items, want_rects)
+
+        # ボムエリアの描画
+        if self.bomb_active_area is not None:
+            bomb_rect = self.bomb_active_area.draw(screen, governor is not None and governor.simple_bomb)
+            if bomb_rect:
+                dirty.append(bomb_rect)
+
+        # UIの描画
+        dirty += draw_ui(screen, self.score, self.player.lives, self.boss, self.bombs) # bombsを渡す
+
+        # 復活待機中の表示
+        if self.player.is_respawning:
+            text = TEXT.render("Press SPACE to Respawn", 40, WHITE)
+            dirty.append(screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, SCREEN_HEIGHT // 2 + 100)))
+
+        if self.timer:
+            self.timer.mark("draw")
+        return dirty
+
+
+class FrameProfiler:
+    """
+    プレイ中の1描画フレームの内訳 (イベント処理・弾幕生成・弾の更新・ボム・当たり判定・描画・flip) を
+    計測してオーバーレイ表示する。F3 で表示切替、F4 で直近の計測値を CSV に保存する。
+    無効の間は session.timer を外すので、計測のコストはほぼかからない。
+    """
+    # オーバーレイに表示する順番 (GameSession.step / draw の mark と main の mark)
+    PHASES = ("events", "player", "emit", "player_bullets", "items", "bomb",
+              "enemy_bullets", "collision", "draw", "overlay", "flip")
+    COUNTS = ("enemy_bullets", "player_bullets", "items")
+    AVERAGE_FRAMES = 30  # 表示する平均値の対象フレーム数
+    GRAPH_FRAMES = 120  # グラフに表示するフレーム数
+    GRAPH_SIZE = (240, 60)
+    BUDGET_MS = 1000.0 / FPS  # 1描画フレームの持ち時間
+    GRAPH_MAX_MS = BUDGET_MS * 2  # グラフ上端の時間 (2フレーム分)
+
+    def __init__(self, history_seconds: int = PROFILER_HISTORY_SECONDS):
+        self.enabled = False
+        self.timer = PhaseTimer(max_frames=history_seconds * FPS)
+        self.counts: deque[tuple[int, int, int]] = deque(maxlen=history_seconds * FPS)  # COUNTS の順
+        self.panel = pg.Surface((250, 16 * (len(self.PHASES) + len(self.COUNTS) + 1) + self.GRAPH_SIZE[1] + 16))
+        self.panel.set_alpha(180)
+
+    def handle_key(self, key: int, session: GameSession | None) -> bool:
+        """ プロファイラのキーなら処理して True を返す """
+        if key == PROFILER_TOGGLE_KEY:
+            self.enabled = not self.enabled
+            self.timer.history.clear()
+            self.counts.clear()
+            self.timer.begin()
+            if session is not None:
+                session.timer = self.timer if self.enabled else None
+            return True
+        if key == PROFILER_DUMP_KEY:
+            if self.timer.history:
+                path = self.dump_csv()
+                print(f"プロファイルを保存しました: {path}")
+            return True
+        return False
+
+    def begin(self, session: GameSession | None):
+        if self.enabled:
+            self.timer.begin()
+            if session is not None:
+                session.timer = self.timer
+
+    def mark(self, phase: str):
+        if self.enabled:
+            self.timer.mark(phase)
+
+    def end_frame(self, session: GameSession | None):
+        """ プレイ画面以外 (何も計測していないフレーム) は記録しない """
+        if not self.enabled or not self.timer.frame:
+            return
+        self.timer.end_frame()
+        if session is not None:
+            self.counts.append((len(session.enemy_bullets), len(session.player_bullets), len(session.items)))
+        else:
+            self.counts.append((0, 0, 0))
+
+    def draw(self, screen: pg.Surface, session: GameSession | None) -> pg.Rect | None:
+        """
+        直近の平均時間・弾数・フレーム時間のグラフを画面左下に描画する (flip 前に呼ぶ)
+        描画した範囲を返す
+        """
+        if not self.enabled:
+            return None
+        history = self.timer.history
+        recent = list(history)[-self.AVERAGE_FRAMES:]
+        panel = self.panel
+        panel.fill(BLACK)
+        y = 4
+        for phase in self.PHASES:
+            average_ms = sum(frame.get(phase, 0.0) for frame in recent) * 1000.0 / max(len(recent), 1)
+            TEXT.draw_number(panel, f"{phase}: ", f"{average_ms:.2f}", 18, WHITE, (6, y))
+            y += 16
+        total_ms = sum(sum(frame.values()) for frame in recent) * 1000.0 / max(len(recent), 1)
+        TEXT.draw_number(panel, "total: ", f"{total_ms:.2f}", 18, YELLOW, (6, y))
+        y += 16
+        counts = self.counts[-1] if self.counts else (0, 0, 0)
+        for name, count in zip(self.COUNTS, counts):
+            TEXT.draw_number(panel, f"{name}: ", str(count), 18, GREEN, (6, y))
+            y += 16
+
+        # フレーム時間のグラフ (黄色の線が BUDGET_MS、超えたフレームは赤)
+        graph_width, graph_height = self.GRAPH_SIZE
+        graph_top = y + 4
+        pg.draw.rect(panel, (40, 40, 40), (6, graph_top, graph_width, graph_height))
+        frames = list(history)[-self.GRAPH_FRAMES:]
+        bar_width = graph_width / self.GRAPH_FRAMES
+        for i, frame in enumerate(frames):
+            frame_ms = sum(frame.values()) * 1000.0
+            bar_height = min(graph_height, int(graph_height * frame_ms / self.GRAPH_MAX_MS))
+            x = 6 + int(i * bar_width)
+            color = RED if frame_ms > self.BUDGET_MS else GREEN
+            pg.draw.line(panel, color, (x, graph_top + graph_height), (x, graph_top + graph_height - bar_height))
+        budget_y = graph_top + graph_height - graph_height // 2
+        pg.draw.line(panel, YELLOW, (6, budget_y), (6 + graph_width, budget_y))
+
+        rect = screen.blit(panel, (0, SCREEN_HEIGHT - panel.get_height()))
+        self.mark("overlay")
+        return rect
+
+    def dump_csv(self, path: str | None = None) -> str:
+        """ 直近 history_seconds 秒分の計測値 (ms) と弾数を CSV に保存し、そのパスを返す """
+        if path is None:
+            os.makedirs(PROFILER_OUTPUT_DIR, exist_ok=True)
+            path = os.path.join(PROFILER_OUTPUT_DIR, f"profile_{time.strftime('%Y%m%d_%H%M%S')}.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame", *(f"{phase}_ms" for phase in self.PHASES), "total_ms", *self.COUNTS])
+            for index, (frame, counts) in enumerate(zip(self.timer.history, self.counts)):
+                writer.writerow([index, *(f"{frame.get(phase, 0.0) * 1000.0:.4f}" for phase in self.PHASES),
+                                 f"{sum(frame.values()) * 1000.0:.4f}", *counts])
+        return path
+
+
+class QuickSave:
+    """
+    プレイ中のセーブステート。F5 で今の場面を保存し、F9 で最後に保存した場面からやり直す (練習用)
+    保存した場面は SNAPSHOT_OUTPUT_DIR にもファイルで書き出す (benchmark.py --snapshot で同じ場面から計測できる)
+    入力を記録している間は、リプレイと食い違うので読み込まない
+    """
+    def __init__(self, recording: bool = False):
+        self.data: bytes | None = None
+        self.recording = recording
+
+    def handle_key(self, key: int, session: GameSession | None, playing: bool) -> bool:
+        """ セーブステートのキーなら処理して True を返す (playing はプレイ中の画面かどうか) """
+        if key not in (SNAPSHOT_SAVE_KEY, SNAPSHOT_LOAD_KEY):
+            return False
+        if session is None or not playing:
+            return True
+        if key == SNAPSHOT_SAVE_KEY:
+            self.data = session.snapshot()
+            os.makedirs(SNAPSHOT_OUTPUT_DIR, exist_ok=True)
+            path = os.path.join(SNAPSHOT_OUTPUT_DIR, "quicksave.kpss")
+            with open(path, "wb") as f:
+                f.write(self.data)
+            print(f"セーブステートを保存しました: {path} ({len(self.data)} バイト, 敵弾 {len(session.enemy_bullets)} 発)")
+        elif self.data is None:
+            print("セーブステートがありません (F5 で保存)")
+        elif self.recording:
+            print("入力の記録中はセーブステートを読み込めません")
+        else:
+            flags = GameSession.read_snapshot_header(self.data)["flags"]
+            if bool(flags >> SNAPSHOT_FLAGS.index("is_ex_stage") & 1) != session.is_ex_stage:
+                print("EXステージと通常ステージの間ではセーブステートを読み込めません")
+            else:
+                session.restore(self.data)
+                session.clock.resync()  # 読み込みにかかった時間を追いかけないように
+        return True
+
+
+class DirtyRectRenderer:
+    """
+    ダーティ矩形による描画モード
+    前のフレームで描いた範囲だけを背景で塗り直し、今回描いた範囲と合わせて pg.display.update(rects) で送る。
+    変化した面積が大きいとき (ボム中や弾が多いとき) や、ほかの画面から戻った直後は flip に切り替える。
+    """
+    def __init__(self, full_redraw_ratio: float = DIRTY_FULL_REDRAW_RATIO, max_rects: int = DIRTY_MAX_RECTS):
+        self.max_area = full_redraw_ratio * SCREEN_WIDTH * SCREEN_HEIGHT
+        self.max_rects = max_rects
+        self.previous: list[pg.Rect] = []  # 前のフレームで描いた範囲
+        self.needs_full = True  # 画面全体が描き変わっている (次の present は flip する)
+        self.full_frames = 0
+        self.partial_frames = 0
+
+    def invalidate(self):
+        """ ほかの描画 (メニュー・演出など) で画面全体が変わったときに呼ぶ """
+        self.needs_full = True
+        self.previous = []
+
+    def _is_large(self, rects: list[pg.Rect]) -> bool:
+        if len(rects) > self.max_rects:
+            return True
+        # UI やボスなど前のフレームと同じ範囲は1回だけ数える
+        return sum(width * height for _, _, width, height in set(map(tuple, rects))) > self.max_area
+
+    def clear(self, screen: pg.Surface, background_image: pg.Surface | None):
+        """ 前のフレームで描いた範囲を背景で塗り直す (範囲が広ければ全体を描く) """
+        if self.needs_full or self._is_large(self.previous):
+            if background_image:
+                screen.blit(background_image, (0, 0))
+            else:
+                screen.fill(BLACK)
+        elif background_image:
+            for rect in self.previous:
+                screen.blit(background_image, rect, rect)
+        else:
+            for rect in self.previous:
+                screen.fill(BLACK, rect)
+
+    def present(self, rects: list[pg.Rect]):
+        """ 前のフレームと今回描いた範囲を画面に送る """
+        dirty = self.previous + rects
+        if self.needs_full or self._is_large(dirty):
+            pg.display.flip()
+            self.full_frames += 1
+        else:
+            pg.display.update(dirty)
+            self.partial_frames += 1
+        self.previous = rects
+        self.needs_full = False
+
+    def stats(self) -> dict[str, int]:
+        return {"full_frames": self.full_frames, "partial_frames": self.partial_frames}
+
+
+class LoadGovernor:
+    """
+    負荷に応じて描画と弾数を段階的に簡略化する
+    直近 GOVERNOR_WINDOW_FRAMES フレームの平均フレーム時間と敵弾の数を見て、予算 (1000 / FPS ms) を超えそうなら
+    LEVELS の順に1段階ずつ簡略化し、余裕ができたら1段階ずつ戻す。段階を変えるたびにログを出す。
+    段階を変えた直後は、次の GOVERNOR_WINDOW_FRAMES フレーム分の計測がたまるまで判定しない。
+    """
+    LEVELS = ("normal", "simple_bomb", "fill_background", "cheap_bullets", "bullet_cap")
+    SIMPLE_BOMB = 1  # ボムエリアを輪郭だけにする
+    FILL_BACKGROUND = 2  # 背景画像を描かずに黒で塗る
+    CHEAP_BULLETS = 3  # 敵弾を α 合成なしの画像で描く
+    BULLET_CAP = 4  # 敵弾の数に上限をかける (古い弾から消す)
+
+    def __init__(self, max_level: int = BULLET_CAP, budget_ms: float = 1000.0 / FPS,
+                 window: int = GOVERNOR_WINDOW_FRAMES):
+        self.max_level = max_level
+        self.budget_ms = budget_ms
+        self.window = window
+        self.level = 0
+        self.frame_ms: deque[float] = deque(maxlen=window)
+        self.frames = 0
+        self.changes: list[tuple[int, int, int, float, int]] = []  # (フレーム, 変更前, 変更後, 平均 ms, 敵弾数)
+
+    @property
+    def simple_bomb(self) -> bool:
+        return self.level >= self.SIMPLE_BOMB
+
+    @property
+    def cheap_bullets(self) -> bool:
+        return self.level >= self.CHEAP_BULLETS
+
+    @property
+    def bullet_cap(self) -> int | None:
+        return GOVERNOR_BULLET_CAP if self.level >= self.BULLET_CAP else None
+
+    def background(self, image: pg.Surface | None) -> pg.Surface | None:
+        """ この段階で描く背景画像 (None なら黒で塗る) """
+        return None if self.level >= self.FILL_BACKGROUND else image
+
+    def update(self, frame_ms: float, bullet_count: int) -> bool:
+        """ プレイ中の1フレームの処理時間 (ms) と敵弾の数を記録し、段階を変えたら True を返す """
+        self.frames += 1
+        self.frame_ms.append(frame_ms)
+        if len(self.frame_ms) < self.window:
+            return False
+        average = sum(self.frame_ms) / len(self.frame_ms)
+        if average > self.budget_ms * GOVERNOR_HIGH_RATIO or bullet_count > GOVERNOR_BULLET_PRESSURE:
+            new_level = min(self.level + 1, self.max_level)
+        elif average < self.budget_ms * GOVERNOR_LOW_RATIO and bullet_count < GOVERNOR_BULLET_CAP:
+            # 弾数は上限より少なくなるまで戻さない (上限をかけた直後に戻して、また増えるのを繰り返さないため)
+            new_level = max(self.level - 1, 0)
+        else:
+            return False
+        if new_level == self.level:
+            return False
+
+        self.changes.append((self.frames, self.level, new_level, average, bullet_count))
+        print(f"LoadGovernor: {self.LEVELS[self.level]} -> {self.LEVELS[new_level]} "
+              f"(frame {self.frames}, 平均 {average:.1f}ms, 敵弾 {bullet_count})")
+        self.level = new_level
+        self.frame_ms.clear()
+        return True
+
+    def stats(self) -> dict[str, int]:
+        return {"level": self.level, "changes": len(self.changes),
+                "max_level_reached": max((new for _, _, new, _, _ in self.changes), default=0)}
+
+
 # EXステージ管理クラス
 class EX_STAGE:
     """
     EXTRA STAGE全体の進行（演出、プレイ、リザルト）を管理するクラス
+    プレイ中の処理は通常ステージから引き継いだ GameSession に任せる
     """
-    def __init__(self, screen: pg.Surface, player: Player, boss: Boss, all_sprites: pg.sprite.Group, player_bullets: pg.sprite.Group, enemy_bullets: pg.sprite.Group, se_hit, se_graze, se_bomb, bombs: int ,background_image: pg.Surface = None): # se_bomb, bombs を追加
+    def __init__(self, screen: pg.Surface, session: GameSession, background_image: pg.Surface = None):
         
         # 必要なオブジェクト参照
         self.screen = screen
-        self.player = player
-        self.boss = boss
-        self.all_sprites = all_sprites
-        self.player_bullets = player_bullets
-        self.enemy_bullets = enemy_bullets
-        
-        # 効果音
-        self.se_hit = se_hit
-        self.se_graze = se_graze
-        self.se_bomb = se_bomb # ボム効果音を保持
+        self.session = session
 
         # 背景画像
         self.background_image = background_image
@@ -1007,12 +2992,7 @@ class EX_STAGE:
         
         # タイマー
         self.transition_timer = 0
-        self.transition_duration = 60  # 1秒 (FPS依存)
-        
-        # EX専用スコア
-        self.score = 0
-        self.bombs = bombs # ★修正: ボム数を保持
-        self.bomb_active_area: BombArea | None = None # EX用ボムエリア
+        self.transition_duration = SIM_TICK_RATE  # 1秒 (ゲーム内時間)
 
     def start(self):
         """
@@ -1022,11 +3002,7 @@ class EX_STAGE:
         self.transition_timer = 0
         
         # 演出のため、ボスとプレイヤーを一時的に非表示（グループから削除）
-        try:
-            self.all_sprites.remove(self.boss)
-            self.all_sprites.remove(self.player)
-        except ValueError:
-            pass # すでに削除されている場合は何もしない
+        self.session.all_sprites.remove(self.session.boss, self.session.player)
 
     def update(self, keys: pg.key.ScancodeWrapper, events: list[pg.event.Event]) -> str:
         """
@@ -1038,109 +3014,26 @@ class EX_STAGE:
         if self.internal_state == "transition_start":
             self.transition_timer += 1
             if self.transition_timer > self.transition_duration * 3: # 3秒待機
-                # EXステージのセットアップ
+                # EXステージのセットアップ (残機・スコア・ボス・弾のリセット)
                 self.internal_state = "playing"
-                self.all_sprites.add(self.player, self.boss) # プレイヤーとボスを再追加
-                self.player.respawn() # プレイヤーを中央に配置
-                self.player.lives = 3 # EXステージは残機3で固定
-                self.score = 0 # スコアリセット
-                
-                # ボスをEXモードに設定
-                self.boss.start_ex_stage() 
-                
-                # 既存の弾をクリア
-                self.player_bullets.empty()
-                self.enemy_bullets.empty()
+                self.session.start_ex_stage()
 
         # EXステージプレイ中
         elif self.internal_state == "playing":
             
             # イベント処理 (復活・ボム)
             for event in events:
-                if self.player.is_respawning and event.type == pg.KEYDOWN:
-                    if event.key == pg.K_SPACE:
-                        self.player.respawn()
-
-                # EXステージ中のボム使用
-                if event.type == pg.KEYDOWN and event.key == pg.K_TAB:
-                    if self.bombs > 0 and self.bomb_active_area is None:
-                        self.bombs -= 1
-                        self.bomb_active_area = BombArea(self.player.rect.center)
-                        if self.se_bomb:
-                            self.se_bomb.set_volume(0.5)
-                            self.se_bomb.play()
-
-            # 更新処理
-            self.player.update(keys, self.player_bullets, self.boss)
-            if self.boss.is_active:
-                self.boss.update(self.enemy_bullets, self.player.rect.center)
-            self.player_bullets.update()
-
-            # ボムエリアの更新
-            if self.bomb_active_area is not None:
-                self.bomb_active_area.update(self.player.rect.center)
-                killed_bullets = self.bomb_active_area.check_collision_and_kill(self.enemy_bullets)
-                self.score += killed_bullets * 1 # ボムで消した弾は1点
-                if not self.bomb_active_area.is_active:
-                    self.bomb_active_area = None
-
-            # 敵弾の更新 (画面外消去とスコア)
-            avoided_bullets_score = 0
-            for bullet in list(self.enemy_bullets):
-                bullet.update()
-                if not self.screen.get_rect().colliderect(bullet.rect):
-                    bullet.kill()
-                    avoided_bullets_score += 10 # EXはスコア高め
-            self.score += avoided_bullets_score
-
-            # 当たり判定
-            # 自機弾 vs ボス
-            if self.boss.is_active:
-                hits = pg.sprite.spritecollide(self.boss, self.player_bullets, True)
-                if hits:
-                    damage = len(hits) # ★修正: パワーアップ未対応（元コード通り）
-                    self.boss.hit(damage)
-                    self.score += damage
-            
-            # 敵弾 vs 自機
-            if not self.player.is_respawning:
-                # GRAZE判定
-                graze_list = pg.sprite.spritecollide(self.player, self.enemy_bullets, False, lambda p, b: p.grazebox.colliderect(b.rect))
-                for bullet in graze_list:
-                    if isinstance(bullet, EnemyDelayedLaser) and bullet.state != "active":
-                        continue
-                    if not bullet.grazed:
-                        if not self.player.hitbox.colliderect(bullet.rect):
-                            self.score += 50 # EXはGRAZEスコア高め
-                            bullet.grazed = True
-                            if self.se_graze: self.se_graze.play()
-
-                # 被弾判定
-                hit_bullets = pg.sprite.spritecollide(self.player, self.enemy_bullets, False, lambda p, b: p.hitbox.colliderect(b.rect))
-                active_hit_bullets = []
-                for bullet in hit_bullets:
-                    if isinstance(bullet, EnemyDelayedLaser) and bullet.state != "active":
-                        continue
-                    active_hit_bullets.append(bullet)
-
-                # 被弾処理
-                if active_hit_bullets:
-                    if self.se_hit: self.se_hit.play()
-                    self.player.hit()
-                    self.enemy_bullets.empty() # 弾幕全消去
-                    self.bomb_active_area = None # 被弾時にボム消去
-                    
-                    if self.player.lives <= 0:
-                        self.internal_state = "transition_failed" # EX失敗
-                        self.transition_timer = 0
-            
-            # ステージ移行判定 (ボス撃破)
-            if self.boss.check_skill_transition():
-                self.enemy_bullets.empty()
-                self.bomb_active_area = None # ステージ移行時にボム消去
-                if not self.boss.is_active:
-                    self.internal_state = "transition_clear" # EXクリア
-                    self.transition_timer = 0
+                if event.type == pg.KEYDOWN:
+                    self.session.handle_key(event.key)
+
+            # 更新処理 (当たり判定・スコアを含む)
+            status = self.session.step(keys)
+            if status == "cleared":
+                self.internal_state = "transition_clear" # EXクリア
+                self.transition_timer = 0
+            elif status == "game_over":
+                self.internal_state = "transition_failed" # EX失敗
+                self.transition_timer = 0
         
         # クリア演出中
         elif self.internal_state == "transition_clear":
@@ -1171,38 +3064,9 @@ class EX_STAGE:
         if self.internal_state == "transition_start":
             draw_ex_transition(self.screen, "EXTRA STAGE START", (255, 0, 100))
         
-        # プレイ中
+        # プレイ中 (UIはEX専用スコアを使用)
         elif self.internal_state == "playing":
-            #self.screen.fill(BLACK)
-
-            # 背景画像を描画
-            if self.background_image:
-                self.screen.blit(self.background_image, (0, 0))
-            else:
-                self.screen.fill(BLACK) # 画像がない場合のフォールバック
-
-            # all_sprites の描画 (点滅考慮)
-            for sprite in self.all_sprites:
-                 if isinstance(sprite, Player) and not sprite.is_visible:
-                     pass # 点滅中は描画しない
-                 else:
-                     self.screen.blit(sprite.image, sprite.rect)
-            
-            self.player_bullets.draw(self.screen)
-            self.enemy_bullets.draw(self.screen)
-            
-            # ボムエリアの描画
-            if self.bomb_active_area is not None:
-                self.bomb_active_area.draw(self.screen)
-
-            # UI描画 (EX専用スコアを使用)
-            draw_ui(self.screen, self.score, self.player.lives, self.boss, self.bombs) # self.bombs を渡す
-            
-            # 復活待機中の表示
-            if self.player.is_respawning:
-                font = pg.font.Font(None, 40)
-                text = font.render("Press SPACE to Respawn", True, WHITE)
-                self.screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, SCREEN_HEIGHT // 2 + 100))
+            self.session.draw(self.screen, self.background_image)
         
         # クリア演出
         elif self.internal_state == "transition_clear":
@@ -1215,16 +3079,477 @@ class EX_STAGE:
         # リザルト表示
         elif self.internal_state == "results":
             # ボスがクリアタイムを持っているので、それを参照
-            if self.boss.clear_times: # タイムが記録されているか確認
-                draw_ex_results(self.screen, self.boss.clear_times[-1])
+            clear_times = self.session.boss.clear_times
+            if clear_times: # タイムが記録されているか確認
+                draw_ex_results(self.screen, clear_times[-1])
             else:
                 draw_ex_results(self.screen, 0.0) # 念のため
 
 
-def main():
+class InputState:
+    """
+    pg.key.get_pressed() の代わりに Player.update へ渡すキー入力状態
+    押されているキーの集合を持ち、keys[pg.K_w] のように参照できる
+    """
+    def __init__(self, pressed=()):
+        self.pressed = set(pressed)
+
+    def __getitem__(self, key: int) -> bool:
+        return key in self.pressed
+
+
+# スクリプト入力・コマンドラインで使うキー名
+KEY_NAMES = {
+    "w": pg.K_w, "a": pg.K_a, "s": pg.K_s, "d": pg.K_d,
+    "shift": pg.K_LSHIFT, "tab": pg.K_TAB, "space": pg.K_SPACE,
+}
+# 押している間有効なキー (それ以外の tab / space はそのフレームだけ押下イベントを出す)
+HOLD_KEYS = (pg.K_w, pg.K_a, pg.K_s, pg.K_d, pg.K_LSHIFT)
+
+
+class IdleInput:
+    """ 何も押さない入力 (ヘッドレス実行用) """
+    def poll(self, session: GameSession) -> tuple[InputState, list[int]]:
+        return InputState(), []
+
+
+class RandomInput:
+    """
+    ランダム入力 (ヘッドレス実行用)
+    hold_frames ごとに移動方向と低速移動をランダムに選び直す。
+    被弾後はすぐに SPACE で復活し、ときどき TAB でボムを使う。
+    """
+    def __init__(self, seed: int, hold_frames: int = 20, bomb_chance: float = 0.002):
+        self.rng = random.Random(seed)
+        self.hold_frames = hold_frames
+        self.bomb_chance = bomb_chance
+        self.frame = 0
+        self.held = InputState()
+
+    def poll(self, session: GameSession) -> tuple[InputState, list[int]]:
+        if self.frame % self.hold_frames == 0:
+            pressed = []
+            horizontal = self.rng.choice((None, pg.K_a, pg.K_d))
+            vertical = self.rng.choice((None, pg.K_w, pg.K_s))
+            for key in (horizontal, vertical):
+                if key is not None:
+                    pressed.append(key)
+            if self.rng.random() < 0.3:
+                pressed.append(pg.K_LSHIFT)
+            self.held = InputState(pressed)
+        self.frame += 1
+
+        key_downs = []
+        if session.player.is_respawning:
+            key_downs.append(pg.K_SPACE)
+        if self.rng.random() < self.bomb_chance:
+            key_downs.append(pg.K_TAB)
+        return self.held, key_downs
+
+
+class DodgeInput:
+    """
+    弾を避ける入力 (ヘッドレス実行・balance.py・--autoplay 用の回避ボット)
+    毎フレーム、WASD と低速移動の組み合わせ (17通り) それぞれについて、押し続けたときの自機の位置と
+    敵弾・置きレーザーの位置を DODGE_LOOKAHEAD_FRAMES フレーム先まで予測し、危険度が最も低いものを選ぶ。
+    予測と距離の計算は (組み合わせ, フレーム, 弾) の配列でまとめて行う。
+    どう動いても DODGE_BOMB_FRAMES 以内に被弾するときはボムを使い、被弾後はすぐに SPACE で復活する。
+    """
+    HIT_PENALTY = 1000.0  # 被弾する予測1フレームあたりの危険度
+    DECAY = 0.85  # 1フレーム先ほど危険度の重みを下げる (予測が外れやすいため)
+    HOME_WEIGHT = 2.0  # DODGE_HOME から画面の高さ分離れたときの危険度
+    STICKY_BONUS = 0.05  # 前のフレームと同じ入力を少し優先する (細かく揺れないように)
+
+    def __init__(self):
+        directions = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+        # (横方向, 縦方向, 低速) の組み合わせ。止まるときは低速の有無を区別しない
+        self.moves = [(dx, dy, slow) for dx, dy in directions for slow in (False, True)
+                      if not (dx == dy == 0 and slow)]
+        self.inputs = []
+        for dx, dy, slow in self.moves:
+            pressed = [key for key, on in ((pg.K_a, dx < 0), (pg.K_d, dx > 0), (pg.K_w, dy < 0),
+                                           (pg.K_s, dy > 0), (pg.K_LSHIFT, slow)) if on]
+            self.inputs.append(InputState(pressed))
+        self.directions = np.array([(dx, dy) for dx, dy, _ in self.moves], dtype=float)
+        self.slow = np.array([slow for _, _, slow in self.moves])
+        self.steps = np.arange(1, DODGE_LOOKAHEAD_FRAMES + 1, dtype=float)
+        self.weights = self.DECAY ** (self.steps - 1)
+        self.previous = self.moves.index((0, 0, False))
+
+    def poll(self, session: GameSession) -> tuple[InputState, list[int]]:
+        player = session.player
+        if player.is_respawning:
+            return InputState(), [pg.K_SPACE]
+
+        risk, hits_soon = self.evaluate(session)
+        risk[self.previous] -= self.STICKY_BONUS
+        best = int(np.argmin(risk))
+        self.previous = best
+
+        key_downs = []
+        if hits_soon[best] and session.bombs > 0 and session.bomb_active_area is None:
+            key_downs.append(pg.K_TAB)
+        return self.inputs[best], key_downs
+
+    def predict_player(self, player: Player) -> tuple[np.ndarray, np.ndarray]:
+        """ 入力の組み合わせごとの、1〜DODGE_LOOKAHEAD_FRAMES フレーム先の自機の中心 (組み合わせ, フレーム) """
+        speed = np.where(self.slow, player.speed * 0.5, player.speed)
+        half_w, half_h = player.rect.width / 2, player.rect.height / 2
+        x0, y0 = player.rect.center
+        # 画面端では Player.update と同じく画面内に押し戻される
+        x = np.clip(x0 + np.outer(self.directions[:, 0] * speed, self.steps), half_w, SCREEN_WIDTH - half_w)
+        y = np.clip(y0 + np.outer(self.directions[:, 1] * speed, self.steps), half_h, SCREEN_HEIGHT - half_h)
+        return x, y
+
+    def evaluate(self, session: GameSession) -> tuple[np.ndarray, np.ndarray]:
+        """
+        入力の組み合わせごとの危険度と、DODGE_BOMB_FRAMES 以内に被弾すると予測されるかを返す
+        危険度は弾との隙間が DODGE_SAFE_DISTANCE より狭いほど大きく、被弾すると予測されたフレームは HIT_PENALTY
+        """
+        player = session.player
+        px, py = self.predict_player(player)  # (組み合わせ, フレーム)
+        player_half = player.hitbox.width / 2
+        gaps = []  # (組み合わせ, フレーム, 弾) の隙間
+
+        x, y, vx, vy, radius, half_x, half_y = session.enemy_bullets.motion_arrays()
+        if len(x):
+            # 予測する間に届かない弾は除く
+            reach = (np.hypot(vx, vy) + player.speed) * DODGE_LOOKAHEAD_FRAMES + radius + np.hypot(half_x, half_y)
+            near = np.flatnonzero(np.hypot(x - player.rect.centerx, y - player.rect.centery)
+                                  < reach + player_half + DODGE_SAFE_DISTANCE)
+            if len(near):
+                x, y, vx, vy = x[near], y[near], vx[near], vy[near]
+                radius, half_x, half_y = radius[near], half_x[near], half_y[near]
+                # 弾の中心からの差 (組み合わせ, フレーム, 弾)
+                dx = px[:, :, None] - (x + np.outer(self.steps, vx))[None]
+                dy = py[:, :, None] - (y + np.outer(self.steps, vy))[None]
+                # カプセル (細レーザー) は線分上の最も近い点との距離。丸い弾は half が 0 なので中心との距離
+                length_sq = half_x * half_x + half_y * half_y
+                inv_length_sq = np.divide(1.0, length_sq, out=np.zeros_like(length_sq), where=length_sq > 0)
+                t = np.clip((dx * half_x + dy * half_y) * inv_length_sq, -1.0, 1.0)
+                gaps.append(np.hypot(dx - t * half_x, dy - t * half_y) - radius - player_half)
+
+        lasers = session.enemy_bullets.delayed_lasers()
+        if lasers:
+            rects = [laser.active_image.get_rect(center=laser.pos) for laser in lasers]
+            left = np.array([rect.left for rect in rects], dtype=float)
+            right = np.array([rect.right for rect in rects], dtype=float)
+            top = np.array([rect.top for rect in rects], dtype=float)
+            bottom = np.array([rect.bottom for rect in rects], dtype=float)
+            # 当たり判定が有効になるフレームの範囲 (警告中なら警告が終わってから)
+            start = np.array([laser.delay - laser.timer + 1 if laser.state == "warning" else 0
+                              for laser in lasers], dtype=float)
+            end = np.array([laser.duration - laser.timer if laser.state == "active"
+                            else laser.delay - laser.timer + 1 + laser.duration for laser in lasers], dtype=float)
+            ex = np.maximum(np.maximum(left - px[:, :, None], px[:, :, None] - right), 0.0)
+            ey = np.maximum(np.maximum(top - py[:, :, None], py[:, :, None] - bottom), 0.0)
+            active = (self.steps[:, None] >= start) & (self.steps[:, None] <= end)  # (フレーム, レーザー)
+            gaps.append(np.where(active[None], np.hypot(ex, ey) - player_half, np.inf))
+
+        if gaps:
+            gap = np.concatenate(gaps, axis=2)
+            hit = gap <= DODGE_HIT_MARGIN
+            closeness = np.clip(1.0 - gap / DODGE_SAFE_DISTANCE, 0.0, 1.0)
+            per_frame = (closeness * closeness).sum(axis=2) + self.HIT_PENALTY * hit.any(axis=2)
+            risk = per_frame @ self.weights
+            hits_soon = hit[:, :DODGE_BOMB_FRAMES].any(axis=(1, 2))
+        else:
+            risk = np.zeros(len(self.moves))
+            hits_soon = np.zeros(len(self.moves), dtype=bool)
+
+        # 危険がないときは DODGE_HOME に戻る (画面の隅に追い込まれないように)
+        home_x, home_y = DODGE_HOME
+        risk += self.HOME_WEIGHT * np.hypot(px[:, -1] - home_x, py[:, -1] - home_y) / SCREEN_HEIGHT
+        return risk, hits_soon
+
+
+class ScriptedInput:
+    """
+    スクリプト入力 (ヘッドレス実行用)
+    1行に "フレーム番号 キー名..." を書いたテキストファイルを読み込む。
+    w / a / s / d / shift は次の行まで押しっぱなし、tab / space はそのフレームだけ押す。
+    例: "0 a shift" / "60 d" / "90 tab"
+    """
+    def __init__(self, path: str):
+        self.steps: dict[int, list[int]] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                fields = line.split("#")[0].split()
+                if not fields:
+                    continue
+                self.steps[int(fields[0])] = [KEY_NAMES[name.lower()] for name in fields[1:]]
+        self.frame = 0
+        self.held = InputState()
+
+    def poll(self, session: GameSession) -> tuple[InputState, list[int]]:
+        key_downs = []
+        keys = self.steps.get(self.frame)
+        if keys is not None:
+            self.held = InputState(key for key in keys if key in HOLD_KEYS)
+            key_downs = [key for key in keys if key not in HOLD_KEYS]
+        self.frame += 1
+        return self.held, key_downs
+
+
+# 入力記録用のビット (1フレーム分の入力を1バイトで表す)
+KEY_BITS = {
+    pg.K_w: 1, pg.K_a: 2, pg.K_s: 4, pg.K_d: 8,
+    pg.K_LSHIFT: 16, pg.K_TAB: 32, pg.K_SPACE: 64,
+}
+START_EX_BIT = 128  # このフレームの前に EX ステージへ突入した
+
+# リプレイファイルのヘッダ: マジック, バージョン, 難易度, 開始ステージ, シード, ランの数
+REPLAY_MAGIC = b"KPRP"
+REPLAY_VERSION = 1
+REPLAY_HEADER = struct.Struct("<4sBBBQI")
+REPLAY_RUN = struct.Struct("<BH")  # (入力ビット, 連続フレーム数)
+REPLAY_DIFFICULTIES = ("EASY", "NORMAL", "HARD")
+REPLAY_STAGES = ("1", "2", "3", "EX")
+
+
+def encode_input(keys) -> int:
+    """ 押しっぱなしのキー (WASD, LSHIFT) を入力ビットにする """
+    mask = 0
+    for key in HOLD_KEYS:
+        if keys[key]:
+            mask |= KEY_BITS[key]
+    return mask
+
+
+class InputRecorder:
+    """
+    GameSession.step ごとの入力ビットをランレングス圧縮して記録する
+    同じ入力が続く間は1つのラン (3バイト) にまとまるので、1時間分でも数十KB程度に収まる
+    """
+    def __init__(self, difficulty: str, stage: str, seed: int):
+        self.difficulty = difficulty
+        self.stage = stage
+        self.seed = seed
+        self.runs: list[list[int]] = []  # [入力ビット, 連続フレーム数]
+        self.frames = 0
+
+    def record(self, mask: int):
+        if self.runs and self.runs[-1][0] == mask and self.runs[-1][1] < 0xFFFF:
+            self.runs[-1][1] += 1
+        else:
+            self.runs.append([mask, 1])
+        self.frames += 1
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION,
+                                       REPLAY_DIFFICULTIES.index(self.difficulty),
+                                       REPLAY_STAGES.index(self.stage), self.seed, len(self.runs)))
+            for mask, count in self.runs:
+                f.write(REPLAY_RUN.pack(mask, count))
+
+
+class ReplayInput:
+    """
+    InputRecorder で保存したファイルを再生する入力ソース (ヘッドレス実行用)
+    ヘッダの難易度・ステージ・シードで GameSession を作れば、記録時と同じフレームで同じ入力を再現する
+    """
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < REPLAY_HEADER.size:
+            raise ValueError(f"{path}: リプレイファイルではありません")
+        magic, version, difficulty, stage, self.seed, run_count = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"{path}: リプレイファイルではありません (または非対応のバージョン)")
+        self.difficulty = REPLAY_DIFFICULTIES[difficulty]
+        self.stage = REPLAY_STAGES[stage]
+
+        self.masks = bytearray()
+        for mask, count in REPLAY_RUN.iter_unpack(data[REPLAY_HEADER.size:REPLAY_HEADER.size + run_count * REPLAY_RUN.size]):
+            self.masks += bytes((mask,)) * count
+        self.frame = 0
+
+    def __len__(self) -> int:
+        return len(self.masks)
+
+    def poll(self, session: GameSession) -> tuple[InputState, list[int]]:
+        mask = self.masks[self.frame] if self.frame < len(self.masks) else 0
+        self.frame += 1
+        if mask & START_EX_BIT and not session.is_ex_stage:
+            session.start_ex_stage()
+        held = InputState(key for key in HOLD_KEYS if mask & KEY_BITS[key])
+        key_downs = [key for key in (pg.K_SPACE, pg.K_TAB) if mask & KEY_BITS[key]]
+        return held, key_downs
+
+
+# create_input_source の組み込みの入力 (これ以外はスクリプトファイルのパスとして読む)
+INPUT_SOURCE_NAMES = ("random", "idle", "dodge")
+
+
+def create_input_source(name: str, seed: int):
+    """ "random" / "idle" / "dodge" / スクリプトファイルのパス から入力ソースを作る """
+    if name == "random":
+        return RandomInput(seed)
+    if name == "idle":
+        return IdleInput()
+    if name == "dodge":
+        return DodgeInput()
+    return ScriptedInput(name)
+
+
+def run_headless(difficulty: str, stage: str, frames: int, seed: int,
+                 input_source, render: bool = False, record_path: str | None = None,
+                 continue_to_ex: bool = False, snapshot_path: str | None = None) -> dict:
+    """
+    ウィンドウ・音なしで、指定した難易度とステージ (1, 2, 3, EX) を frames フレーム分だけ
+    CPU の許す限り速くシミュレーションし、統計を返す。
+    render=True のときは画面外の Surface に描画処理も行う。
+    record_path を指定すると入力をリプレイファイルに保存する。
+    continue_to_ex=True のときはボス撃破後も止めずに進める (EX 突入を含むリプレイの再生用)。
+    snapshot_path を指定すると、最後のフレームの状態をセーブステートとして保存する。
+    """
+    session = GameSession(difficulty, seed=seed)
+    if record_path:
+        session.recorder = InputRecorder(difficulty, stage, seed)
+    if stage == "EX":
+        session.start_ex_stage()
+    else:
+        session.boss.start_skill(int(stage) - 1)
+    screen = pg.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)) if render else None
+
+    status = "playing"
+    peak_bullets = 0
+    start_time = time.perf_counter()
+    for _ in range(frames):
+        keys, key_downs = input_source.poll(session)
+        for key in key_downs:
+            session.handle_key(key)
+        status = session.step(keys)
+        peak_bullets = max(peak_bullets, len(session.enemy_bullets))
+        if screen is not None:
+            session.draw(screen, None)
+        if status == "game_over" or (status == "cleared" and (session.is_ex_stage or not continue_to_ex)):
+            break
+    elapsed = time.perf_counter() - start_time
+    if session.recorder is not None:
+        session.recorder.save(record_path)
+    if snapshot_path:
+        with open(snapshot_path, "wb") as f:
+            f.write(session.snapshot())
+
+    return {
+        "difficulty": difficulty,
+        "stage": stage,
+        "seed": seed,
+        "status": status,
+        "frames": session.frame_count,
+        "seconds": elapsed,
+        "sim_fps": session.frame_count / elapsed if elapsed > 0 else 0.0,
+        "score": session.score,
+        "lives": session.player.lives,
+        "hits": session.hit_total,
+        "grazes": session.graze_total,
+        "bombs_used": session.bombs_used,
+        "peak_bullets": peak_bullets,
+        "skill": session.boss.get_current_skill_name(),
+        "boss_hp": session.boss.hp,
+    }
+
+
+def init_headless():
+    """ SDL のダミードライバでウィンドウ・音なしの pygame を初期化する """
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    pg.init()
+    pg.display.set_mode((1, 1))  # convert_alpha() のために必要
+
+
+def main_headless(args: argparse.Namespace):
+    """
+    ヘッドレス実行のエントリポイント (--headless)
+    1回ごとの統計を1行ずつ表示する
+    """
+    init_headless()
+    if args.replay:
+        # リプレイの再生 (難易度・ステージ・シード・フレーム数はファイルから読む)
+        replay = ReplayInput(args.replay)
+        stats = run_headless(replay.difficulty, replay.stage, len(replay), replay.seed, replay,
+                             args.render, continue_to_ex=True)
+        print(" ".join(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+                       for key, value in stats.items()))
+        pg.quit()
+        return
+
+    for run in range(args.runs):
+        seed = args.seed + run
+        record_path = args.record
+        snapshot_path = args.save_snapshot
+        if args.runs > 1:
+            if record_path:
+                root, ext = os.path.splitext(record_path)
+                record_path = f"{root}_{run}{ext}"
+            if snapshot_path:
+                root, ext = os.path.splitext(snapshot_path)
+                snapshot_path = f"{root}_{run}{ext}"
+        stats = run_headless(args.difficulty, args.stage, args.frames, seed,
+                             create_input_source(args.input, seed), args.render, record_path,
+                             snapshot_path=snapshot_path)
+        print(" ".join(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+                       for key, value in stats.items()))
+    print(f"asset cache: {ASSETS.stats()}")
+    if BULLET_ENGINE == "sprite":  # プールを使うのはスプライト版の敵弾だけ
+        print(f"bullet pool: {BULLET_POOL.stats()}")
+    pg.quit()
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="某弾幕シューティング風ボスステージ")
+    parser.add_argument("--headless", action="store_true",
+                        help="ウィンドウ・音なしでシミュレーションだけを実行する")
+    parser.add_argument("--difficulty", choices=("EASY", "NORMAL", "HARD"), default="NORMAL")
+    parser.add_argument("--stage", choices=("1", "2", "3", "EX"), default="1")
+    parser.add_argument("--frames", type=int, default=3600, help="1回あたりの最大フレーム数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード (回ごとに +1 する)")
+    parser.add_argument("--runs", type=int, default=1, help="実行回数")
+    parser.add_argument("--input", default="random",
+                        help='入力: "random" / "idle" / "dodge" (回避ボット) / スクリプトファイルのパス')
+    parser.add_argument("--render", action="store_true", help="画面外の Surface に描画処理も行う")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="プレイ画面を変化した部分だけ描画する (ダーティ矩形)")
+    parser.add_argument("--no-governor", action="store_true",
+                        help="負荷が高いときに描画と弾数を簡略化しない (LoadGovernor を使わない)")
+    parser.add_argument("--audio-buffer", type=int, default=AUDIO_BUFFER_SIZE,
+                        help="mixer のバッファサイズ (サンプル数)。音が途切れる環境では大きくする")
+    parser.add_argument("--autoplay", action="store_true",
+                        help="プレイ中の操作を回避ボット (DodgeInput) に任せる (難易度選択・EX突入は手動)")
+    parser.add_argument("--record", metavar="PATH",
+                        help="入力をリプレイファイルに保存する (--runs が2以上なら PATH_回数 に保存)")
+    parser.add_argument("--save-snapshot", metavar="PATH",
+                        help="ヘッドレス実行の最後のフレームの状態をセーブステートに保存する "
+                             "(--runs が2以上なら PATH_回数 に保存。benchmark.py --snapshot で使う)")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="リプレイファイルをヘッドレスで再生する (--headless と一緒に使う)")
+    args = parser.parse_args(argv)
+    if args.record:
+        args.record = os.path.join(ORIGINAL_CWD, args.record)
+    if args.replay:
+        args.replay = os.path.join(ORIGINAL_CWD, args.replay)
+    if args.save_snapshot:
+        args.save_snapshot = os.path.join(ORIGINAL_CWD, args.save_snapshot)
+    if args.input not in INPUT_SOURCE_NAMES:
+        args.input = os.path.join(ORIGINAL_CWD, args.input)
+    return args
+
+
+def main(record_path: str | None = None, dirty_rects: bool = DIRTY_RECT_RENDERING,
+         audio_buffer: int = AUDIO_BUFFER_SIZE, governor_enabled: bool = LOAD_GOVERNOR,
+         autoplay: bool = False):
     """
     ゲームのメイン関数
+    record_path を指定すると、プレイの入力を終了時にリプレイファイルとして保存する
+    dirty_rects=True ならプレイ画面を DirtyRectRenderer で描画する
+    audio_buffer は mixer のバッファサイズ (小さいほど効果音の遅延が短い)
+    governor_enabled=True なら負荷が高いときに LoadGovernor で描画と弾数を簡略化する
+    autoplay=True ならプレイ中のキー入力の代わりに回避ボット (DodgeInput) の入力を使う
     """
+    # mixer の設定は pg.init() より前に行う (pg.init() が mixer も初期化するため)
+    pg.mixer.pre_init(buffer=audio_buffer)
     pg.init()
     # mixer 初期化は環境によって失敗する可能性があるため try/except 推奨
     try:
@@ -1235,17 +3560,26 @@ def main():
 
     screen = pg.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pg.display.set_caption("某弾幕シューティング風ボスステージ (EX Stage 追加)")
-    clock = pg.time.Clock()
-
-
-    try:
-        # 効果音の読み込みs
-        se_hit = pg.mixer.Sound("data/se_hit.wav") #
-        se_graze = pg.mixer.Sound("data/se_graze.wav")
-        se_bomb = pg.mixer.Sound("data/8bit_read2.mp3")
-        se_powerup = pg.mixer.Sound("data/8bit_read2.mp3")
-    except (pg.error, FileNotFoundError):
-        print("Warning: BGMまたは効果音ファイルが見つかりません。")
+    clock = pg.time.Clock()  # 描画フレームの間隔調整用 (ゲーム内の時間は session.clock で進む)
+
+    # 背景画像と BGM はワーカースレッドで先読みしておく (EXステージの分はリザルト画面で予約する)
+    loader = AssetLoader()
+    for difficulty in ("NORMAL", "EASY", "HARD"):
+        loader.request_image(STAGE_BACKGROUNDS[difficulty])
+        loader.request_file(STAGE_BGM[difficulty])
+
+    # 細レーザーの回転画像を起動時に作っておく (プレイ中の回転処理をなくす)
+    # 固まって見えないよう、読み込み画面を表示しながら少しずつ作る
+    rotations = EnemyLaser.get_rotations()
+    chunk = 30
+    steps = [partial(rotations.preload, start, start + chunk) for start in range(0, rotations.buckets, chunk)]
+    if not run_loading_screen(screen, steps):
+        loader.shutdown()
+        pg.quit()
+        sys.exit()
+
+    # 効果音は起動時に1度だけ読み込み、全てのセッションで共有する
+    audio = AudioManager()
 
     # ゲーム変数
     # 難易度管理クラスをインスタンス化
@@ -1254,43 +3588,49 @@ def main():
     game_state = "difficulty_select"  # 起動時に難易度選択から開始
     running = True
 
-    # スプライトグループの作成
-    all_sprites = pg.sprite.Group()
-    player_bullets = pg.sprite.Group()
-    enemy_bullets = pg.sprite.Group()
-    items = pg.sprite.Group()
-
     # ゲーム変数
-    score = 0
     current_difficulty = "NORMAL" # デフォルト難易度
-    player = None # player が未定義の可能性があるため None で初期化
-    boss = None # boss が未定義の可能性があるため None で初期化
+    session: GameSession | None = None # 自機・ボス・弾・スコアなど (難易度決定時に生成)
 
     ex_background_image = None #EX背景画像をここで初期化
 
-    # EX 関連タイマー
-    transition_timer = 0 # EX_STAGE クラスが管理
-    transition_duration = 60  # EX_STAGE クラスが管理
-
     ex_stage_manager = None
+    ex_events: list[pg.event.Event] = []  # EX_STAGE に渡していないイベント
 
-    # アイテム生成タイマー
-    item_spawn_interval = 5000  # 5秒
-    last_item_spawn = pg.time.get_ticks()
+    profiler = FrameProfiler()  # F3 で処理時間のオーバーレイを表示
+    quick_save = QuickSave(recording=bool(record_path))  # F5 / F9 でセーブステートの保存・読み込み
+    renderer = DirtyRectRenderer() if dirty_rects else None  # プレイ画面を変化した部分だけ描画する
 
-    # ボム関連の変数
-    bombs = 3 # 残りボム数
-    bomb_active_area: BombArea | None = None # 現在アクティブなボムエリア
+    # 負荷が高いときは描画と弾数を段階的に簡略化する
+    # (リプレイを記録するときは、実行環境で展開が変わらないよう弾数の上限はかけない)
+    governor = None
+    if governor_enabled:
+        governor = LoadGovernor(LoadGovernor.CHEAP_BULLETS if record_path else LoadGovernor.BULLET_CAP)
+
+    bot = DodgeInput() if autoplay else None  # --autoplay のときプレイ中の操作を任せる
     
 
     # メインループ
     while running:
+        frame_start = time.perf_counter()
+        profiler.begin(session)
+        dirty_frame = False  # このフレームを renderer で描画したか
         events = pg.event.get()
         
         # イベント処理
         for event in events:
             if event.type == pg.QUIT:
                 running = False
+
+            # プロファイラの表示切替・CSV保存 (どの画面でも有効)
+            if event.type == pg.KEYDOWN and profiler.handle_key(event.key, session):
+                continue
+
+            # セーブステートの保存・読み込み (プレイ中のみ)
+            playing = game_state == "playing" or (game_state == "ex_stage" and ex_stage_manager is not None
+                                                  and ex_stage_manager.internal_state == "playing")
+            if event.type == pg.KEYDOWN and quick_save.handle_key(event.key, session, playing):
+                continue
             
             # 難易度変更関連のイベント処理
             next_state, selected_diff = level_manager.handle_event(event, game_state)
@@ -1298,73 +3638,21 @@ def main():
             # "playing_start" シグナルを受け取った場合
             if next_state == "playing_start" and game_state == "difficulty_select":
                 current_difficulty = selected_diff
-                
-                # スプライトグループを初期化
-                all_sprites = pg.sprite.Group()
-                player_bullets = pg.sprite.Group()
-                enemy_bullets = pg.sprite.Group()
-                items.empty() # アイテムもクリア
-                
-                # インスタンスを生成 (難易度を渡す)
-                player = Player(current_difficulty)
-                boss = Boss(current_difficulty)
-                all_sprites.add(player, boss) # PlayerとBossもGroupに追加
 
-                try:
-                    if current_difficulty == "NORMAL":
-                        background_image = pg.image.load("data/HAIKEI1.png").convert()
-                        # 画面サイズに合わせて背景画像をスケール (必要に応じて)ノマ
-                        # self.imageはSpriteの属性なので、ここでは直接screenに描画する
-                        background_image = pg.transform.scale(background_image, (SCREEN_WIDTH, SCREEN_HEIGHT))
-
-                    elif current_difficulty == "EASY":
-                        background_image = pg.image.load("data/HAIKEI2.jpg").convert()
-                        # 画面サイズに合わせて背景画像をスケール (必要に応じて)イージー
-                        # self.imageはSpriteの属性なので、ここでは直接screenに描画する
-                        background_image = pg.transform.scale(background_image, (SCREEN_WIDTH, SCREEN_HEIGHT))
-
-                    elif current_difficulty == "HARD":
-                        background_image = pg.image.load("data/HAIKEI3.jpg").convert()
-                        # 画面サイズに合わせて背景画像をスケール (必要に応じて)ハード
-                        # self.imageはSpriteの属性なので、ここでは直接screenに描画する
-                        background_image = pg.transform.scale(background_image, (SCREEN_WIDTH, SCREEN_HEIGHT))
-
-                    
-                except pg.error as e:
-                    print(f"背景画像の読み込みに失敗しました: {e}")
-                    # 失敗した場合、黒い背景を使用
-                    background_image = None
-
-                # BGMと効果音を None で初期化
-                se_hit = None
-                se_graze = None
-                se_bomb = None #Noneで初期化
-                se_powerup = None #Noneで初期化
+                # 背景画像は先読み済みのものを使う (読み込みに失敗していれば None = 黒い背景)
+                background_image = loader.image(STAGE_BACKGROUNDS[current_difficulty])
 
                 try:
-                    if current_difficulty == "NORMAL":
-                        # BGM の読み込みと再生 (無限ループ)ノマ
-                        pg.mixer.music.load("data/BGM1.mp3")
-                        pg.mixer.music.play(loops=-1) 
-
-                    elif current_difficulty == "HARD":
-                        # BGM の読み込みと再生 (無限ループ)ハード
-                        pg.mixer.music.load("data/BGM2.mp3")
-                        pg.mixer.music.play(loops=-1) 
-
-                    elif current_difficulty == "EASY":
-                        # BGM の読み込みと再生 (無限ループ)イージー
-                        pg.mixer.music.load("data/BGM3.mp3")
-                        pg.mixer.music.play(loops=-1) 
-
-                except pg.error as e:
+                    # 先読みした BGM の再生 (無限ループ)
+                    play_bgm(loader, STAGE_BGM[current_difficulty])
+                except (pg.error, OSError) as e:
                     print(f"bgmの読み込みに失敗しました: {e}")
-                    # 失敗した場合、黒い背景を使用
-                    background_image = None
                 
-                score = 0
-                bombs = 3 # ボム数をリセット
-                bomb_active_area = None # ボムエリアをリセット
+                # 自機・ボス・弾・スコア・ボム数を新しく用意する
+                session = GameSession(current_difficulty, audio)
+                session.governor = governor
+                if record_path:
+                    session.recorder = InputRecorder(current_difficulty, "1", session.seed)
                 game_state = "playing"  # 状態を "playing" に確定
                 continue  # 次のイベント処理をスキップ
             
@@ -1372,20 +3660,9 @@ def main():
             
             # その他のイベント処理
             if game_state == "playing":
-                # プレイヤー復活処理
-                if player and player.is_respawning and event.type == pg.KEYDOWN and event.key == pg.K_SPACE:
-                    player.respawn()
-
-                # Tabキーでボム使用 (resultsから移動)
-                if event.type == pg.KEYDOWN and event.key == pg.K_TAB:
-                    # ボムが残っていて、かつ、現在アクティブなボムがない時のみ発動
-                    if player and bombs > 0 and bomb_active_area is None:
-                        bombs -= 1
-                        bomb_active_area = BombArea(player.rect.center)
-                        if se_bomb:
-                            # 効果音は音量が大きくなりがちなので、適宜音量調整を入れる
-                            se_bomb.set_volume(0.5) 
-                            se_bomb.play()
+                # プレイヤー復活処理 (SPACE) と ボム使用 (TAB)
+                if session and event.type == pg.KEYDOWN:
+                    session.handle_key(event.key)
 
             elif game_state == "results":
                 # クリア画面での操作: SPACE で終了、CTRL で EX 突入
@@ -1395,33 +3672,19 @@ def main():
                     if event.key == pg.K_LCTRL or event.key == pg.K_RCTRL:
                         # EX 突入準備
                         # (各オブジェクトが None でないことを確認)
-                        if screen and player and boss and all_sprites is not None and \
-                           player_bullets is not None and enemy_bullets is not None:
-                            
-                            ex_stage_manager = EX_STAGE(screen, player, boss, all_sprites, player_bullets, enemy_bullets, se_hit, se_graze, se_bomb, bombs, ex_background_image) # se_bomb, bombs を渡す
-                            ex_stage_manager.start()
-                            game_state = "ex_stage" # メインの状態を EX に移行
-
-                            
+                        if screen and session is not None:
+                            # EXステージの背景と BGM はリザルト画面の間に先読みしてある
+                            ex_background_image = loader.image(STAGE_BACKGROUNDS["EX"])
                             try:
-                                if game_state == "ex_stage":
-                                    pg.mixer.music.load("data/BGM4.mp3")
-                                    pg.mixer.music.play(loops=-1)
-                            except pg.error:
-                                    print("Warning: EXステージBGMが見つかりません。")
+                                play_bgm(loader, STAGE_BGM["EX"])
+                            except (pg.error, OSError):
+                                print("Warning: EXステージBGMが見つかりません。")
 
-                                # 追加: EXステージ背景の設定
-                            try:
-                                # メイン関数の描画ループで使用する background_image 変数を上書き
-                                ex_background_image = pg.image.load("data/HAIKEI4.jpg").convert()
-                                ex_background_image = pg.transform.scale(ex_background_image, (SCREEN_WIDTH, SCREEN_HEIGHT))
-                       
-                            except pg.error as e:
-                                    print(f"EX背景画像の読み込みに失敗しました: {e}")
-
-                            ex_stage_manager = EX_STAGE(screen, player, boss, all_sprites, player_bullets, enemy_bullets, se_hit, se_graze, se_bomb, bombs, ex_background_image) 
+                            ex_stage_manager = EX_STAGE(screen, session, ex_background_image) # ボム数・効果音は session が引き継ぐ
                             ex_stage_manager.start()
-                            game_state = "ex_stage"
+                            game_state = "ex_stage" # メインの状態を EX に移行
+                            # リザルト画面で止まっていた時間を追いかけないようにする
+                            session.clock.resync()
 
             elif game_state == "game_over":
                 # ゲームオーバー画面でSPACEキーを押したら終了
@@ -1429,161 +3692,51 @@ def main():
                     running = False
 
         if game_state == "playing":
-            # Player や Boss が None の可能性 (初期化前) があるのでチェック
-            if player is None or boss is None:
+            # session が None の可能性 (初期化前) があるのでチェック
+            if session is None:
                  game_state = "difficulty_select" # 初期化されてないなら選択画面に戻る
                  continue
-            now = pg.time.get_ticks()
-            if now - last_item_spawn > item_spawn_interval:
-                last_item_spawn = now
-                # 画面上部のランダムな位置に生成
-                spawn_x = random.randint(50, SCREEN_WIDTH - 50)
-                spawn_y = -20
-                new_item = PowerItem((spawn_x, spawn_y))
-                items.add(new_item)
 
-            # 更新処理
-            keys = pg.key.get_pressed()
-            
-            # player.update は引数が特殊なので個別に呼ぶ
-            player.update(keys, player_bullets, boss) 
-            # boss.update も引数が特殊なので個別に呼ぶ
-            if boss.is_active:
-                boss.update(enemy_bullets, player.rect.center) # 引数を enemy_bullets に修正
+            profiler.mark("events")
 
-            # all_sprites.update() # PlayerとBossは個別Updateしたので不要
-            player_bullets.update()
-            items.update()
-
-            # アイテム取得判定
-            collected_items = pg.sprite.spritecollide(player, items, True)
-            if collected_items:
-                for item in collected_items:
-                    player.add_power_item()
-                if se_powerup:
-                    se_powerup.play()
-            
-            # ボムの更新と敵弾消去
-            if bomb_active_area is not None:
-                bomb_active_area.update(player.rect.center)
-                # 範囲内の弾を消去し、スコア加算
-                killed_bullets = bomb_active_area.check_collision_and_kill(enemy_bullets)
-                score += killed_bullets * 1 # ボムで消した弾は1点
-                
-                if not bomb_active_area.is_active:
-                    bomb_active_area = None # ボム終了
-
-            # 敵弾の更新 (画面外に出た弾を消去し、スコア加算)
-            avoided_bullets_score = 0
-            for bullet in list(enemy_bullets): # list() でコピーを作成してイテレート
-                bullet.update() # 敵弾のupdateを呼び出す
-                if not screen.get_rect().colliderect(bullet.rect):
-                    bullet.kill()
-                    # 弾を1つ避けきったらスコア1UP
-                    avoided_bullets_score += 1
-            score += avoided_bullets_score
-
-            # 当たり判定
-
-            # 自機弾 vs ボス
-            hits = pg.sprite.spritecollide(boss, player_bullets, True)
-            if hits:
-                # 1ダメージ = 1ヒットとして処理
-                total_damage = sum(bullet.damage for bullet in hits)
-                boss.hit(total_damage)
-                # 1ダメージにつきスコア1UP
-                score += total_damage
-
-            # 敵弾 vs 自機 (被弾 & GRAZE)
-            if not player.is_respawning:
-                
-                # GRAZE (かすり) 判定 (grazebox との衝突)
-                graze_list = pg.sprite.spritecollide(player, enemy_bullets, False, lambda p, b: p.grazebox.colliderect(b.rect))
-                
-                for bullet in graze_list:
-                    # 置きレーザーが 'warning' 状態なら判定しない
-                    if isinstance(bullet, EnemyDelayedLaser) and bullet.state != "active":
-                        continue
-
-                    if not bullet.grazed:
-                        # hitbox とは当たっていないことを確認
-                        if not player.hitbox.colliderect(bullet.rect):
-                            score += 20 # GRAZEスコア20
-                            bullet.grazed = True
-
-                # 被弾判定 (hitbox)
-                hit_bullets = pg.sprite.spritecollide(player, enemy_bullets, False, lambda p, b: p.hitbox.colliderect(b.rect))
-
-                # 置きレーザーの 'warning' 状態を除外
-                active_hit_bullets = []
-                for bullet in hit_bullets:
-                    if isinstance(bullet, EnemyDelayedLaser) and bullet.state != "active":
-                        continue
-                    active_hit_bullets.append(bullet)
-
-                if active_hit_bullets:
-                    if se_hit:
-                        se_hit.play()
-                    
-                    player.hit() # 残機を減らし、無敵状態へ
-                    
-                    # 画面上の敵弾を全消去
-                    for bullet in list(enemy_bullets):
-                        bullet.kill()
-                    
-                    if player.lives <= 0:
-                        game_state = "game_over"
-
-            # ステージ移行判定
-            if boss.check_skill_transition():
-                # 移行時に弾幕を消去
-                for bullet in list(enemy_bullets):
-                    bullet.kill()
-                
-                # ステージ移行時にボムエリアを強制終了
-                bomb_active_area = None 
-                
-                if not boss.is_active:
+            # 更新処理 (当たり判定・スコア・ステージ移行を含む)
+            # 実時間に合わせて固定刻みで必要な回数だけ進める (描画は1回だけ)
+            keys = pg.key.get_pressed()
+            if bot is not None:
+                keys, key_downs = bot.poll(session)
+                for key in key_downs:
+                    session.handle_key(key)
+            for _ in range(session.clock.steps_due()):
+                status = session.step(keys)
+                if status == "game_over":
+                    game_state = "game_over"
+                    break
+                elif status == "cleared":
                     game_state = "results"  # リザルト画面に移行
+                    # リザルト画面を表示している間に EXステージの背景と BGM を読み込んでおく
+                    loader.request_image(STAGE_BACKGROUNDS["EX"])
+                    loader.request_file(STAGE_BGM["EX"])
+                    break
 
             # 描画処理
-            
-            if background_image:
-                screen.blit(background_image, (0, 0)) # 背景画像を描画
+            if renderer is not None:
+                renderer.clear(screen, governor.background(background_image) if governor else background_image)
+                dirty = session.draw(screen, background_image, clear=False)
+                overlay_rect = profiler.draw(screen, session)
+                if overlay_rect:
+                    dirty.append(overlay_rect)
+                renderer.present(dirty)
+                dirty_frame = True
             else:
-                screen.fill(BLACK) # 背景画像がなければ黒で塗りつぶす
-            
-            # all_sprites.draw(screen) # PlayerとBossも描画
-            # Player, Boss を all_sprites に入れた場合の描画
-            for sprite in all_sprites:
-                 if isinstance(sprite, Player) and not sprite.is_visible:
-                     pass # 点滅中は描画しない
-                 else:
-                     screen.blit(sprite.image, sprite.rect)
-
-            player_bullets.draw(screen)
-            enemy_bullets.draw(screen)
-            items.draw(screen)
-            
-            # ボムエリアの描画
-            if bomb_active_area is not None:
-                bomb_active_area.draw(screen)
-
-            # UIの描画
-            draw_ui(screen, score, player.lives, boss, bombs) # bombsを渡す
-
-            # 復活待機中の表示
-            if player.is_respawning:
-                font = pg.font.Font(None, 40)
-                text = font.render("Press SPACE to Respawn", True, WHITE)
-                screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, SCREEN_HEIGHT // 2 + 100))
-
-            pg.display.flip()
+                session.draw(screen, background_image)
+                profiler.draw(screen, session)
+                pg.display.flip()
+            profiler.mark("flip")
 
         elif game_state == "results":
             # リザルト画面描画
-            if boss: # bossがNoneでないことを確認
-                draw_results(screen, boss.clear_times)
+            if session: # sessionがNoneでないことを確認
+                draw_results(screen, session.boss.clear_times)
             pg.display.flip() 
         
         elif game_state == "difficulty_select":
@@ -1601,27 +3754,75 @@ def main():
                 continue
 
             keys = pg.key.get_pressed()
+            if bot is not None and ex_stage_manager.internal_state == "playing":
+                # ボットの押下 (SPACE / TAB) はキーイベントとして EXマネージャに渡す
+                keys, key_downs = bot.poll(session)
+                events = events + [pg.event.Event(pg.KEYDOWN, key=key) for key in key_downs]
+            profiler.mark("events")
             
-            # EXマネージャを更新し、次のメイン状態を受け取る
-            next_main_state = ex_stage_manager.update(keys, events) 
+            # EXマネージャを固定刻みで必要な回数だけ更新し、次のメイン状態を受け取る
+            # (イベントは最初の tick にまとめて渡す。tick が進まなかったフレームのイベントは次に回す)
+            ex_events.extend(events)
+            next_main_state = "ex_stage"
+            for _ in range(session.clock.steps_due()):
+                next_main_state = ex_stage_manager.update(keys, ex_events)
+                ex_events = []
+                if next_main_state != "ex_stage":
+                    break
             game_state = next_main_state
             
-            if game_state == "ex_stage":
+            if game_state == "ex_stage" and renderer is not None and ex_stage_manager.internal_state == "playing":
+                # プレイ中は変化した部分だけ描画する (演出・リザルトは全体を描く)
+                ex_background = ex_stage_manager.background_image
+                renderer.clear(screen, governor.background(ex_background) if governor else ex_background)
+                dirty = session.draw(screen, ex_background, clear=False)
+                overlay_rect = profiler.draw(screen, session)
+                if overlay_rect:
+                    dirty.append(overlay_rect)
+                renderer.present(dirty)
+                dirty_frame = True
+                profiler.mark("flip")
+
+            elif game_state == "ex_stage":
                 if background_image:
                     screen.blit(background_image, (0, 0)) # 背景画像を描画
                 else:
                     screen.fill(BLACK) # 背景画像がなければ黒で塗りつぶす
                 # EX継続なら描画
                 ex_stage_manager.draw()
-                pg.display.flip() 
+                profiler.mark("draw")
+                profiler.draw(screen, session)
+                pg.display.flip()
+                profiler.mark("flip")
             
             elif game_state == "quit":
                 # EXマネージャが終了を通知
                 running = False
             
+        if renderer is not None and not dirty_frame:
+            renderer.invalidate()  # ほかの画面を描いたので、次のプレイ画面は全体を描く
+        profiler.end_frame(session)
+
+        # プレイ中のフレームの処理時間 (clock.tick の待ち時間を除く) と敵弾の数を LoadGovernor に渡す
+        if governor is not None and session is not None and game_state in ("playing", "ex_stage"):
+            changed = governor.update((time.perf_counter() - frame_start) * 1000, len(session.enemy_bullets))
+            if changed and renderer is not None:
+                renderer.invalidate()  # 背景の描き方が変わるので、次のフレームは全体を描き直す
         clock.tick(FPS)
+
+    if session is not None and session.recorder is not None:
+        session.recorder.save(record_path)
+        print(f"リプレイを保存しました: {record_path} ({session.recorder.frames} フレーム)")
+    if governor is not None and governor.changes:
+        print(f"LoadGovernor: {governor.stats()}")
+    loader.shutdown()
     pg.quit()
     sys.exit()
     
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    if args.headless:
+        main_headless(args)
+    else:
+        main(args.record, args.dirty_rects or DIRTY_RECT_RENDERING, args.audio_buffer,
+             LOAD_GOVERNOR and not args.no_governor, args.autoplay)
\ No newline at end of file
@@ -0,0 +1,356 @@
+"""
+バランス調整用の一括シミュレーション
+* ボット (入力ソース) × 難易度 × シードの組み合わせごとに、STAGE1 からヘッドレスで1ゲームを通しで実行する
+  (--ex なら STAGE3 撃破後に EX ステージも続けて実行する)
+* ゲームはプロセスプールで全 CPU コアに分けて並列に実行する
+* ステージごとのクリア率・クリアタイム・被弾数・GRAZE数・ボム使用数・最大弾数を集計し、
+  表 (コンソールと CSV) とヒートマップ (PNG) にまとめる
+
+ボスの HP (--hp) や弾幕パターンのファイル (--pattern-file) を差し替えて実行できるので、
+プレイせずに調整値を比べられる。結果は既定では bench_results/balance/ 以下に保存する。
+
+使い方:
+    python balance.py --runs 200
+    python balance.py --policies random idle --difficulties HARD --ex
+    python balance.py --hp HARD=150,250,350,1200 --pattern-file my_patterns.json --output-dir bench_results/hard_v2
+"""
+import argparse
+import csv
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Koka_Project は import 時にカレントディレクトリを移動するので、先に覚えておく
+ORIGINAL_CWD = os.getcwd()
+
+import numpy as np
+import pygame as pg
+
+import Koka_Project as game
+from benchmark import git_revision, write_json
+
+DIFFICULTIES = ["EASY", "NORMAL", "HARD"]
+STAGES = ["1", "2", "3", "EX"]
+
+# 1ゲームあたりの最大フレーム数 (既定は10分)
+DEFAULT_FRAMES = 60 * 60 * 10
+
+# ヒートマップにする指標 (集計結果のキー, 表示名, 値の書式)
+HEATMAP_METRICS = [
+    ("clear_rate", "clear rate", "{:.0%}"),
+    ("clear_time_mean", "mean clear time (s)", "{:.1f}"),
+    ("deaths_mean", "deaths per attempt", "{:.2f}"),
+    ("grazes_mean", "grazes per attempt", "{:.0f}"),
+    ("bombs_mean", "bombs per attempt", "{:.2f}"),
+    ("peak_bullets_max", "peak bullets", "{:.0f}"),
+]
+HEATMAP_CELL = (110, 44)  # セルの大きさ (幅, 高さ)
+HEATMAP_LABEL_WIDTH = 150  # 行ラベルの幅
+HEATMAP_HEADER_HEIGHT = 70  # タイトルと列ラベルの高さ
+HEATMAP_LOW = (40, 70, 160)  # 最小値の色
+HEATMAP_HIGH = (200, 50, 40)  # 最大値の色
+HEATMAP_EMPTY = (70, 70, 70)  # そのステージまで到達したゲームがないセル
+
+
+# ボット名 → create_input_source に渡す名前 (スクリプトは絶対パス)。ワーカーの初期化で設定する
+INPUT_SOURCES: dict[str, str] = {}
+
+
+def init_worker(input_sources: dict[str, str], boss_hp: dict, ex_boss_hp: dict,
+                pattern_file: str | None, engine: str):
+    """ ワーカープロセスの初期化 (pygame とボスの HP・弾幕パターンの差し替え) """
+    INPUT_SOURCES.update(input_sources)
+    game.BULLET_ENGINE = engine
+    game.BOSS_HP.update(boss_hp)
+    game.EX_BOSS_HP.update(ex_boss_hp)
+    if pattern_file:
+        game.PATTERNS = game.PatternLibrary(pattern_file)
+    game.init_headless()
+
+
+def stage_label(session: game.GameSession) -> str:
+    if session.is_ex_stage:
+        return "EX"
+    return str(session.boss.current_skill_index + 1)
+
+
+def run_game(job: tuple[str, str, int, int, bool]) -> dict:
+    """
+    1ゲームを STAGE1 から実行し、ステージごとの統計を返す (ワーカープロセスで実行する)
+    job: (ボット, 難易度, シード, 最大フレーム数, EX ステージも実行するか)
+    """
+    policy, difficulty, seed, frames, ex = job
+    session = game.GameSession(difficulty, seed=seed)
+    input_source = game.create_input_source(INPUT_SOURCES.get(policy, policy), seed)
+    boss = session.boss
+
+    stages: list[dict] = []
+    current = None
+    status = "timeout"
+    for _ in range(frames):
+        label = stage_label(session)
+        if current is None or current["stage"] != label:
+            current = {"stage": label, "cleared": False, "clear_time": None, "frames": 0,
+                       "deaths": 0, "grazes": 0, "bombs": 0, "peak_bullets": 0}
+            stages.append(current)
+
+        keys, key_downs = input_source.poll(session)
+        hits, grazes, bombs = session.hit_total, session.graze_total, session.bombs_used
+        cleared_count = len(boss.clear_times)
+        for key in key_downs:
+            session.handle_key(key)
+        step_status = session.step(keys)
+
+        current["frames"] += 1
+        current["deaths"] += session.hit_total - hits
+        current["grazes"] += session.graze_total - grazes
+        current["bombs"] += session.bombs_used - bombs
+        current["peak_bullets"] = max(current["peak_bullets"], len(session.enemy_bullets))
+        if len(boss.clear_times) > cleared_count:
+            current["cleared"] = True
+            current["clear_time"] = boss.clear_times[-1]
+
+        if step_status == "game_over":
+            status = "game_over"
+            break
+        if step_status == "cleared":
+            if ex and not session.is_ex_stage:
+                session.start_ex_stage()
+                continue
+            status = "cleared"
+            break
+
+    return {
+        "policy": policy,
+        "difficulty": difficulty,
+        "seed": seed,
+        "status": status,
+        "frames": session.frame_count,
+        "score": session.score,
+        "stages": stages,
+    }
+
+
+def summarize_stage(records: list[dict]) -> dict:
+    """ 同じ (ボット, 難易度, ステージ) の記録をまとめる """
+    attempts = len(records)
+    times = [record["clear_time"] for record in records if record["cleared"]]
+    result = {"attempts": attempts, "clears": len(times)}
+    if attempts:
+        result.update({
+            "clear_rate": len(times) / attempts,
+            "deaths_mean": float(np.mean([record["deaths"] for record in records])),
+            "grazes_mean": float(np.mean([record["grazes"] for record in records])),
+            "bombs_mean": float(np.mean([record["bombs"] for record in records])),
+            "peak_bullets_mean": float(np.mean([record["peak_bullets"] for record in records])),
+            "peak_bullets_max": max(record["peak_bullets"] for record in records),
+        })
+    if times:
+        result.update({
+            "clear_time_mean": float(np.mean(times)),
+            "clear_time_median": float(np.median(times)),
+            "clear_time_p90": float(np.percentile(times, 90)),
+        })
+    return result
+
+
+def summarize_games(games: list[dict]) -> list[dict]:
+    """ ゲームごとの結果を (ボット, 難易度, ステージ) ごとの集計行にまとめる """
+    groups: dict[tuple[str, str, str], list[dict]] = {}
+    for result in games:
+        for record in result["stages"]:
+            groups.setdefault((result["policy"], result["difficulty"], record["stage"]), []).append(record)
+    rows = []
+    policies = list(dict.fromkeys(result["policy"] for result in games))
+    for policy in policies:
+        for difficulty in DIFFICULTIES:
+            for stage in STAGES:
+                records = groups.get((policy, difficulty, stage))
+                if records:
+                    rows.append({"policy": policy, "difficulty": difficulty, "stage": stage,
+                                 **summarize_stage(records)})
+    return rows
+
+
+def print_summary(rows: list[dict]):
+    print(f"{'policy':10s} {'diff':6s} {'stage':5s} {'tries':>5s} {'clear':>6s} {'time':>6s} {'p90':>6s} "
+          f"{'deaths':>6s} {'graze':>6s} {'bombs':>5s} {'peak':>5s}")
+
+    def fmt(row: dict, key: str, spec: str, width: int) -> str:
+        return format(row[key], spec).rjust(width) if key in row else "-".rjust(width)
+
+    for row in rows:
+        print(f"{row['policy'][:10]:10s} {row['difficulty']:6s} {row['stage']:5s} {row['attempts']:5d} "
+              f"{fmt(row, 'clear_rate', '.0%', 6)} {fmt(row, 'clear_time_mean', '.1f', 6)} "
+              f"{fmt(row, 'clear_time_p90', '.1f', 6)} {fmt(row, 'deaths_mean', '.2f', 6)} "
+              f"{fmt(row, 'grazes_mean', '.0f', 6)} {fmt(row, 'bombs_mean', '.2f', 5)} "
+              f"{fmt(row, 'peak_bullets_max', 'd', 5)}")
+
+
+def write_csv(path: str, rows: list[dict], fields: list[str]):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"wrote {path}")
+
+
+def game_rows(games: list[dict]) -> list[dict]:
+    """ ゲームごとの結果をステージごとの1行に展開する (CSV 用) """
+    return [{"policy": result["policy"], "difficulty": result["difficulty"], "seed": result["seed"],
+             "status": result["status"], **record}
+            for result in games for record in result["stages"]]
+
+
+def heat_color(ratio: float) -> tuple[int, int, int]:
+    return tuple(int(low + (high - low) * ratio) for low, high in zip(HEATMAP_LOW, HEATMAP_HIGH))
+
+
+def draw_heatmap(rows: list[dict], metric: str, title: str, spec: str) -> pg.Surface:
+    """ 行を (ボット, 難易度)、列をステージにしたヒートマップを描く """
+    table = {(row["policy"], row["difficulty"], row["stage"]): row for row in rows}
+    row_keys = list(dict.fromkeys((row["policy"], row["difficulty"]) for row in rows))
+    values = [row[metric] for row in rows if metric in row]
+    low, high = (min(values), max(values)) if values else (0, 0)
+
+    cell_w, cell_h = HEATMAP_CELL
+    surface = pg.Surface((HEATMAP_LABEL_WIDTH + cell_w * len(STAGES),
+                          HEATMAP_HEADER_HEIGHT + cell_h * len(row_keys)))
+    surface.fill(game.BLACK)
+    surface.blit(game.TEXT.render(title, 26, game.WHITE), (10, 10))
+    for column, stage in enumerate(STAGES):
+        label = game.TEXT.render(f"STAGE {stage}", 22, game.WHITE)
+        x = HEATMAP_LABEL_WIDTH + column * cell_w
+        surface.blit(label, label.get_rect(center=(x + cell_w // 2, HEATMAP_HEADER_HEIGHT - 14)))
+
+    for index, (policy, difficulty) in enumerate(row_keys):
+        y = HEATMAP_HEADER_HEIGHT + index * cell_h
+        label = game.TEXT.render(f"{policy[:10]} {difficulty}", 22, game.WHITE)
+        surface.blit(label, label.get_rect(midleft=(10, y + cell_h // 2)))
+        for column, stage in enumerate(STAGES):
+            rect = pg.Rect(HEATMAP_LABEL_WIDTH + column * cell_w, y, cell_w, cell_h)
+            row = table.get((policy, difficulty, stage))
+            if row is None or metric not in row:
+                pg.draw.rect(surface, HEATMAP_EMPTY, rect)
+                text = "-"
+            else:
+                ratio = (row[metric] - low) / (high - low) if high > low else 0.5
+                pg.draw.rect(surface, heat_color(ratio), rect)
+                text = spec.format(row[metric])
+            pg.draw.rect(surface, game.BLACK, rect, 1)
+            value = game.TEXT.render(text, 24, game.WHITE)
+            surface.blit(value, value.get_rect(center=rect.center))
+    return surface
+
+
+def write_heatmaps(output_dir: str, rows: list[dict]):
+    for metric, title, spec in HEATMAP_METRICS:
+        path = os.path.join(output_dir, f"heatmap_{metric}.png")
+        pg.image.save(draw_heatmap(rows, metric, title, spec), path)
+        print(f"wrote {path}")
+
+
+def parse_hp(values: list[str]) -> tuple[dict, dict]:
+    """ --hp DIFFICULTY=HP1,HP2,HP3[,EX] を BOSS_HP / EX_BOSS_HP の上書き分にする """
+    boss_hp, ex_boss_hp = {}, {}
+    for value in values:
+        difficulty, _, hp_text = value.partition("=")
+        difficulty = difficulty.upper()
+        try:
+            hp = [int(hp) for hp in hp_text.split(",")]
+        except ValueError:
+            hp = []
+        if difficulty not in DIFFICULTIES or len(hp) not in (3, 4):
+            raise argparse.ArgumentTypeError(f"--hp の形式が違います: {value} (例: HARD=150,250,350 / HARD=150,250,350,1200)")
+        boss_hp[difficulty] = hp[:3]
+        if len(hp) == 4:
+            ex_boss_hp[difficulty] = hp[3]
+    return boss_hp, ex_boss_hp
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ヘッドレスの一括シミュレーションによるバランス調整")
+    parser.add_argument("--runs", type=int, default=50, help="(ボット, 難易度) ごとのゲーム数")
+    parser.add_argument("--seed", type=int, default=0, help="最初のシード (ゲームごとに +1 する。ボット・難易度間で共通)")
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES, help="1ゲームあたりの最大フレーム数")
+    parser.add_argument("--policies", nargs="+", default=["random"],
+                        help='ボット: "random" / "idle" / "dodge" (回避ボット) / スクリプトファイルのパス')
+    parser.add_argument("--difficulties", nargs="+", choices=DIFFICULTIES, default=DIFFICULTIES)
+    parser.add_argument("--ex", action="store_true", help="STAGE3 撃破後に EX ステージも実行する")
+    parser.add_argument("--hp", nargs="+", default=[], metavar="DIFFICULTY=HP1,HP2,HP3[,EX]",
+                        help="ボスの HP を上書きする (4つ目は EX ステージの HP)")
+    parser.add_argument("--pattern-file", help=f"弾幕パターンのファイル (既定: {game.PATTERN_FILE})")
+    parser.add_argument("--engine", choices=("array", "sprite"), default=game.BULLET_ENGINE, help="敵弾の管理方式")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="ワーカープロセス数")
+    parser.add_argument("--output-dir", help="結果の保存先 (既定: bench_results/balance)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    try:
+        boss_hp, ex_boss_hp = parse_hp(args.hp)
+    except argparse.ArgumentTypeError as e:
+        sys.exit(str(e))
+    pattern_file = os.path.join(ORIGINAL_CWD, args.pattern_file) if args.pattern_file else None
+    input_sources = {policy: policy if policy in game.INPUT_SOURCE_NAMES else os.path.join(ORIGINAL_CWD, policy)
+                     for policy in args.policies}
+
+    jobs = [(policy, difficulty, args.seed + run, args.frames, args.ex)
+            for policy in args.policies for difficulty in args.difficulties for run in range(args.runs)]
+    print(f"{len(jobs)} games on {args.workers} workers (engine={args.engine})")
+    start_time = time.perf_counter()
+    games = []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=(input_sources, boss_hp, ex_boss_hp, pattern_file, args.engine)) as executor:
+        # 1ゲームは数秒かかるので、プロセス間の受け渡しの回数より負荷の偏りを減らすことを優先する
+        chunksize = max(1, len(jobs) // (args.workers * 8))
+        for done, result in enumerate(executor.map(run_game, jobs, chunksize=chunksize), 1):
+            games.append(result)
+            if done % max(1, len(jobs) // 10) == 0 or done == len(jobs):
+                print(f"  {done}/{len(jobs)} games ({time.perf_counter() - start_time:.1f}s)")
+    elapsed = time.perf_counter() - start_time
+
+    rows = summarize_games(games)
+    print_summary(rows)
+
+    output_dir = os.path.join(ORIGINAL_CWD, args.output_dir) if args.output_dir else os.path.join("bench_results", "balance")
+    game.BOSS_HP.update(boss_hp)
+    game.EX_BOSS_HP.update(ex_boss_hp)
+    meta = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "engine": args.engine,
+        "games": len(games),
+        "runs": args.runs,
+        "seed": args.seed,
+        "frames": args.frames,
+        "ex": args.ex,
+        "boss_hp": game.BOSS_HP,
+        "ex_boss_hp": game.EX_BOSS_HP,
+        "pattern_file": args.pattern_file or game.PATTERN_FILE,
+        "workers": args.workers,
+        "seconds": elapsed,
+        "python": platform.python_version(),
+        "pygame": pg.version.ver,
+        "machine": platform.machine(),
+    }
+    write_json(os.path.join(output_dir, "balance.json"), {"meta": meta, "summary": rows, "games": games})
+    write_csv(os.path.join(output_dir, "summary.csv"), rows,
+              ["policy", "difficulty", "stage", "attempts", "clears", "clear_rate", "clear_time_mean",
+               "clear_time_median", "clear_time_p90", "deaths_mean", "grazes_mean", "bombs_mean",
+               "peak_bullets_mean", "peak_bullets_max"])
+    write_csv(os.path.join(output_dir, "games.csv"), game_rows(games),
+              ["policy", "difficulty", "seed", "status", "stage", "cleared", "clear_time", "frames",
+               "deaths", "grazes", "bombs", "peak_bullets"])
+
+    game.init_headless()  # ヒートマップの文字描画に使う
+    write_heatmaps(output_dir, rows)
+    pg.quit()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
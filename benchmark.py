@@ -0,0 +1,274 @@
+"""
+ベンチマーク
+* シナリオ: 弾幕パターン (skill_pattern_1〜3, ex_pattern_final) × 難易度 (EASY / NORMAL / HARD) を
+  固定シード・固定フレーム数で実行し、処理ごとの平均 / p95 / p99 時間と最大弾数を計測する
+* 負荷試験 (--stress): 敵弾の数を段階的に増やし、弾数とフレーム時間の関係を計測する
+* セーブステート (--snapshot): プレイ中に F5 で保存した場面 (または --headless --save-snapshot の最後の場面) から
+  frames フレーム実行して計測する
+
+結果は JSON ファイル (既定では bench_results/ 以下) に保存するので、リビジョン間で比較できる。
+
+使い方:
+    python benchmark.py
+    python benchmark.py --difficulties HARD --patterns ex_pattern_final --frames 600
+    python benchmark.py --stress --engine sprite
+    python benchmark.py --snapshot snapshots/quicksave.kpss
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+# Koka_Project は import 時にカレントディレクトリを移動するので、先に覚えておく
+ORIGINAL_CWD = os.getcwd()
+
+import numpy as np
+import pygame as pg
+
+import Koka_Project as game
+
+# (パターン名, ステージ)
+PATTERNS = [
+    ("skill_pattern_1", "1"),
+    ("skill_pattern_2", "2"),
+    ("skill_pattern_3", "3"),
+    ("ex_pattern_final", "EX"),
+]
+DIFFICULTIES = ["EASY", "NORMAL", "HARD"]
+
+# 負荷試験で段階的に増やす弾数
+STRESS_COUNTS = [250, 500, 1000, 2000, 4000, 8000]
+
+# ボムを使う間隔 (フレーム)。ボムの処理時間を計測するため定期的に使う
+BOMB_INTERVAL = 180
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """ 秒単位の計測値から平均 / p95 / p99 / 最大 (ミリ秒) を求める """
+    values = np.array(samples) * 1000.0
+    return {
+        "mean_ms": float(values.mean()),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+        "samples": len(samples),
+    }
+
+
+def summarize_history(history) -> dict[str, dict[str, float]]:
+    """ PhaseTimer の履歴をフェーズごとに集計する (frame は全フェーズの合計) """
+    phases: dict[str, list[float]] = {}
+    totals = []
+    for frame in history:
+        for phase, seconds in frame.items():
+            phases.setdefault(phase, []).append(seconds)
+        totals.append(sum(frame.values()))
+    result = {phase: summarize(samples) for phase, samples in sorted(phases.items())}
+    result["frame"] = summarize(totals)
+    return result
+
+
+def run_scenario(pattern: str, stage: str, difficulty: str, frames: int, seed: int, draw: bool) -> dict:
+    """
+    1つのパターンを固定シードで frames フレーム実行する
+    パターンを固定するためボスの HP は毎フレーム全快にし、自機は無敵・静止させる
+    """
+    session = game.GameSession(difficulty, seed=seed)
+    session.invincible = True
+    if stage == "EX":
+        session.start_ex_stage()
+    else:
+        session.boss.start_skill(int(stage) - 1)
+    session.timer = game.PhaseTimer()
+    screen = pg.Surface((game.SCREEN_WIDTH, game.SCREEN_HEIGHT))
+    keys = game.InputState()
+
+    peak_bullets = 0
+    for frame in range(frames):
+        session.boss.hp = session.boss.get_current_skill_max_hp()
+        if frame % BOMB_INTERVAL == 0:
+            session.bombs = 3
+            session.use_bomb()
+        session.step(keys)
+        if draw:
+            session.draw(screen, None)
+        session.timer.end_frame()
+        peak_bullets = max(peak_bullets, len(session.enemy_bullets))
+
+    return {
+        "pattern": pattern,
+        "difficulty": difficulty,
+        "frames": frames,
+        "seed": seed,
+        "peak_bullets": peak_bullets,
+        "phases": summarize_history(session.timer.history),
+    }
+
+
+def run_snapshot(path: str, frames: int, draw: bool) -> dict:
+    """
+    セーブステートの場面から frames フレーム実行する
+    場面を保つためボスの HP はセーブステートの値に保ち、自機は無敵・静止させる
+    """
+    with open(path, "rb") as f:
+        session = game.GameSession.from_snapshot(f.read())
+    session.invincible = True
+    session.timer = game.PhaseTimer()
+    screen = pg.Surface((game.SCREEN_WIDTH, game.SCREEN_HEIGHT))
+    keys = game.InputState()
+    boss_hp = session.boss.hp
+
+    peak_bullets = 0
+    for _ in range(frames):
+        session.boss.hp = boss_hp
+        session.step(keys)
+        if draw:
+            session.draw(screen, None)
+        session.timer.end_frame()
+        peak_bullets = max(peak_bullets, len(session.enemy_bullets))
+
+    return {
+        "snapshot": os.path.basename(path),
+        "difficulty": session.difficulty,
+        "stage": "EX" if session.is_ex_stage else str(session.boss.current_skill_index + 1),
+        "frames": frames,
+        "peak_bullets": peak_bullets,
+        "phases": summarize_history(session.timer.history),
+    }
+
+
+def spawn_random_bullet(store, rng: random.Random):
+    """ 画面内のランダムな位置からランダムな方向に弾を撃つ (負荷試験用) """
+    bullet_type = rng.choice(game.ArrayBulletStore.KINDS)
+    pos = (rng.randint(0, game.SCREEN_WIDTH), rng.randint(0, game.SCREEN_HEIGHT))
+    store.emit(bullet_type, pos, rng.uniform(0, 360), rng.uniform(1, 3))
+
+
+def run_stress(counts: list[int], frames: int, seed: int, draw: bool) -> list[dict]:
+    """
+    敵弾の数を counts の各段階に保ったまま frames フレームずつ実行し、
+    敵弾の更新・当たり判定・ボム・描画の時間を計測する
+    """
+    rng = random.Random(seed)
+    store = game.create_enemy_bullet_store()
+    player = game.Player("NORMAL")
+    screen = pg.Surface((game.SCREEN_WIDTH, game.SCREEN_HEIGHT))
+    timer = game.PhaseTimer()
+    results = []
+    for count in counts:
+        timer.history.clear()
+        for frame in range(frames):
+            # 画面外に出た分を補充する (計測対象外)
+            while len(store) < count:
+                spawn_random_bullet(store, rng)
+            timer.begin()
+            store.update()
+            timer.mark("enemy_bullets")
+            store.collide_player(player)
+            timer.mark("collision")
+            if frame % 30 == 0:
+                # 自機の周りの弾を消す (ボムと同じ処理)
+                store.kill_in_circle(player.rect.center, 300)
+                timer.mark("bomb")
+            if draw:
+                store.draw(screen)
+                timer.mark("draw")
+            timer.end_frame()
+        results.append({"bullets": count, "frames": frames, "phases": summarize_history(timer.history)})
+        print(f"  bullets={count:5d} frame mean={results[-1]['phases']['frame']['mean_ms']:.3f}ms "
+              f"p99={results[-1]['phases']['frame']['p99_ms']:.3f}ms")
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def metadata(args: argparse.Namespace) -> dict:
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "engine": game.BULLET_ENGINE,
+        "frames": args.frames,
+        "seed": args.seed,
+        "draw": not args.no_draw,
+        "python": platform.python_version(),
+        "pygame": pg.version.ver,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+    }
+
+
+def write_json(path: str, data: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    print(f"wrote {path}")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="弾幕パターンのベンチマーク")
+    parser.add_argument("--frames", type=int, default=1200, help="シナリオ (負荷試験では1段階) あたりのフレーム数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engine", choices=("array", "sprite"), default=game.BULLET_ENGINE, help="敵弾の管理方式")
+    parser.add_argument("--patterns", nargs="+", choices=[name for name, _ in PATTERNS],
+                        default=[name for name, _ in PATTERNS])
+    parser.add_argument("--difficulties", nargs="+", choices=DIFFICULTIES, default=DIFFICULTIES)
+    parser.add_argument("--no-draw", action="store_true", help="描画処理を計測しない")
+    parser.add_argument("--stress", action="store_true", help="シナリオの代わりに負荷試験を行う")
+    parser.add_argument("--stress-counts", type=int, nargs="+", default=STRESS_COUNTS)
+    parser.add_argument("--snapshot", nargs="+", metavar="PATH",
+                        help="シナリオの代わりにセーブステートの場面から計測する")
+    parser.add_argument("--output", help="結果の JSON ファイル (既定: bench_results/scenarios.json, stress.json か "
+                                         "snapshots.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    game.BULLET_ENGINE = args.engine
+    game.init_headless()
+    draw = not args.no_draw
+
+    if args.stress:
+        print(f"stress test (engine={args.engine})")
+        data = {"meta": metadata(args), "stress": run_stress(args.stress_counts, args.frames, args.seed, draw)}
+        default_output = os.path.join("bench_results", "stress.json")
+    elif args.snapshot:
+        snapshots = []
+        for path in args.snapshot:
+            result = run_snapshot(os.path.join(ORIGINAL_CWD, path), args.frames, draw)
+            frame = result["phases"]["frame"]
+            print(f"{result['snapshot']:17s} {result['difficulty']:6s} peak={result['peak_bullets']:4d} "
+                  f"frame mean={frame['mean_ms']:.3f}ms p95={frame['p95_ms']:.3f}ms p99={frame['p99_ms']:.3f}ms")
+            snapshots.append(result)
+        data = {"meta": metadata(args), "snapshots": snapshots}
+        default_output = os.path.join("bench_results", "snapshots.json")
+    else:
+        scenarios = []
+        stages = dict(PATTERNS)
+        for pattern in args.patterns:
+            for difficulty in args.difficulties:
+                result = run_scenario(pattern, stages[pattern], difficulty, args.frames, args.seed, draw)
+                frame = result["phases"]["frame"]
+                print(f"{pattern:17s} {difficulty:6s} peak={result['peak_bullets']:4d} "
+                      f"frame mean={frame['mean_ms']:.3f}ms p95={frame['p95_ms']:.3f}ms p99={frame['p99_ms']:.3f}ms")
+                scenarios.append(result)
+        data = {"meta": metadata(args), "scenarios": scenarios}
+        default_output = os.path.join("bench_results", "scenarios.json")
+
+    output = os.path.join(ORIGINAL_CWD, args.output) if args.output else default_output
+    write_json(output, data)
+    pg.quit()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])